@@ -0,0 +1,131 @@
+import coalesce
+import grammar
+import parameters
+import parser
+
+
+# Parses with the actions attached to rules, calling each one as soon as its
+# rule matches. An action gets the rule's value as coalesce.coalesce would
+# produce it, except that every rule inside it was already reduced to its
+# own action's result. Rules without an action reduce to a SyntaxNode.
+#
+#     rules = grammar.resolve_refs(MY_GRAMMAR, actions={'Sum': add, ...})
+#     result = actions.parse(rules, buffer)
+#
+# A rule's nodes are dropped once it's reduced, so the parse keeps the
+# results and the nodes of rules still being matched instead of the whole
+# tree. Backtracking can still call an action for a rule inside an
+# alternative that's abandoned afterwards. Its result is dropped with the
+# alternative and never reaches another action or the caller, so actions
+# shouldn't have side effects. Like coalescing, a result of None is left out
+# of the Params it would go in.
+
+
+def reduce_value(rule, value):
+    if rule.action is None:
+        return coalesce.SyntaxNode(rule, value)
+    return rule.action(value)
+
+
+def reduce_rule(state, rule, pos):
+    memo = state.memo
+    if memo is not None:
+        found = memo.get(rule, pos)
+        if found is not None:
+            return found
+
+    # A Cut only commits choices within its own rule.
+    cut = state.cut
+    outer_choice = state.outer_choice
+    state.cut = False
+    state.outer_choice = state.choice
+    node = parser.descend(state, rule.expr, pos)
+    state.cut = cut
+    state.outer_choice = outer_choice
+
+    if isinstance(node, parser.Match):
+        reduced = coalesce.Reduced(reduce_value(rule, coalesce.coalesce(node)))
+        result = parser.Match(rule, reduced, state.source, pos, node.end)
+    elif isinstance(node, parser.Partial):
+        result = parser.Partial(rule, node, state.source, pos, node.end)
+    else:
+        result = parser.Miss(rule, None, state.source, pos, pos)
+
+    if memo is not None:
+        memo.put(rule, pos, result)
+
+    return result
+
+
+# A Choice keeps the Partial alternatives it tried before one matched. They
+# were abandoned, so they're dropped before an action can see them.
+def reduce_choice(state, expr, pos):
+    node = parser.descend_choice(state, expr, pos)
+    if type(node) is not parser.Match:
+        return node
+
+    found = parameters.Params()
+    for key, child in node.value:
+        if type(child) is not parser.Match:
+            child = None
+        found.assign(key, child)
+
+    node.value = found
+    return node
+
+
+# The optimizer replaces rules that are only literals with the literals
+# themselves, so those are reduced for the rule they came from.
+def reduce_literal(visitor):
+    def reduce(state, expr, pos):
+        node = visitor(state, expr, pos)
+        rule = expr.rule
+        if rule is None or not isinstance(node, parser.Match):
+            return node
+
+        syntax = coalesce.coalesce(node)
+        reduced = coalesce.Reduced(reduce_value(rule, syntax.value))
+        return parser.Match(rule, reduced, state.source, pos, node.end)
+
+    reduce.__name__ = visitor.__name__.replace('descend', 'reduce')
+    return reduce
+
+
+REDUCERS = dict(parser.VISITORS)
+REDUCERS.update({
+    grammar.Choice: reduce_choice,
+    grammar.LiteralChoice: reduce_literal(parser.descend_literal_choice),
+    grammar.LiteralSequence: reduce_literal(parser.descend_literal_sequence),
+    grammar.Rule: reduce_rule,
+})
+
+
+def traced_reducers(tracer):
+    return {
+        kind: parser.trace_visitor(tracer, visitor)
+        for kind, visitor in REDUCERS.items()}
+
+
+# Returns the result of the first rule that matches all of the input, in
+# the order parser.parse tries them. Raises parser.NothingMatchesError or
+# parser.IncompleteParseError for the longest attempt otherwise. Takes the
+# same memo and tracer as parser.parse.
+def parse(rules, buffer, *, memo=None, tracer=None):
+    if memo is not None:
+        memo.clear()
+
+    state = parser.ParseState(buffer.source, memo=memo, tracer=tracer)
+    if tracer is None:
+        state.visitors = REDUCERS
+    else:
+        state.visitors = traced_reducers(tracer)
+
+    partials = []
+
+    for rule in rules:
+        node = parser.descend(state, rule, buffer.index)
+        if isinstance(node, parser.Match) and node.end >= state.length:
+            return coalesce.coalesce(node)
+        partials.append(node)
+
+    parser.raise_parse_error(parser.longest_reader(partials))
@@ -0,0 +1,153 @@
+import unittest
+
+import actions
+import coalesce
+import grammar
+import optimizer
+import optimizer_test
+import packrat
+import parser
+import reader
+import tracing
+from examples import calculator
+from grammar import Choice, Expr, OneOrMore, Ref
+
+
+def get_grammar():
+    return {
+        'Line': Expr(sum=Ref('Sum'), newline='\n'),
+        'Sum': Expr(
+            left=Ref('Value'),
+            suffix=grammar.ZeroOrMore(
+                operator=Choice('+', '-'),
+                right=Ref('Value'))),
+        'Value': Choice(
+            digits=OneOrMore(Ref('Number')),
+            sub_expr=Expr(
+                left_paren='(',
+                inner_sum=Ref('Sum'),
+                right_paren=')')),
+        'Number': Choice('0', '1', '2', '3', '4', '5', '6', '7', '8', '9'),
+    }
+
+
+def get_rules(actions=None):
+    rules = grammar.resolve_refs(get_grammar(), actions=actions)
+    return [rule for rule in rules if rule.symbol == 'Line']
+
+
+def evaluate(rules, text, **kwargs):
+    return actions.parse(rules, reader.get_string_reader(text), **kwargs)
+
+
+def get_backtracking_rules(int_action):
+    rules = grammar.resolve_refs({
+        'Value': Choice(
+            first=Expr(Ref('Int'), 'x'),
+            second=Ref('Pair'),
+            third=Expr('1', Ref('Int'))),
+        'Pair': Expr(Ref('Int'), 'y'),
+        'Int': Choice('0', '1', '2', '3', '4', '5', '6', '7', '8', '9'),
+    }, actions={'Int': int_action})
+    return [parser.find_rule(rules, 'Value')]
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, value):
+        result = ('Number', len(self.calls), value[0].text)
+        self.calls.append(result)
+        return result
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_calculator(self):
+        for text in ['1+2*3', '2^3^2', '(1+2)*(3-4)/2', '12-3-4', '7']:
+            with self.subTest(text=text):
+                expected = eval(text.replace('^', '**'))
+                self.assertEqual(expected, calculator.evaluate(text))
+
+    def test_without_actions(self):
+        rules = get_rules()
+        text = '12+(3-4)\n'
+        expected = coalesce.coalesce(
+            parser.parse(rules, reader.get_string_reader(text)))
+        found = evaluate(rules, text)
+        self.assertIsInstance(found, coalesce.SyntaxNode)
+        self.assertEqual(
+            optimizer_test.to_data(expected), optimizer_test.to_data(found))
+
+    def test_reduced_children(self):
+        seen = []
+
+        def reduce_value(value):
+            seen.append(value)
+            if value.sub_expr:
+                return value.sub_expr.inner_sum
+            return int(''.join(digit[0] for digit in value.digits))
+
+        rules = get_rules({
+            'Line': lambda value: value.sum,
+            'Sum': lambda value: [value.left] + [
+                suffix.right for suffix in value.suffix or []],
+            'Value': reduce_value,
+            'Number': lambda value: value[0].text,
+        })
+        self.assertEqual([12, [3, 4]], evaluate(rules, '12+(3+4)\n'))
+        self.assertEqual(['1', '2'], [digit[0] for digit in seen[0].digits])
+
+    def test_abandoned_alternatives(self):
+        recorder = Recorder()
+        found = evaluate(get_backtracking_rules(recorder), '12')
+
+        # The first two alternatives reduced the 1 before they missed.
+        self.assertEqual(
+            [('Number', 0, '1'), ('Number', 1, '1'), ('Number', 2, '2')],
+            recorder.calls)
+        self.assertIsNone(found.first)
+        self.assertIsNone(found.second)
+        self.assertEqual('1', found.third[0].text)
+        self.assertEqual(recorder.calls[2], found.third[1])
+
+    def test_memo(self):
+        recorder = Recorder()
+        rules = get_backtracking_rules(recorder)
+
+        found = evaluate(rules, '1y', memo=packrat.Unbounded())
+        self.assertEqual([('Number', 0, '1')], recorder.calls)
+        self.assertEqual(recorder.calls[0], found.second.value[0])
+
+    def test_optimized(self):
+        optimized, changes = optimizer.optimize(
+            calculator.get_action_rules())
+        self.assertIn('inline-rule', {change.kind for change in changes})
+
+        line = [parser.find_rule(optimized, 'Line')]
+        for text in ['(12+3)*4^2-5', '7', '2^3^2']:
+            with self.subTest(text=text):
+                self.assertEqual(
+                    calculator.evaluate(text), evaluate(line, text + '\n'))
+
+    def test_tracer(self):
+        tracer = tracing.EventTracer()
+        self.assertEqual(
+            6, evaluate(calculator.ACTION_RULES, '1+5\n', tracer=tracer))
+        kinds = {event.kind for event in tracer.events}
+        self.assertIn('reduce_rule', kinds)
+        self.assertIn('reduce_choice', kinds)
+        self.assertIn('descend_expr', kinds)
+
+    def test_nothing_matches(self):
+        with self.assertRaises(parser.NothingMatchesError):
+            evaluate(get_rules(), 'x\n')
+
+    def test_incomplete(self):
+        with self.assertRaises(parser.IncompleteParseError):
+            evaluate(get_rules(), '1+2\n3\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
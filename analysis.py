@@ -0,0 +1,215 @@
+import grammar
+
+
+# A first set is a frozenset of characters with this guarantee: when the
+# character at the current position isn't in the set, descending into the
+# item is a Miss. None means the next character can't rule the item out,
+# either because it's nullable (Optional, ZeroOrMore, Not, Cut) or because its
+# characters are too many to list (AnyChar, NotCharSet, UnicodeCategory,
+# Regex).
+
+def first_set_str(item, rules_seen):
+    if not item:
+        return None
+    return frozenset(item[0])
+
+
+def first_set_sequence(params, rules_seen):
+    # A sequence only misses when its first item misses.
+    for _, value in params:
+        return first_set(value, rules_seen)
+
+    return None
+
+
+def first_set_expr(item, rules_seen):
+    return first_set_sequence(item.params, rules_seen)
+
+
+def first_set_repeated(item, rules_seen):
+    for _, sub_expr in item.params:
+        return first_set_sequence(sub_expr.params, rules_seen)
+
+    return None
+
+
+def first_set_choice(item, rules_seen):
+    result = frozenset()
+
+    for _, value in item.params:
+        other = first_set(value, rules_seen)
+        if other is None:
+            return None
+        result |= other
+
+    return result
+
+
+def first_set_nullable(item, rules_seen):
+    return None
+
+
+# Larger ranges aren't worth enumerating into dispatch tables.
+MAX_RANGE_SIZE = 256
+
+
+def first_set_char_range(item, rules_seen):
+    low = ord(item.low)
+    high = ord(item.high)
+    if high - low >= MAX_RANGE_SIZE:
+        return None
+    return frozenset(chr(i) for i in range(low, high + 1))
+
+
+def first_set_char_set(item, rules_seen):
+    return item.chars
+
+
+def first_set_literal_choice(item, rules_seen):
+    return frozenset(item.table)
+
+
+def first_set_literal_sequence(item, rules_seen):
+    return frozenset(item.text[0])
+
+
+def first_set_unbounded(item, rules_seen):
+    return None
+
+
+def first_set_rule(item, rules_seen):
+    try:
+        return rules_seen[item]
+    except KeyError:
+        pass
+
+    # Cycles back into a rule being computed get the conservative answer.
+    rules_seen[item] = None
+    result = first_set(item.expr, rules_seen)
+    rules_seen[item] = result
+    return result
+
+
+FIRST_SETS = {
+    grammar.And: first_set_expr,
+    grammar.AnyChar: first_set_unbounded,
+    grammar.CharRange: first_set_char_range,
+    grammar.CharSet: first_set_char_set,
+    grammar.Choice: first_set_choice,
+    grammar.Cut: first_set_nullable,
+    grammar.Expr: first_set_expr,
+    grammar.LiteralChoice: first_set_literal_choice,
+    grammar.LiteralSequence: first_set_literal_sequence,
+    grammar.Not: first_set_nullable,
+    grammar.NotCharSet: first_set_unbounded,
+    grammar.OneOrMore: first_set_repeated,
+    grammar.Optional: first_set_nullable,
+    grammar.Regex: first_set_unbounded,
+    grammar.Rule: first_set_rule,
+    str: first_set_str,
+    grammar.UnicodeCategory: first_set_unbounded,
+    grammar.ZeroOrMore: first_set_nullable,
+}
+
+
+def first_set(item, rules_seen=None):
+    if rules_seen is None:
+        rules_seen = {}
+
+    return FIRST_SETS[type(item)](item, rules_seen)
+
+
+class ChoiceDispatch:
+    def __init__(self, table, default):
+        self.table = table
+        self.default = default
+
+    def candidates(self, char):
+        return self.table.get(char, self.default)
+
+
+# Maps each possible next character to the positions of the alternatives
+# that could match starting with it, keeping the original order.
+def build_choice_dispatch(choice):
+    rules_seen = {}
+    sets = [first_set(value, rules_seen) for _, value in choice.params]
+
+    chars = set()
+    for chars_set in sets:
+        if chars_set is not None:
+            chars |= chars_set
+
+    default = frozenset(i for i, s in enumerate(sets) if s is None)
+    table = {}
+    for char in chars:
+        table[char] = frozenset(
+            i for i, s in enumerate(sets) if s is None or char in s)
+
+    return ChoiceDispatch(table, default)
+
+
+def choice_dispatch(choice):
+    dispatch = choice.dispatch
+    if dispatch is None:
+        dispatch = build_choice_dispatch(choice)
+        choice.dispatch = dispatch
+
+    return dispatch
+
+
+def same_item(a, b):
+    return a is b or (type(a) is str and type(b) is str and a == b)
+
+
+def shared_prefix_length(a, b):
+    length = 0
+    for (_, a_value), (_, b_value) in zip(a.params, b.params):
+        if not same_item(a_value, b_value):
+            break
+        length += 1
+
+    return length
+
+
+class ChoicePrefixes:
+    def __init__(self, shared, sources):
+        self.shared = shared
+        self.sources = sources
+
+
+# For each alternative that's a plain Expr, finds the earlier alternative
+# with the longest run of the same leading items (the latest one on ties), so
+# the nodes it matched for that run can be reused instead of parsed again.
+# shared[i] is None or an (index, length) pair, and sources holds the
+# indexes other alternatives borrow from.
+def build_choice_prefixes(choice):
+    alternatives = [value for _, value in choice.params]
+    shared = []
+    sources = set()
+
+    for i, value in enumerate(alternatives):
+        best = None
+        if type(value) is grammar.Expr:
+            for j in range(i):
+                other = alternatives[j]
+                if type(other) is not grammar.Expr:
+                    continue
+                length = shared_prefix_length(value, other)
+                if length and (best is None or length >= best[1]):
+                    best = (j, length)
+
+        if best is not None:
+            sources.add(best[0])
+        shared.append(best)
+
+    return ChoicePrefixes(shared, frozenset(sources))
+
+
+def choice_prefixes(choice):
+    prefixes = choice.prefixes
+    if prefixes is None:
+        prefixes = build_choice_prefixes(choice)
+        choice.prefixes = prefixes
+
+    return prefixes
+
@@ -0,0 +1,82 @@
+import unittest
+
+import analysis
+import grammar
+from grammar import Ref, Expr, Choice, ZeroOrMore, OneOrMore, Optional, And
+from grammar import Not
+import parser_test
+
+
+def get_rule_map(rules):
+    return {rule.symbol: rule for rule in rules}
+
+
+class FirstSetTest(unittest.TestCase):
+
+    def test_literals(self):
+        self.assertEqual(frozenset('a'), analysis.first_set('abc'))
+        self.assertIsNone(analysis.first_set(''))
+
+    def test_sequence_uses_first_item(self):
+        item = Expr('a', 'b')
+        self.assertEqual(frozenset('a'), analysis.first_set(item))
+
+    def test_nullable(self):
+        self.assertIsNone(analysis.first_set(Optional('a')))
+        self.assertIsNone(analysis.first_set(ZeroOrMore('a')))
+        self.assertIsNone(analysis.first_set(Not('a')))
+        self.assertIsNone(analysis.first_set(Expr(Optional('a'), 'b')))
+        self.assertIsNone(analysis.first_set(Choice('a', Optional('b'))))
+
+    def test_strict(self):
+        self.assertEqual(frozenset('a'), analysis.first_set(OneOrMore('a')))
+        self.assertEqual(frozenset('a'), analysis.first_set(And('a')))
+        self.assertEqual(frozenset('ab'), analysis.first_set(Choice('a', 'b')))
+
+    def test_rules(self):
+        rules = get_rule_map(parser_test.get_rules())
+        self.assertEqual(
+            frozenset('0123456789('), analysis.first_set(rules['Sum']))
+
+    def test_left_recursion_is_conservative(self):
+        rules = get_rule_map(grammar.resolve_refs({
+            'Loop': Choice(Expr(Ref('Loop'), 'a'), 'b'),
+        }))
+        self.assertIsNone(analysis.first_set(rules['Loop']))
+
+
+class ChoiceDispatchTest(unittest.TestCase):
+
+    def test_candidates(self):
+        choice = Choice('a', 'b', Optional('c'), 'a')
+        dispatch = analysis.choice_dispatch(choice)
+        self.assertEqual(frozenset([0, 2, 3]), dispatch.candidates('a'))
+        self.assertEqual(frozenset([1, 2]), dispatch.candidates('b'))
+        self.assertEqual(frozenset([2]), dispatch.candidates('z'))
+        self.assertIs(dispatch, analysis.choice_dispatch(choice))
+
+
+class ChoicePrefixesTest(unittest.TestCase):
+
+    def test_shared(self):
+        choice = Choice(
+            Expr('a', 'b', 'c'),
+            Expr('a', 'b', 'd'),
+            'a',
+            Expr('a', 'x'),
+            Optional('a', 'b'),
+            Expr('z'))
+        prefixes = analysis.choice_prefixes(choice)
+        self.assertEqual(
+            [None, (0, 2), None, (1, 1), None, None], prefixes.shared)
+        self.assertEqual(frozenset([0, 1]), prefixes.sources)
+        self.assertIs(prefixes, analysis.choice_prefixes(choice))
+
+    def test_rules(self):
+        rules = get_rule_map(parser_test.get_partial_choice_rules())
+        prefixes = analysis.choice_prefixes(rules['Value'].expr)
+        self.assertEqual([None, (0, 2)], prefixes.shared)
+
+
+if __name__ == '__main__':
+    unittest.main()
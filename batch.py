@@ -0,0 +1,334 @@
+import array
+import collections
+import io
+import itertools
+import multiprocessing
+import os
+import pickle
+import queue
+
+import grammar
+import parameters
+import parser
+import reader
+from parser import Match, Partial, Miss
+
+
+# Parses many independent inputs, each a str, in a pool of worker processes.
+# Yields a BatchResult for every input: its position in inputs, and either
+# a value or the exception that parsing or transform raised. Results come in
+# input order, or as chunks finish when ordered is False.
+#
+# With a transform, it's called on each node in the worker and its result is
+# the value, which keeps what comes back small. Otherwise the value is a
+# CompactTree, and load() rebuilds the node in the caller's process. Nodes
+# and other results refer to grammar items by their position in a walk of
+# the rules, which both processes do the same way, so they come back
+# pointing at the caller's rules instead of copies.
+#
+# The rules, memo and transform are pickled once and sent to each worker
+# when it starts, so they need to be picklable: transform has to be a
+# module-level function, like coalesce.coalesce. Inputs are read and sent
+# chunk_size at a time, with at most two chunks per worker waiting, so a
+# long input iterator isn't read all at once. With one worker everything
+# runs in this process.
+BatchResult = collections.namedtuple(
+    'BatchResult', ['index', 'value', 'error'])
+
+DEFAULT_CHUNK_SIZE = 16
+
+CHUNKS_PER_WORKER = 2
+
+
+def grammar_items(rules):
+    items = []
+    seen = set()
+    stack = list(reversed(rules))
+
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str) or item is None or id(item) in seen:
+            continue
+        seen.add(id(item))
+        items.append(item)
+
+        if isinstance(item, grammar.Rule):
+            stack.append(item.expr)
+        elif isinstance(item, grammar.Expr):
+            stack.extend(value for _, value in reversed(list(item.params)))
+        elif isinstance(
+                item, (grammar.LiteralChoice, grammar.LiteralSequence)):
+            stack.append(item.rule)
+
+    return items
+
+
+# A tree is encoded as a flat array of integers in post-order, so decoding
+# is one pass with a stack instead of unpickling an object per node:
+#
+# - NONE_CODE
+# - VALUE_CODE, start, end
+# - PARAMS_CODE, count, key...: the count values before it, with their keys.
+# - Match, Partial or Miss code, source, start, end: the value before it.
+#
+# Sources and keys that aren't grammar items or integers, like str literals
+# and optimizer paths, are negative indexes into a list of other objects.
+NONE_CODE = 0
+VALUE_CODE = 1
+PARAMS_CODE = 2
+
+NODE_CODES = {Match: 3, Partial: 4, Miss: 5}
+
+NODE_TYPES = {code: kind for kind, code in NODE_CODES.items()}
+
+
+def encode_tree(node, positions):
+    codes = []
+    others = {}
+
+    def other(item):
+        try:
+            return others[item]
+        except KeyError:
+            index = -len(others) - 1
+            others[item] = index
+            return index
+
+    def encode(item):
+        item_type = type(item)
+        if item is None:
+            codes.append(NONE_CODE)
+        elif item_type is reader.Value:
+            codes.extend((VALUE_CODE, item.start, item.end))
+        elif item_type is parameters.Params:
+            keys = []
+            for key, value in item:
+                encode(value)
+                keys.append(key if type(key) is int else other(key))
+            codes.extend((PARAMS_CODE, len(keys)))
+            codes.extend(keys)
+        else:
+            encode(item.value)
+            source = item.source
+            position = positions.get(id(source))
+            if position is None:
+                position = other(source)
+            codes.extend(
+                (NODE_CODES[item_type], position, item.start, item.end))
+
+    encode(node)
+    return node.input_source, array.array('q', codes), list(others)
+
+
+def decode_tree(data, items):
+    source, codes, others = data
+    stack = []
+    i = 0
+
+    while i < len(codes):
+        code = codes[i]
+        if code == NONE_CODE:
+            stack.append(None)
+            i += 1
+        elif code == VALUE_CODE:
+            stack.append(reader.Value(source, codes[i + 1], codes[i + 2]))
+            i += 3
+        elif code == PARAMS_CODE:
+            count = codes[i + 1]
+            keys = [
+                key if key >= 0 else others[-key - 1]
+                for key in codes[i + 2:i + 2 + count]]
+            values = stack[len(stack) - count:]
+            del stack[len(stack) - count:]
+            stack.append(parameters.Params.from_keys(keys, values))
+            i += 2 + count
+        else:
+            position = codes[i + 1]
+            if position >= 0:
+                item = items[position]
+            else:
+                item = others[-position - 1]
+            stack.append(NODE_TYPES[code](
+                item, stack.pop(), source, codes[i + 2], codes[i + 3]))
+            i += 4
+
+    [node] = stack
+    return node
+
+
+class CompactTree:
+    __slots__ = ('worker', 'data', 'node')
+
+    def __init__(self, worker, data=None, node=None):
+        self.worker = worker
+        self.data = data
+        self.node = node
+
+    def load(self):
+        if self.node is None:
+            self.node = decode_tree(self.data, self.worker.get_items())
+            self.data = None
+        return self.node
+
+
+class BatchPickler(pickle.Pickler):
+    def __init__(self, file, positions):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.positions = positions
+
+    def persistent_id(self, item):
+        return self.positions.get(id(item))
+
+
+class BatchUnpickler(pickle.Unpickler):
+    def __init__(self, file, items):
+        super().__init__(file)
+        self.items = items
+
+    def persistent_load(self, position):
+        return self.items[position]
+
+
+class BatchWorker:
+    def __init__(self, rules, memo, transform):
+        self.rules = rules
+        self.memo = memo
+        self.transform = transform
+        self.items = None
+        self.positions = None
+
+    def __getstate__(self):
+        return self.rules, self.memo, self.transform
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def get_items(self):
+        if self.items is None:
+            self.items = grammar_items(self.rules)
+            self.positions = {
+                id(item): i for i, item in enumerate(self.items)}
+        return self.items
+
+    # Nodes are encoded as they're parsed, so a chunk's trees aren't all
+    # alive at once unless encode is False.
+    def parse_chunk(self, chunk, encode=True):
+        self.get_items()
+        results = []
+
+        for index, text in chunk:
+            try:
+                value = parser.parse(
+                    self.rules, reader.get_string_reader(text),
+                    memo=self.memo)
+                if self.transform is not None:
+                    value = self.transform(value)
+                elif encode:
+                    value = encode_tree(value, self.positions)
+                else:
+                    value = CompactTree(self, node=value)
+            except Exception as e:
+                results.append(BatchResult(index, None, e))
+            else:
+                results.append(BatchResult(index, value, None))
+
+        return results
+
+    def dumps(self, results):
+        buffer = io.BytesIO()
+        BatchPickler(buffer, self.positions).dump(results)
+        return buffer.getvalue()
+
+    def loads(self, data):
+        results = BatchUnpickler(io.BytesIO(data), self.get_items()).load()
+        if self.transform is not None:
+            return results
+
+        return [
+            result if result.error else
+            result._replace(value=CompactTree(self, result.value))
+            for result in results]
+
+
+# Set in each worker process by init_batch_worker.
+batch_worker = None
+
+
+def init_batch_worker(payload):
+    global batch_worker
+    batch_worker = pickle.loads(payload)
+
+
+def parse_batch_chunk(chunk):
+    return batch_worker.dumps(batch_worker.parse_chunk(chunk))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ordered_results(worker, pool, chunks, limit):
+    pending = collections.deque()
+
+    for chunk in chunks:
+        pending.append(pool.apply_async(parse_batch_chunk, (chunk,)))
+        if len(pending) >= limit:
+            yield from worker.loads(pending.popleft().get())
+
+    while pending:
+        yield from worker.loads(pending.popleft().get())
+
+
+def completed_results(worker, pool, chunks, limit):
+    done = queue.SimpleQueue()
+    waiting = 0
+
+    def next_results():
+        results = done.get()
+        if isinstance(results, BaseException):
+            raise results
+        return worker.loads(results)
+
+    for chunk in chunks:
+        pool.apply_async(
+            parse_batch_chunk, (chunk,),
+            callback=done.put, error_callback=done.put)
+        waiting += 1
+        if waiting >= limit:
+            yield from next_results()
+            waiting -= 1
+
+    while waiting:
+        yield from next_results()
+        waiting -= 1
+
+
+def parse_many(
+        rules, inputs, *, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+        ordered=True, memo=None, transform=None):
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    worker = BatchWorker(list(rules), memo, transform)
+    chunks = batched(enumerate(inputs), chunk_size)
+
+    if workers == 1:
+        for chunk in chunks:
+            yield from worker.parse_chunk(chunk, encode=False)
+        return
+
+    payload = pickle.dumps(worker)
+    limit = workers * CHUNKS_PER_WORKER
+
+    with multiprocessing.Pool(
+            workers, initializer=init_batch_worker,
+            initargs=(payload,)) as pool:
+        if ordered:
+            yield from ordered_results(worker, pool, chunks, limit)
+        else:
+            yield from completed_results(worker, pool, chunks, limit)
@@ -0,0 +1,96 @@
+import unittest
+
+import batch
+import coalesce
+import optimizer
+import packrat
+import parser
+import parser_test
+import reader
+
+
+BATCH_INPUTS = ['1+2', '(3-4)+5', 'x', '6+', '(7)', '8-9']
+
+
+# Transforms run in the worker processes, so they're module-level.
+def match_end(node):
+    if not isinstance(node, parser.Match):
+        raise ValueError(node.end)
+    return node.end
+
+
+class ParseManyTest(unittest.TestCase):
+
+    def assertSameNodes(self, rules, texts, results):
+        self.assertEqual(len(texts), len(results))
+        for text, result in zip(texts, results):
+            expected = parser.parse(rules, reader.get_string_reader(text))
+            found = result.value.load()
+            self.assertIsNone(result.error)
+            self.assertIs(type(expected), type(found))
+            self.assertIs(expected.source, found.source)
+            self.assertEqual(
+                (expected.start, expected.end), (found.start, found.end))
+            self.assertEqual(
+                parser_test.flatten(expected), parser_test.flatten(found))
+
+    def test_one_worker(self):
+        rules = list(parser_test.get_rules())
+        results = list(batch.parse_many(rules, BATCH_INPUTS, workers=1))
+        self.assertEqual(
+            list(range(len(BATCH_INPUTS))),
+            [result.index for result in results])
+        self.assertSameNodes(rules, BATCH_INPUTS, results)
+
+    def test_ordered(self):
+        rules = list(parser_test.get_rules())
+        results = list(batch.parse_many(
+            rules, iter(BATCH_INPUTS), workers=2, chunk_size=2))
+        self.assertEqual(
+            list(range(len(BATCH_INPUTS))),
+            [result.index for result in results])
+        self.assertSameNodes(rules, BATCH_INPUTS, results)
+
+    def test_as_completed(self):
+        rules = list(parser_test.get_rules())
+        results = list(batch.parse_many(
+            rules, BATCH_INPUTS, workers=2, chunk_size=1, ordered=False))
+        results.sort(key=lambda result: result.index)
+        self.assertEqual(
+            list(range(len(BATCH_INPUTS))),
+            [result.index for result in results])
+        self.assertSameNodes(rules, BATCH_INPUTS, results)
+
+    def test_optimized(self):
+        rules, _ = optimizer.optimize(parser_test.get_rules())
+        results = list(batch.parse_many(rules, BATCH_INPUTS, workers=2))
+        self.assertSameNodes(rules, BATCH_INPUTS, results)
+
+    def test_transform(self):
+        rules = list(parser_test.get_rules())
+        results = list(batch.parse_many(
+            rules, ['(1+2)+3)'], workers=2, transform=coalesce.coalesce))
+        [result] = results
+        self.assertIsNone(result.error)
+        self.assertIsInstance(result.value, coalesce.SyntaxNode)
+        self.assertIs(
+            parser.find_rule(rules, 'Sum'), result.value.source)
+
+    def test_errors(self):
+        results = list(batch.parse_many(
+            parser_test.get_rules(), ['(1+2)+3)', 'x', '12+(3-4))'], workers=2,
+            transform=match_end))
+        self.assertEqual(
+            [(7, None), (None, ValueError), (8, None)],
+            [(result.value, result.error and type(result.error))
+             for result in results])
+
+    def test_memo(self):
+        rules = list(parser_test.get_rules())
+        results = list(batch.parse_many(
+            rules, BATCH_INPUTS, workers=2, memo=packrat.Unbounded()))
+        self.assertSameNodes(rules, BATCH_INPUTS, results)
+
+
+if __name__ == '__main__':
+    unittest.main()
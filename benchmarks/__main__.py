@@ -0,0 +1,186 @@
+import argparse
+import os
+import sys
+
+import memory
+import reader
+from benchmarks import baseline
+from benchmarks import measure
+from benchmarks import workloads
+
+
+UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+DEFAULT_SIZES = '1K,10K,100K'
+
+
+def parse_size(text):
+    multiplier = UNITS.get(text[-1:].upper())
+    if multiplier is None:
+        return int(text)
+    return int(text[:-1]) * multiplier
+
+
+def format_size(size):
+    for suffix, multiplier in reversed(UNITS.items()):
+        if size >= multiplier and size % multiplier == 0:
+            return f'{size // multiplier}{suffix}'
+    return str(size)
+
+
+def parse_list(text, choices):
+    items = text.split(',')
+    for item in items:
+        if item not in choices:
+            raise argparse.ArgumentTypeError(
+                f'{item!r} is not one of {", ".join(choices)}')
+    return items
+
+
+def get_args(argv):
+    names = [workload.name for workload in workloads.WORKLOADS]
+
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description=(
+            'Measures parse, coalesce and interpret on generated inputs and '
+            'compares the results to a saved baseline.'))
+    parser.add_argument(
+        '--sizes', default=DEFAULT_SIZES,
+        type=lambda text: [parse_size(size) for size in text.split(',')],
+        help=f'Input sizes in bytes, with K, M or G suffixes '
+             f'(default: {DEFAULT_SIZES})')
+    parser.add_argument(
+        '--workloads', default=names,
+        type=lambda text: parse_list(text, names),
+        help=f'Workloads to run (default: {",".join(names)})')
+    parser.add_argument(
+        '--phases', default=measure.PHASES,
+        type=lambda text: parse_list(text, measure.PHASES),
+        help=f'Phases to measure (default: {",".join(measure.PHASES)})')
+    parser.add_argument(
+        '--baseline', default=baseline.DEFAULT_PATH,
+        help='Baseline JSON file to compare against or save to')
+    parser.add_argument(
+        '--save', action='store_true',
+        help='Save the results as the new baseline instead of comparing')
+    parser.add_argument(
+        '--memory', action='store_true',
+        help='Break down the memory used by each phase by node kind and '
+             'rule instead of timing')
+    parser.add_argument(
+        '--batch', action='store_true',
+        help='Measure batch.parse_many across worker counts instead')
+    parser.add_argument(
+        '--workers', default=measure.BATCH_WORKERS,
+        type=lambda text: [int(count) for count in text.split(',')],
+        help=f'Worker counts for --batch '
+             f'(default: {",".join(map(str, measure.BATCH_WORKERS))})')
+    parser.add_argument(
+        '--documents', type=int, default=measure.BATCH_DOCUMENTS,
+        help=f'Documents to parse for --batch '
+             f'(default: {measure.BATCH_DOCUMENTS})')
+    parser.add_argument(
+        '--document-size', type=parse_size,
+        default=measure.BATCH_DOCUMENT_SIZE,
+        help=f'Size of each document for --batch '
+             f'(default: {format_size(measure.BATCH_DOCUMENT_SIZE)})')
+    parser.add_argument(
+        '--time-tolerance', type=float, default=baseline.TIME_TOLERANCE,
+        help='Allowed fraction of throughput lost '
+             f'(default: {baseline.TIME_TOLERANCE})')
+    parser.add_argument(
+        '--memory-tolerance', type=float, default=baseline.MEMORY_TOLERANCE,
+        help='Allowed fraction of peak memory growth '
+             f'(default: {baseline.MEMORY_TOLERANCE})')
+    return parser.parse_args(argv)
+
+
+HEADER = (
+    f'{"workload":<11} {"size":>6} {"phase":<10} {"KiB/s":>9} '
+    f'{"nodes":>10} {"peak KiB":>10} {"depth":>6}')
+
+
+def format_result(result):
+    return (
+        f'{result["workload"]:<11} {format_size(result["size"]):>6} '
+        f'{result["phase"]:<10} {result["throughput"] / 1024:>9.1f} '
+        f'{result["nodes"]:>10} {result["peak_memory"] / 1024:>10.1f} '
+        f'{result["max_depth"]:>6}')
+
+
+BATCH_HEADER = (
+    f'{"workload":<11} {"docs":>6} {"size":>6} {"workers":>7} '
+    f'{"KiB/s":>9} {"speedup":>7}')
+
+
+def print_batch(selected, args):
+    print(f'{os.cpu_count()} CPUs')
+    print(BATCH_HEADER)
+    results = measure.run_batch(
+        selected, args.documents, args.document_size, args.workers)
+    for result in results:
+        print(
+            f'{result["workload"]:<11} {result["documents"]:>6} '
+            f'{format_size(result["size"]):>6} {result["workers"]:>7} '
+            f'{result["throughput"] / 1024:>9.1f} '
+            f'{result["speedup"]:>7.2f}', flush=True)
+
+
+def print_memory(selected, sizes):
+    for workload in selected:
+        for size in sizes:
+            buffer = reader.get_string_reader(workload.generate(size))
+            phases = memory.measure(
+                [workload.start], buffer, workload.handlers)
+            print(f'{workload.name} {format_size(size)}')
+            print(memory.table(phases, limit=10))
+            print()
+
+
+def main(argv=None):
+    args = get_args(argv)
+    selected = [
+        workload for workload in workloads.WORKLOADS
+        if workload.name in args.workloads]
+
+    if args.memory:
+        print_memory(selected, args.sizes)
+        return 0
+
+    if args.batch:
+        print_batch(selected, args)
+        return 0
+
+    print(HEADER)
+    results = []
+    for result in measure.run(selected, args.sizes, args.phases):
+        print(format_result(result), flush=True)
+        results.append(result)
+
+    if args.save:
+        baseline.save(results, args.baseline)
+        print(f'Saved baseline to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+
+    regressions = baseline.compare(
+        baseline.load(args.baseline), results,
+        time_tolerance=args.time_tolerance,
+        memory_tolerance=args.memory_tolerance)
+    for result, metric, expected, found in regressions:
+        print(
+            f'Regression: {result["workload"]} '
+            f'{format_size(result["size"])} {result["phase"]} {metric} '
+            f'was {expected:.6g}, now {found:.6g}')
+
+    if regressions:
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import json
+import os
+import platform
+
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Node counts and stack depth don't depend on the machine, so any increase
+# is reported. Timing and memory are allowed to get worse by these fractions
+# before they count, since throughput on a shared machine varies a lot more
+# from run to run than peak memory does.
+TIME_TOLERANCE = 0.5
+MEMORY_TOLERANCE = 0.1
+
+
+def key(result):
+    return result['workload'], result['size'], result['phase']
+
+
+def save(results, path=DEFAULT_PATH):
+    data = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def load(path=DEFAULT_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+# Returns a list of (result, metric, expected, found) tuples for every
+# metric that got worse than the baseline allows. Results that aren't in the
+# baseline are skipped.
+def compare(
+        baseline, results, *, time_tolerance=TIME_TOLERANCE,
+        memory_tolerance=MEMORY_TOLERANCE):
+    expected_results = {key(r): r for r in baseline['results']}
+    regressions = []
+
+    for result in results:
+        expected = expected_results.get(key(result))
+        if expected is None:
+            continue
+
+        checks = [
+            ('throughput',
+             result['throughput'] <
+             expected['throughput'] * (1 - time_tolerance)),
+            ('peak_memory',
+             result['peak_memory'] >
+             expected['peak_memory'] * (1 + memory_tolerance)),
+            ('nodes', result['nodes'] > expected['nodes']),
+            ('max_depth', result['max_depth'] > expected['max_depth']),
+        ]
+        for metric, worse in checks:
+            if worse:
+                regressions.append(
+                    (result, metric, expected[metric], result[metric]))
+
+    return regressions
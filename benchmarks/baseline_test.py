@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks import baseline
+from benchmarks import measure
+from benchmarks import workloads
+
+
+def make_result(**kwargs):
+    result = {
+        'workload': 'json',
+        'size': 1024,
+        'phase': 'parse',
+        'bytes': 1030,
+        'seconds': 0.01,
+        'throughput': 103000.0,
+        'nodes': 1000,
+        'peak_memory': 50000,
+        'max_depth': 100,
+    }
+    result.update(kwargs)
+    return result
+
+
+class CompareTest(unittest.TestCase):
+
+    def setUp(self):
+        self.baseline = {'results': [make_result()]}
+
+    def test_within_tolerance(self):
+        found = make_result(throughput=60000.0, peak_memory=54000)
+        self.assertEqual([], baseline.compare(self.baseline, [found]))
+
+    def test_regressions(self):
+        found = make_result(
+            throughput=50000.0, peak_memory=56000, nodes=1001, max_depth=99)
+        regressions = baseline.compare(self.baseline, [found])
+        self.assertEqual(
+            [('throughput', 103000.0, 50000.0),
+             ('peak_memory', 50000, 56000),
+             ('nodes', 1000, 1001)],
+            [r[1:] for r in regressions])
+
+    def test_tolerances(self):
+        found = make_result(throughput=90000.0, peak_memory=51000)
+        regressions = baseline.compare(
+            self.baseline, [found], time_tolerance=0.1,
+            memory_tolerance=0.01)
+        self.assertEqual(
+            ['throughput', 'peak_memory'], [r[1] for r in regressions])
+
+    def test_new_results_skipped(self):
+        found = make_result(size=2048, throughput=1.0)
+        self.assertEqual([], baseline.compare(self.baseline, [found]))
+
+
+class RunTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        results = list(measure.run(
+            workloads.WORKLOADS[1:2], [512], ['parse', 'interpret']))
+
+        self.assertEqual(
+            ['parse', 'interpret'], [r['phase'] for r in results])
+        for result in results:
+            self.assertGreaterEqual(result['bytes'], 512)
+            self.assertGreater(result['throughput'], 0)
+            self.assertGreater(result['nodes'], 0)
+            self.assertGreater(result['peak_memory'], 0)
+            self.assertGreater(result['max_depth'], 0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            baseline.save(results, path)
+            saved = baseline.load(path)
+
+        self.assertEqual(results, saved['results'])
+        self.assertEqual([], baseline.compare(saved, results))
+
+
+if __name__ == '__main__':
+    unittest.main()
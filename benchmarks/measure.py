@@ -0,0 +1,233 @@
+import gc
+import sys
+import time
+import tracemalloc
+
+import batch
+import coalesce
+import interpreter
+import parameters
+import parser
+import reader
+import tracing
+
+
+# Each phase is measured in its own passes over the same input, so the
+# instrumentation for one metric doesn't skew the others:
+#
+# - seconds: the fastest of a few untraced runs.
+# - nodes: objects the phase produced, counted by a tracer. For parse that's
+#   every node a visitor returned, including ones thrown away by
+#   backtracking. For coalesce it's syntax nodes, Params and lists. For
+#   interpret it's handler calls.
+# - peak_memory: the highest traced allocation in bytes while the phase ran,
+#   not counting its input.
+# - max_depth: the deepest the Python stack got, in frames, below the phase's
+#   entry point.
+
+PHASES = ['parse', 'coalesce', 'interpret']
+
+# Batch runs parse many generated documents with batch.parse_many and
+# report each worker count's speedup over the first one measured.
+BATCH_DOCUMENTS = 64
+BATCH_DOCUMENT_SIZE = 1024
+BATCH_WORKERS = [1, 2, 4]
+
+MIN_SECONDS = 1.0
+MAX_RUNS = 20
+
+
+class Error(Exception):
+    pass
+
+
+class IncompleteInputError(Error):
+    def __init__(self, workload, node):
+        super().__init__(
+            f'{workload.name} input only parsed up to {node.end}', node)
+        self.workload = workload
+        self.node = node
+
+
+class CountingTracer(tracing.Tracer):
+    def __init__(self, counted):
+        self.counted = counted
+        self.nodes = 0
+
+    def exit(self, kind, item, result, depth):
+        if self.counted(result):
+            self.nodes += 1
+
+
+def is_parse_node(result):
+    return isinstance(result, parser.ParseNode)
+
+
+def is_syntax(result):
+    return isinstance(
+        result, (coalesce.SyntaxNode, parameters.Params, list))
+
+
+def is_anything(result):
+    return True
+
+
+def run_parse(workload, text, tracer=None):
+    buffer = reader.get_string_reader(text)
+    node = parser.parse([workload.start], buffer, tracer=tracer)
+    if not isinstance(node, parser.Match) or node.end < len(text):
+        raise IncompleteInputError(workload, node)
+    return node
+
+
+def run_coalesce(workload, node, tracer=None):
+    return coalesce.coalesce(node, tracer=tracer)
+
+
+def run_interpret(workload, syntax, tracer=None):
+    context = interpreter.Context(workload.handlers, tracer=tracer)
+    return context.interpret(syntax)
+
+
+RUNNERS = {
+    'parse': (run_parse, is_parse_node),
+    'coalesce': (run_coalesce, is_syntax),
+    'interpret': (run_interpret, is_anything),
+}
+
+
+def best_time(func):
+    best = None
+    total = 0
+    runs = 0
+
+    while runs < MAX_RUNS and (runs == 0 or total < MIN_SECONDS):
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        total += seconds
+        runs += 1
+        if best is None or seconds < best:
+            best = seconds
+
+    return result, best
+
+
+def count_nodes(func, counted):
+    tracer = CountingTracer(counted)
+    func(tracer)
+    return tracer.nodes
+
+
+def max_stack_depth(func):
+    depth = 0
+    deepest = 0
+
+    def profile(frame, event, arg):
+        nonlocal depth, deepest
+        if event == 'call':
+            depth += 1
+            if depth > deepest:
+                deepest = depth
+        elif event == 'return':
+            depth -= 1
+
+    sys.setprofile(profile)
+    try:
+        func()
+    finally:
+        sys.setprofile(None)
+
+    return deepest
+
+
+def peak_memory(func):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+
+def measure_phase(workload, phase, phase_input, size):
+    runner, counted = RUNNERS[phase]
+
+    output, seconds = best_time(lambda: runner(workload, phase_input))
+    nodes = count_nodes(
+        lambda tracer: runner(workload, phase_input, tracer), counted)
+    depth = max_stack_depth(lambda: runner(workload, phase_input))
+    peak = peak_memory(lambda: runner(workload, phase_input))
+
+    result = {
+        'workload': workload.name,
+        'size': size,
+        'phase': phase,
+        'seconds': seconds,
+        'nodes': nodes,
+        'peak_memory': peak,
+        'max_depth': depth,
+    }
+    return output, result
+
+
+# Yields one result dict per workload, size and phase. Phases run in order,
+# each on the output of the one before, so asking for interpret alone still
+# parses and coalesces its input first without measuring them.
+def run(workloads, sizes, phases=PHASES):
+    last = max(PHASES.index(phase) for phase in phases)
+
+    for workload in workloads:
+        for size in sizes:
+            text = workload.generate(size)
+            phase_input = text
+
+            for phase in PHASES[:last + 1]:
+                if phase not in phases:
+                    runner, _ = RUNNERS[phase]
+                    phase_input = runner(workload, phase_input)
+                    continue
+
+                phase_input, result = measure_phase(
+                    workload, phase, phase_input, size)
+                result['bytes'] = len(text.encode())
+                result['throughput'] = result['bytes'] / result['seconds']
+                yield result
+
+
+def run_batch_once(workload, texts, workers):
+    for result in batch.parse_many([workload.start], texts, workers=workers):
+        if result.error is not None:
+            raise result.error
+
+
+# Yields one result dict per workload and worker count. Pool startup is
+# included in the time, since every parse_many call pays it.
+def run_batch(
+        workloads, documents=BATCH_DOCUMENTS, size=BATCH_DOCUMENT_SIZE,
+        worker_counts=BATCH_WORKERS):
+    for workload in workloads:
+        texts = [workload.generate(size, seed=i) for i in range(documents)]
+        total = sum(len(text.encode()) for text in texts)
+        first = None
+
+        for workers in worker_counts:
+            _, seconds = best_time(
+                lambda: run_batch_once(workload, texts, workers))
+            if first is None:
+                first = seconds
+
+            yield {
+                'workload': workload.name,
+                'documents': documents,
+                'size': size,
+                'workers': workers,
+                'seconds': seconds,
+                'bytes': total,
+                'throughput': total / seconds,
+                'speedup': first / seconds,
+            }
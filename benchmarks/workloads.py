@@ -0,0 +1,492 @@
+import collections
+import json
+import random
+
+import grammar
+from grammar import Ref, Expr, Choice, ZeroOrMore, OneOrMore, Optional
+from grammar import CharRange, CharSet, NotCharSet, Regex
+import parser
+import reader
+
+from examples import calculator
+
+
+# A grammar to benchmark, the rule that starts a parse, a function that
+# returns deterministic input of about the given number of characters, and
+# the interpreter handlers for its syntax tree.
+Workload = collections.namedtuple(
+    'Workload', ['name', 'rules', 'start', 'generate', 'handlers'])
+
+
+# The alternative a coalesced Choice took, as a (key, value) pair.
+def chosen(params):
+    for key, value in params:
+        if value is not None:
+            return key, value
+
+    assert False, 'Not reachable'
+
+
+# The text matched by a coalesced repetition of a single terminal.
+def repeated_text(items):
+    return ''.join(item[0].text for item in items or [])
+
+
+def generate_lines(size, seed, make_line):
+    rand = random.Random(seed)
+    lines = []
+    total = 0
+
+    while total < size:
+        line = make_line(rand) + '\n'
+        lines.append(line)
+        total += len(line)
+
+    return ''.join(lines)
+
+
+# Calculator
+
+# Nullable items at the end of the input don't match, so each expression is
+# a line ending with a newline.
+CALCULATOR_RULES = list(calculator.MY_RULES) + [
+    grammar.Rule('Line', Expr(
+        sum=parser.find_rule(calculator.MY_RULES, 'Sum'),
+        newline='\n'))]
+
+CALCULATOR_LINES = grammar.Rule(
+    'Lines', OneOrMore(line=parser.find_rule(CALCULATOR_RULES, 'Line')))
+
+CALCULATOR_RULES.append(CALCULATOR_LINES)
+
+
+def make_calculator_term(rand, depth):
+    if depth < 3 and rand.random() < 0.2:
+        return f'({make_calculator_sum(rand, depth + 1)})'
+
+    number = str(rand.randint(1, 999))
+    if rand.random() < 0.1:
+        number += f'^{rand.randint(1, 3)}'
+    return number
+
+
+def make_calculator_product(rand, depth):
+    parts = [make_calculator_term(rand, depth)]
+    for _ in range(rand.randint(0, 2)):
+        # Dividing only by numbers keeps zero out of the denominator.
+        if rand.random() < 0.5:
+            parts.append(f'*{make_calculator_term(rand, depth)}')
+        else:
+            parts.append(f'/{rand.randint(1, 999)}')
+    return ''.join(parts)
+
+
+def make_calculator_sum(rand, depth=0):
+    parts = [make_calculator_product(rand, depth)]
+    for _ in range(rand.randint(0, 4)):
+        operator = rand.choice('+-')
+        parts.append(f'{operator}{make_calculator_product(rand, depth)}')
+    return ''.join(parts)
+
+
+def generate_calculator(size, seed=0):
+    return generate_lines(size, seed, make_calculator_sum)
+
+
+def handle_calculator_lines(context, value):
+    return [context.interpret(item.line) for item in value.value]
+
+
+def handle_calculator_line(context, value):
+    return context.interpret(value.sum)
+
+
+def handle_calculator_sum(context, value):
+    accumulator = context.interpret(value.left)
+
+    for suffix in value.suffix or []:
+        _, operator = chosen(suffix.operator)
+        right = context.interpret(suffix.right)
+        if operator.text == '+':
+            accumulator += right
+        else:
+            accumulator -= right
+
+    return accumulator
+
+
+def handle_calculator_product(context, value):
+    accumulator = context.interpret(value.left)
+
+    for suffix in value.suffix or []:
+        _, operator = chosen(suffix.operator)
+        right = context.interpret(suffix.right)
+        if operator.text == '*':
+            accumulator *= right
+        else:
+            accumulator /= right
+
+    return accumulator
+
+
+def handle_calculator_power(context, value):
+    base = context.interpret(value.base)
+
+    if not value.suffix:
+        return base
+
+    return base ** context.interpret(value.suffix.exponent)
+
+
+def handle_calculator_value(context, value):
+    if value.digits:
+        return int(''.join(
+            chosen(item[0].value)[1].text for item in value.digits))
+
+    return context.interpret(value.sub_expr.inner_sum)
+
+
+CALCULATOR_HANDLERS = {
+    'Lines': handle_calculator_lines,
+    'Line': handle_calculator_line,
+    'Sum': handle_calculator_sum,
+    'Product': handle_calculator_product,
+    'Power': handle_calculator_power,
+    'Value': handle_calculator_value,
+}
+
+
+# JSON
+
+JSON_GRAMMAR = {
+    'Document': Expr(
+        element=Ref('Value'),
+        trailing=Ref('Whitespace')),
+
+    'Value': Choice(
+        object=Ref('Object'),
+        array=Ref('Array'),
+        string=Ref('String'),
+        number=Ref('Number'),
+        true='true',
+        false='false',
+        null='null'),
+
+    'Object': Expr(
+        open='{',
+        leading=Ref('Whitespace'),
+        members=Optional(
+            first=Ref('Member'),
+            rest=ZeroOrMore(
+                comma=',',
+                leading=Ref('Whitespace'),
+                member=Ref('Member'))),
+        close='}'),
+
+    'Member': Expr(
+        key=Ref('String'),
+        colon=':',
+        leading=Ref('Whitespace'),
+        element=Ref('Value'),
+        trailing=Ref('Whitespace')),
+
+    'Array': Expr(
+        open='[',
+        leading=Ref('Whitespace'),
+        items=Optional(
+            first=Ref('Item'),
+            rest=ZeroOrMore(
+                comma=',',
+                leading=Ref('Whitespace'),
+                item=Ref('Item'))),
+        close=']'),
+
+    'Item': Expr(
+        element=Ref('Value'),
+        trailing=Ref('Whitespace')),
+
+    'String': Regex(r'"(?:[^"\\]|\\.)*"'),
+
+    'Number': Regex(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?'),
+
+    'Whitespace': ZeroOrMore(CharSet(' \t\r\n')),
+}
+
+JSON_RULES = list(grammar.resolve_refs(JSON_GRAMMAR))
+
+JSON_WORDS = ['alpha', 'beta', 'gamma', 'delta', 'quote"d', 'tab\t', 'é']
+
+
+def make_json_value(rand, depth):
+    kind = rand.random()
+    if depth < 3 and kind < 0.15:
+        return {
+            rand.choice(JSON_WORDS): make_json_value(rand, depth + 1)
+            for _ in range(rand.randint(0, 4))}
+    if depth < 3 and kind < 0.25:
+        return [
+            make_json_value(rand, depth + 1)
+            for _ in range(rand.randint(0, 4))]
+    if kind < 0.5:
+        return rand.choice(JSON_WORDS)
+    if kind < 0.7:
+        return rand.randint(-10000, 10000)
+    if kind < 0.85:
+        return round(rand.uniform(-1000, 1000), 3)
+    return rand.choice([True, False, None])
+
+
+def make_json_record(rand):
+    record = {
+        'id': rand.randint(0, 1 << 30),
+        'name': rand.choice(JSON_WORDS),
+        'tags': [rand.choice(JSON_WORDS) for _ in range(rand.randint(0, 3))],
+        'data': make_json_value(rand, 0),
+    }
+    return json.dumps(record, indent=rand.choice([None, 2]))
+
+
+def generate_json(size, seed=0):
+    rand = random.Random(seed)
+    records = []
+    total = 0
+
+    while total < size:
+        record = make_json_record(rand)
+        records.append(record)
+        total += len(record) + 2
+
+    return '[' + ',\n'.join(records) + ']\n'
+
+
+def handle_json_document(context, value):
+    return context.interpret(value.element)
+
+
+def handle_json_value(context, value):
+    key, node = chosen(value.value)
+    if key == 'true':
+        return True
+    elif key == 'false':
+        return False
+    elif key == 'null':
+        return None
+    return context.interpret(node)
+
+
+def handle_json_object(context, value):
+    result = {}
+    if not value.members:
+        return result
+
+    members = [value.members.first]
+    members.extend(rest.member for rest in value.members.rest or [])
+    for member in members:
+        key = context.interpret(member.key)
+        result[key] = context.interpret(member.element)
+
+    return result
+
+
+def handle_json_array(context, value):
+    if not value.items:
+        return []
+
+    items = [value.items.first]
+    items.extend(rest.item for rest in value.items.rest or [])
+    return [context.interpret(item.element) for item in items]
+
+
+def handle_json_string(context, value):
+    return json.loads(value.value.text)
+
+
+def handle_json_number(context, value):
+    text = value.value.text
+    if '.' in text or 'e' in text or 'E' in text:
+        return float(text)
+    return int(text)
+
+
+JSON_HANDLERS = {
+    'Document': handle_json_document,
+    'Value': handle_json_value,
+    'Object': handle_json_object,
+    'Array': handle_json_array,
+    'String': handle_json_string,
+    'Number': handle_json_number,
+}
+
+
+# S-expressions
+
+SEXPR_GRAMMAR = {
+    'Program': OneOrMore(
+        expr=Ref('SExpr'),
+        trailing=Ref('Whitespace')),
+
+    'SExpr': Choice(
+        list=Ref('List'),
+        atom=Ref('Atom')),
+
+    'List': Expr(
+        open='(',
+        leading=Ref('Whitespace'),
+        items=ZeroOrMore(
+            item=Ref('SExpr'),
+            trailing=Ref('Whitespace')),
+        close=')'),
+
+    'Atom': Choice(
+        number=OneOrMore(CharRange('0', '9')),
+        string=Expr(
+            open='"',
+            chars=ZeroOrMore(NotCharSet('"')),
+            close='"'),
+        symbol=OneOrMore(NotCharSet(' \t\r\n()"'))),
+
+    'Whitespace': ZeroOrMore(CharSet(' \t\r\n')),
+}
+
+SEXPR_RULES = list(grammar.resolve_refs(SEXPR_GRAMMAR))
+
+SEXPR_SYMBOLS = ['define', 'lambda', 'if', 'let', '+', '-', '*', 'x', 'y']
+
+
+def make_sexpr(rand, depth):
+    if depth < 6 and rand.random() < 0.35:
+        items = [make_sexpr(rand, depth + 1)
+                 for _ in range(rand.randint(0, 5))]
+        return '(' + ' '.join(items) + ')'
+
+    kind = rand.random()
+    if kind < 0.4:
+        return str(rand.randint(0, 100000))
+    if kind < 0.6:
+        return '"' + rand.choice(SEXPR_SYMBOLS) + ' text"'
+    return rand.choice(SEXPR_SYMBOLS)
+
+
+def make_sexpr_line(rand):
+    return ' '.join(make_sexpr(rand, 0) for _ in range(rand.randint(1, 3)))
+
+
+def generate_sexpr(size, seed=0):
+    return generate_lines(size, seed, make_sexpr_line)
+
+
+def handle_sexpr_program(context, value):
+    return [context.interpret(item.expr) for item in value.value]
+
+
+def handle_sexpr_sexpr(context, value):
+    _, node = chosen(value.value)
+    return context.interpret(node)
+
+
+def handle_sexpr_list(context, value):
+    return [context.interpret(item.item) for item in value.items or []]
+
+
+def handle_sexpr_atom(context, value):
+    key, node = chosen(value.value)
+    if key == 'number':
+        return int(repeated_text(node))
+    elif key == 'string':
+        return repeated_text(node.chars)
+    return repeated_text(node)
+
+
+SEXPR_HANDLERS = {
+    'Program': handle_sexpr_program,
+    'SExpr': handle_sexpr_sexpr,
+    'List': handle_sexpr_list,
+    'Atom': handle_sexpr_atom,
+}
+
+
+# CSV
+
+CSV_GRAMMAR = {
+    'File': OneOrMore(
+        record=Ref('Record'),
+        newline='\n'),
+
+    'Record': Expr(
+        first=Ref('Field'),
+        rest=ZeroOrMore(
+            comma=',',
+            field=Ref('Field'))),
+
+    'Field': Choice(
+        quoted=Expr(
+            open='"',
+            chars=ZeroOrMore(Choice(
+                escaped='""',
+                char=NotCharSet('"'))),
+            close='"'),
+        bare=ZeroOrMore(NotCharSet(',"\n'))),
+}
+
+CSV_RULES = list(grammar.resolve_refs(CSV_GRAMMAR))
+
+
+def make_csv_field(rand):
+    kind = rand.random()
+    if kind < 0.1:
+        return ''
+    if kind < 0.4:
+        return str(rand.randint(0, 1000000))
+    if kind < 0.8:
+        return rand.choice(JSON_WORDS[:4])
+    return '"' + rand.choice(['a, b', 'say ""hi""', 'x\ny']) + '"'
+
+
+def make_csv_record(rand):
+    return ','.join(make_csv_field(rand) for _ in range(6))
+
+
+def generate_csv(size, seed=0):
+    return generate_lines(size, seed, make_csv_record)
+
+
+def handle_csv_file(context, value):
+    return [context.interpret(line.record) for line in value.value]
+
+
+def handle_csv_record(context, value):
+    fields = [value.first]
+    fields.extend(rest.field for rest in value.rest or [])
+    return [context.interpret(field) for field in fields]
+
+
+def handle_csv_field(context, value):
+    quoted = value.quoted
+    if quoted is None:
+        return repeated_text(value.bare)
+
+    text = reader.combine_spans([quoted.open, quoted.close]).text
+    return text[1:-1].replace('""', '"')
+
+
+CSV_HANDLERS = {
+    'File': handle_csv_file,
+    'Record': handle_csv_record,
+    'Field': handle_csv_field,
+}
+
+
+WORKLOADS = [
+    Workload(
+        'calculator', CALCULATOR_RULES, CALCULATOR_LINES,
+        generate_calculator, CALCULATOR_HANDLERS),
+    Workload(
+        'json', JSON_RULES, parser.find_rule(JSON_RULES, 'Document'),
+        generate_json, JSON_HANDLERS),
+    Workload(
+        'sexpr', SEXPR_RULES, parser.find_rule(SEXPR_RULES, 'Program'),
+        generate_sexpr, SEXPR_HANDLERS),
+    Workload(
+        'csv', CSV_RULES, parser.find_rule(CSV_RULES, 'File'),
+        generate_csv, CSV_HANDLERS),
+]
@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+import unittest
+
+import coalesce
+import interpreter
+import parser
+import reader
+
+from benchmarks import workloads
+
+
+def interpret(workload, text):
+    node = parser.parse([workload.start], reader.get_string_reader(text))
+    assert isinstance(node, parser.Match), node
+    assert node.end == len(text), node
+    context = interpreter.Context(workload.handlers)
+    return context.interpret(coalesce.coalesce(node))
+
+
+class WorkloadsTest(unittest.TestCase):
+
+    def get_workload(self, name):
+        for workload in workloads.WORKLOADS:
+            if workload.name == name:
+                return workload
+
+        raise KeyError(name)
+
+    def test_sizes(self):
+        for workload in workloads.WORKLOADS:
+            with self.subTest(workload=workload.name):
+                text = workload.generate(2000)
+                self.assertGreaterEqual(len(text), 2000)
+                self.assertLess(len(text), 3000)
+                self.assertEqual(text, workload.generate(2000))
+
+    def test_calculator(self):
+        workload = self.get_workload('calculator')
+        text = workload.generate(4000)
+        expected = [
+            eval(line.replace('^', '**')) for line in text.splitlines()]
+        self.assertEqual(expected, interpret(workload, text))
+        self.assertEqual([7, 27.0], interpret(workload, '1+2*3\n3^3/1\n'))
+
+    def test_json(self):
+        workload = self.get_workload('json')
+        text = workload.generate(4000)
+        self.assertEqual(json.loads(text), interpret(workload, text))
+
+    def test_sexpr(self):
+        workload = self.get_workload('sexpr')
+        self.assertEqual(
+            [['define', 'x', ['+', 1, 'a b']], [], 'y'],
+            interpret(workload, '(define x (+ 1 "a b"))\n( ) y\n'))
+        self.assertTrue(interpret(workload, workload.generate(4000)))
+
+    def test_csv(self):
+        workload = self.get_workload('csv')
+        text = workload.generate(4000)
+        expected = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(expected, interpret(workload, text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,26 +4,141 @@ import parser
 import reader
 
 
+class SyntaxNode:
+    __slots__ = ('source', 'value')
 
-def coalesce_params(value):
+    def __init__(self, source, value):
+        self.source = source
+        self.value = value
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}'
+            f'({self.source.symbol!r}, {self.value!r})')
+
+    def __getattr__(self, key):
+        # A Params lookup would make this look like a parse node to
+        # parameters.repr_params.
+        if key == 'symbol' or key.startswith('__'):
+            raise AttributeError(key)
+
+        if isinstance(self.value, parameters.Params):
+            return getattr(self.value, key)
+
+        raise AttributeError(key)
+
+
+# Stands in for the value of a rule that actions.parse already reduced, so
+# coalescing the rule around it returns the result instead of a SyntaxNode.
+class Reduced:
+    __slots__ = ('result',)
+
+    def __init__(self, result):
+        self.result = result
+
+
+# Keys that are tuples come from the optimizer flattening nested items. They
+# are paths of keys, and the nested Params are put back as they're reached.
+def nested_params(result, path):
+    for key in path:
+        if result and result.last()[0] == key:
+            _, result = result.last()
+        else:
+            nested = parameters.Params()
+            result.assign(key, nested)
+            result = nested
+
+    return result
+
+
+def assign_path(result, path, value):
+    nested_params(result, path[:-1]).assign(path[-1], value)
+
+
+def is_spliced(node):
+    return (
+        isinstance(node, parser.ParseNode) and
+        type(node.source) is grammar.LiteralSequence and
+        node.source.spliced)
+
+
+def coalesce_params(value, tracer=None, depth=0):
     result = parameters.Params()
 
     for key, other_value in value:
-        flattened = coalesce(other_value)
-
-        if flattened is None:
+        if is_spliced(other_value):
+            for path, part in literal_parts(other_value):
+                assign_path(result, path, part)
             continue
 
-        result.assign(key, flattened)
+        flattened = coalesce(other_value, tracer=tracer, depth=depth + 1)
+
+        if type(key) is tuple:
+            if flattened is not None:
+                assign_path(result, key, flattened)
+            elif other_value is not None:
+                # The nested item was reached, so it would have coalesced
+                # to Params even with nothing in them.
+                nested_params(result, key[:-1])
+        elif flattened is not None:
+            result.assign(key, flattened)
 
     return result
 
 
-def coalesce_repeated(value):
+# Splits a LiteralSequence's value back into one Value per original literal,
+# stopping where a Partial match stopped.
+def literal_parts(node):
+    value = node.value
+    if value is None:
+        return
+
+    offset = value.start
+    for path, literal in node.source.parts:
+        end = offset + len(literal)
+        if end > value.end:
+            break
+        yield path, reader.Value(value.source, offset, end)
+        offset = end
+
+
+def coalesce_literal_sequence(node):
+    source = node.source
+    if node.value is None:
+        return None
+
+    # A literal on its own, like the body of a rule, was never in a Params.
+    if not source.parts[0][0]:
+        result = node.value
+    else:
+        result = parameters.Params()
+        for path, part in literal_parts(node):
+            assign_path(result, path, part)
+
+    if source.rule is not None:
+        return SyntaxNode(source.rule, result)
+    return result
+
+
+def coalesce_literal_choice(node):
+    source = node.source
+    value = node.value
+    if value is None:
+        return None
+
+    result = parameters.Params()
+    assign_path(result, source.paths[value.text], value)
+
+    if source.rule is not None:
+        return SyntaxNode(source.rule, result)
+    return result
+
+
+def coalesce_repeated(value, tracer=None, depth=0):
     result = []
 
     for _, other_value in value:
-        flattened = coalesce(other_value)
+        flattened = coalesce(other_value, tracer=tracer, depth=depth + 1)
         result.append(flattened)
 
     if not result:
@@ -32,28 +147,45 @@ def coalesce_repeated(value):
     return result
 
 
-def coalesce_rule(source, value):
-    flattened = coalesce(value)
+def coalesce_rule(source, value, tracer=None, depth=0):
+    flattened = coalesce(value, tracer=tracer, depth=depth + 1)
     return SyntaxNode(source, flattened)
 
 
-def coalesce(node):
-    print(f'Coalescing: {node=}, {type(node)=}')
+def coalesce_node(node, tracer, depth):
     if node is None:
         return None
 
     if isinstance(node, parameters.Params):
-        return coalesce_params(node)
+        return coalesce_params(node, tracer, depth)
 
     if isinstance(node, reader.Value):
         return node
 
     assert isinstance(node, parser.ParseNode)
 
+    if type(node.source) is grammar.LiteralChoice:
+        return coalesce_literal_choice(node)
+
+    if type(node.source) is grammar.LiteralSequence:
+        return coalesce_literal_sequence(node)
+
     if isinstance(node.source, grammar.Rule):
-        return coalesce_rule(node.source, node.value)
+        if type(node.value) is Reduced:
+            return node.value.result
+        return coalesce_rule(node.source, node.value, tracer, depth)
 
     if isinstance(node.source, grammar.RepeatedExpr):
-        return coalesce_repeated(node.value)
+        return coalesce_repeated(node.value, tracer, depth)
+
+    return coalesce(node.value, tracer=tracer, depth=depth + 1)
+
 
-    return coalesce(node.value)
+def coalesce(node, *, tracer=None, depth=0):
+    if tracer is None:
+        return coalesce_node(node, None, depth)
+
+    tracer.enter('coalesce', node, None, depth)
+    result = coalesce_node(node, tracer, depth)
+    tracer.exit('coalesce', node, result, depth)
+    return result
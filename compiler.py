@@ -0,0 +1,457 @@
+import analysis
+import grammar
+import parameters
+import parser
+import reader
+from parser import Match, Partial, Miss
+
+
+class CompiledGrammar:
+    def __init__(self, rules, matchers):
+        self.rules = rules
+        self.matchers = matchers
+
+    def parse(self, buffer, *, memo=None):
+        if memo is not None:
+            memo.clear()
+
+        state = parser.ParseState(buffer.source, memo=memo)
+        partials = []
+
+        for matcher in self.matchers:
+            node = matcher(state, buffer.index)
+            if type(node) is Match and node.end >= state.length:
+                return node
+            else:
+                partials.append(node)
+
+        return parser.longest_reader(partials)
+
+
+def compile_params(source, params, compiled):
+    pairs = [(key, compile_item(value, compiled)) for key, value in params]
+
+    def match_params(state, pos, shared=()):
+        found = parameters.Params()
+        current = pos
+
+        remaining = enumerate(pairs)
+        if shared:
+            for node, (key, _) in zip(shared, pairs):
+                found.assign(key, node)
+                current = node.end
+            remaining = enumerate(pairs[len(shared):], len(shared))
+
+        for i, (key, matcher) in remaining:
+            node = matcher(state, current)
+            node_type = type(node)
+            if node_type is Match:
+                found.assign(key, node)
+                current = node.end
+            elif node_type is Partial:
+                found.assign(key, node)
+                return Partial(source, found, state.source, pos, node.end)
+            else:
+                found.assign(key, None)
+                if i:
+                    return Partial(source, found, state.source, pos, current)
+                return Miss(source, None, state.source, pos, current)
+
+        return Match(source, found, state.source, pos, current)
+
+    return match_params
+
+
+def compile_expr(expr, compiled):
+    match_params = compile_params(expr, expr.params, compiled)
+
+    def match_expr(state, pos, shared=()):
+        if pos >= state.length:
+            return Miss(expr, None, state.source, pos, pos)
+        return match_params(state, pos, shared)
+
+    return match_expr
+
+
+def compile_repeat(sub_expr, compiled):
+    match_params = compile_params(sub_expr, sub_expr.params, compiled)
+
+    def repeat_match_params(state, pos):
+        current = pos
+        result = []
+
+        while current < state.length:
+            node = match_params(state, current)
+            node_type = type(node)
+            if node_type is Match:
+                result.append(node)
+                if node.end == current:
+                    break
+                current = node.end
+            elif node_type is Partial:
+                result.append(node)
+                break
+            else:
+                break
+
+        return result
+
+    return repeat_match_params
+
+
+def get_repeated_expr(expr):
+    pairs = list(expr.params)
+    assert len(pairs) == 1
+    index, sub_expr = pairs[0]
+    assert index == 0
+    return sub_expr
+
+
+def compile_one_or_more(expr, compiled):
+    repeat = compile_repeat(get_repeated_expr(expr), compiled)
+
+    def match_one_or_more(state, pos):
+        if pos >= state.length:
+            return Miss(expr, None, state.source, pos, pos)
+
+        result = repeat(state, pos)
+        if not result:
+            return Miss(expr, None, state.source, pos, pos)
+
+        found = parameters.Params()
+        for i, node in enumerate(result):
+            found.assign(i, node)
+
+        last = result[-1]
+        if len(result) > 1 or type(last) is Match:
+            return Match(expr, found, state.source, pos, last.end)
+        return Partial(expr, found, state.source, pos, last.end)
+
+    return match_one_or_more
+
+
+def compile_zero_or_more(expr, compiled):
+    repeat = compile_repeat(get_repeated_expr(expr), compiled)
+
+    def match_zero_or_more(state, pos):
+        if pos >= state.length:
+            return Miss(expr, None, state.source, pos, pos)
+
+        result = repeat(state, pos)
+        found = parameters.Params()
+        current = pos
+
+        for i, node in enumerate(result):
+            if type(node) is Match:
+                found.assign(i, node)
+                current = node.end
+            elif i == 0:
+                found.assign(i, node)
+                return Partial(expr, found, state.source, pos, node.end)
+
+        return Match(expr, found, state.source, pos, current)
+
+    return match_zero_or_more
+
+
+def compile_optional(expr, compiled):
+    match_params = compile_params(expr, expr.params, compiled)
+
+    def match_optional(state, pos):
+        if pos >= state.length:
+            return Miss(expr, None, state.source, pos, pos)
+
+        node = match_params(state, pos)
+        node_type = type(node)
+        if node_type is Match:
+            return Match(expr, node, state.source, pos, node.end)
+        elif node_type is Partial:
+            return Partial(expr, node, state.source, pos, node.end)
+        else:
+            return Match(expr, None, state.source, pos, pos)
+
+    return match_optional
+
+
+def compile_and(expr, compiled):
+    params = expr.params
+
+    def match_and(state, pos):
+        if pos >= state.length:
+            return Miss(expr, None, state.source, pos, pos)
+
+        end = parser.recognize_params(state, params, pos)
+        if end >= 0:
+            return Match(expr, None, state.source, pos, pos)
+        elif end == parser.MISS:
+            return Miss(expr, None, state.source, pos, pos)
+        else:
+            return Partial(expr, None, state.source, pos, pos)
+
+    return match_and
+
+
+def compile_not(expr, compiled):
+    params = expr.params
+
+    def match_not(state, pos):
+        if pos >= state.length:
+            return Miss(expr, None, state.source, pos, pos)
+
+        if parser.recognize_params(state, params, pos) >= 0:
+            return Miss(expr, None, state.source, pos, pos)
+        else:
+            return Match(expr, None, state.source, pos, pos)
+
+    return match_not
+
+
+def compile_choice(expr, compiled):
+    pairs = [
+        (key, compile_item(value, compiled)) for key, value in expr.params]
+    candidates = analysis.choice_dispatch(expr).candidates
+    prefixes = analysis.choice_prefixes(expr)
+    shared_prefixes = prefixes.shared
+    sources = prefixes.sources
+    last = len(pairs) - 1
+
+    def match_choice(state, pos):
+        if pos >= state.length:
+            return Miss(expr, None, state.source, pos, pos)
+
+        found = parameters.Params()
+        match_node = None
+        partial_nodes = []
+        committed = False
+        cut = state.cut
+        choice = state.choice
+        indexes = candidates(state.data[pos])
+        tried = {}
+
+        for i, (key, matcher) in enumerate(pairs):
+            if match_node is None and not committed and i in indexes:
+                state.cut = False
+                if choice is None and i < last:
+                    state.choice = pos
+                prefix = tried and shared_prefixes[i]
+                if prefix and prefix[0] in tried:
+                    source_index, length = prefix
+                    shared = parser.shared_nodes(tried[source_index], length)
+                    node = matcher(state, pos, shared)
+                else:
+                    node = matcher(state, pos)
+                committed = state.cut
+                state.choice = choice
+                node_type = type(node)
+                if node_type is Match:
+                    found.assign(key, node)
+                    match_node = node
+                    continue
+                elif node_type is Partial:
+                    found.assign(key, node)
+                    partial_nodes.append(node)
+                    if i in sources:
+                        tried[i] = node
+                    continue
+
+            found.assign(key, None)
+
+        state.cut = cut
+
+        if match_node is not None:
+            return Match(expr, found, state.source, pos, match_node.end)
+        elif partial_nodes:
+            longest_partial = parser.longest_reader(partial_nodes)
+            return Partial(expr, found, state.source, pos, longest_partial.end)
+        else:
+            return Miss(expr, None, state.source, pos, pos)
+
+    return match_choice
+
+
+def compile_str(expr, compiled):
+    length = len(expr)
+
+    def match_str(state, pos):
+        if pos >= state.length:
+            return Miss(expr, None, state.source, pos, pos)
+
+        if state.data.startswith(expr, pos):
+            end = pos + length
+            value = reader.Value(state.source, pos, end)
+            return Match(expr, value, state.source, pos, end)
+        else:
+            return Miss(expr, None, state.source, pos, pos)
+
+    return match_str
+
+
+def compile_cut(expr, compiled):
+    def match_cut(state, pos):
+        if pos >= state.length:
+            return Miss(expr, None, state.source, pos, pos)
+
+        parser.cut_at(state, pos)
+        return Match(expr, None, state.source, pos, pos)
+
+    return match_cut
+
+
+def compile_char_test(expr, test):
+    def match_char(state, pos):
+        if pos >= state.length:
+            return Miss(expr, None, state.source, pos, pos)
+
+        char = state.data[pos]
+        if test(char):
+            end = pos + 1
+            value = reader.Value(state.source, pos, end)
+            return Match(expr, value, state.source, pos, end)
+        return Miss(expr, None, state.source, pos, pos)
+
+    return match_char
+
+
+def compile_char_range(expr, compiled):
+    low = expr.low
+    high = expr.high
+    return compile_char_test(expr, lambda char: low <= char <= high)
+
+
+def compile_char_set(expr, compiled):
+    return compile_char_test(expr, expr.chars.__contains__)
+
+
+def compile_not_char_set(expr, compiled):
+    chars = expr.chars
+    return compile_char_test(expr, lambda char: char not in chars)
+
+
+def compile_any_char(expr, compiled):
+    return compile_char_test(expr, lambda char: True)
+
+
+def compile_unicode_category(expr, compiled):
+    return compile_char_test(
+        expr, lambda char: parser.in_unicode_category(expr, char))
+
+
+def compile_regex(expr, compiled):
+    pattern = expr.pattern
+
+    def match_regex(state, pos):
+        if pos >= state.length:
+            return Miss(expr, None, state.source, pos, pos)
+
+        data = state.data
+        if isinstance(data, str):
+            match = pattern.match(data, pos)
+        else:
+            match = data.regex_match(pattern, pos)
+
+        if match is None:
+            return Miss(expr, None, state.source, pos, pos)
+
+        end = match.end()
+        value = reader.Value(state.source, pos, end)
+        return Match(expr, value, state.source, pos, end)
+
+    return match_regex
+
+
+def compile_literal(expr, visitor):
+    def match_literal(state, pos):
+        if pos >= state.length:
+            return Miss(expr, None, state.source, pos, pos)
+        return visitor(state, expr, pos)
+
+    return match_literal
+
+
+def compile_literal_choice(expr, compiled):
+    return compile_literal(expr, parser.descend_literal_choice)
+
+
+def compile_literal_sequence(expr, compiled):
+    return compile_literal(expr, parser.descend_literal_sequence)
+
+
+def compile_rule(rule, compiled):
+    match_expr = None
+
+    def match_rule(state, pos):
+        if pos >= state.length:
+            return Miss(rule, None, state.source, pos, pos)
+
+        memo = state.memo
+        if memo is not None:
+            found = memo.get(rule, pos)
+            if found is not None:
+                return found
+
+        cut = state.cut
+        outer_choice = state.outer_choice
+        state.cut = False
+        state.outer_choice = state.choice
+        node = match_expr(state, pos)
+        state.cut = cut
+        state.outer_choice = outer_choice
+
+        node_type = type(node)
+        if node_type is Match:
+            result = Match(rule, node, state.source, pos, node.end)
+        elif node_type is Partial:
+            result = Partial(rule, node, state.source, pos, node.end)
+        else:
+            result = Miss(rule, None, state.source, pos, pos)
+
+        if memo is not None:
+            memo.put(rule, pos, result)
+
+        return result
+
+    # Registered before the expression compiles so recursive references to
+    # this rule bind to the same closure.
+    compiled[rule] = match_rule
+    match_expr = compile_item(rule.expr, compiled)
+    return match_rule
+
+
+COMPILERS = {
+    grammar.And: compile_and,
+    grammar.AnyChar: compile_any_char,
+    grammar.CharRange: compile_char_range,
+    grammar.CharSet: compile_char_set,
+    grammar.Choice: compile_choice,
+    grammar.Cut: compile_cut,
+    grammar.Expr: compile_expr,
+    grammar.LiteralChoice: compile_literal_choice,
+    grammar.LiteralSequence: compile_literal_sequence,
+    grammar.Not: compile_not,
+    grammar.NotCharSet: compile_not_char_set,
+    grammar.OneOrMore: compile_one_or_more,
+    grammar.Optional: compile_optional,
+    grammar.Regex: compile_regex,
+    grammar.Rule: compile_rule,
+    str: compile_str,
+    grammar.UnicodeCategory: compile_unicode_category,
+    grammar.ZeroOrMore: compile_zero_or_more,
+}
+
+
+def compile_item(item, compiled):
+    if isinstance(item, grammar.Rule):
+        try:
+            return compiled[item]
+        except KeyError:
+            pass
+
+    compiler = COMPILERS[type(item)]
+    return compiler(item, compiled)
+
+
+def compile(rules):
+    rules = list(rules)
+    compiled = {}
+    matchers = [compile_item(rule, compiled) for rule in rules]
+    return CompiledGrammar(rules, matchers)
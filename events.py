@@ -0,0 +1,349 @@
+import collections
+
+import analysis
+import grammar
+import parser
+
+
+# Parses without building a tree, reporting what matched to a Handler as it
+# goes, like a SAX parser does for XML. Memory grows with how deeply rules
+# nest, not with the size of the input:
+#
+#     handler = MyHandler()
+#     events.parse(rules, 'Document', buffer, handler)
+#
+# The Handler hears about:
+#
+# - enter(rule, pos): a rule is being tried at pos.
+# - exit(rule, start, end): the rule entered at start matched up to end.
+#   Rules that don't match are entered but never exited.
+# - terminal(item, start, end): a string, character class, regex or literal
+#   matched the text from start to end.
+# - begin(item, pos): the parser is trying something it can still back out
+#   of: a Choice alternative, an Optional, or one iteration of a repeat.
+# - commit(item, start, end): the matching begin matched, so everything
+#   reported since then stands unless an enclosing begin is discarded.
+# - discard(item, start, end): the matching begin didn't match, so
+#   everything reported since then was abandoned. end is how far it got.
+#
+# begin is always followed by exactly one commit or discard, and they nest.
+# Lookaheads (And, Not) run the recognizer and report nothing. Wrapping a
+# handler in Committed holds back events until nothing can undo them.
+
+Event = collections.namedtuple('Event', ['kind', 'item', 'start', 'end'])
+
+
+class Handler:
+    def enter(self, rule, pos):
+        pass
+
+    def exit(self, rule, start, end):
+        pass
+
+    def terminal(self, item, start, end):
+        pass
+
+    def begin(self, item, pos):
+        pass
+
+    def commit(self, item, start, end):
+        pass
+
+    def discard(self, item, start, end):
+        pass
+
+
+class EventList(Handler):
+    def __init__(self):
+        self.events = []
+
+    def enter(self, rule, pos):
+        self.events.append(Event('enter', rule, pos, None))
+
+    def exit(self, rule, start, end):
+        self.events.append(Event('exit', rule, start, end))
+
+    def terminal(self, item, start, end):
+        self.events.append(Event('terminal', item, start, end))
+
+    def begin(self, item, pos):
+        self.events.append(Event('begin', item, pos, None))
+
+    def commit(self, item, start, end):
+        self.events.append(Event('commit', item, start, end))
+
+    def discard(self, item, start, end):
+        self.events.append(Event('discard', item, start, end))
+
+
+# Passes enter, exit and terminal events on to handler once no enclosing
+# begin is pending, dropping the ones that get discarded. Events inside a
+# begin are buffered until it's decided, so memory grows with the largest
+# stretch of input the grammar can back out of.
+class Committed(Handler):
+    def __init__(self, handler):
+        self.handler = handler
+        self.pending = []
+
+    def forward(self, method, *args):
+        if self.pending:
+            self.pending[-1].append((method, args))
+        else:
+            method(*args)
+
+    def enter(self, rule, pos):
+        self.forward(self.handler.enter, rule, pos)
+
+    def exit(self, rule, start, end):
+        self.forward(self.handler.exit, rule, start, end)
+
+    def terminal(self, item, start, end):
+        self.forward(self.handler.terminal, item, start, end)
+
+    def begin(self, item, pos):
+        self.pending.append([])
+
+    def commit(self, item, start, end):
+        accepted = self.pending.pop()
+        if self.pending:
+            self.pending[-1].extend(accepted)
+        else:
+            for method, args in accepted:
+                method(*args)
+
+    def discard(self, item, start, end):
+        self.pending.pop()
+
+
+class EventState(parser.ParseState):
+    def __init__(self, source, handler):
+        super().__init__(source)
+        self.handler = handler
+
+
+# Results use the recognizer's encoding from the parser module: an end
+# offset for a Match, MISS, or the encoded end of a Partial.
+MISS = parser.MISS
+partial_end = parser.partial_end
+
+
+def reached(end, pos):
+    if end >= 0:
+        return end
+    elif end == MISS:
+        return pos
+    else:
+        return partial_end(end)
+
+
+def attempt(state, item, pos, visit, target):
+    handler = state.handler
+    handler.begin(item, pos)
+    end = visit(state, target, pos)
+    if end >= 0:
+        handler.commit(item, pos, end)
+    else:
+        handler.discard(item, pos, reached(end, pos))
+    return end
+
+
+def emit_rule(state, rule, pos):
+    handler = state.handler
+    handler.enter(rule, pos)
+    cut = state.cut
+    outer_choice = state.outer_choice
+    state.cut = False
+    state.outer_choice = state.choice
+    end = emit_item(state, rule.expr, pos)
+    state.cut = cut
+    state.outer_choice = outer_choice
+    if end >= 0:
+        handler.exit(rule, pos, end)
+    return end
+
+
+def emit_params(state, params, pos):
+    current = pos
+
+    for i, (_, value) in enumerate(params):
+        end = emit_item(state, value, current)
+        if end >= 0:
+            current = end
+        elif end == MISS:
+            if i:
+                return partial_end(current)
+            return MISS
+        else:
+            return end
+
+    return current
+
+
+def emit_expr(state, expr, pos):
+    return emit_params(state, expr.params, pos)
+
+
+def repeat_emit_params(state, expr, pos):
+    [(_, sub_expr)] = expr.params
+    params = sub_expr.params
+    current = pos
+    count = 0
+
+    while current < state.length:
+        end = attempt(state, expr, current, emit_params, params)
+        if end >= 0:
+            count += 1
+            if end == current:
+                return count, current, None
+            current = end
+        elif end == MISS:
+            return count, current, None
+        else:
+            return count, current, partial_end(end)
+
+    state.hit_end = True
+    return count, current, None
+
+
+def emit_one_or_more(state, expr, pos):
+    count, current, partial = repeat_emit_params(state, expr, pos)
+    if count:
+        return current if partial is None else partial
+    elif partial is not None:
+        return partial_end(partial)
+    else:
+        return MISS
+
+
+def emit_zero_or_more(state, expr, pos):
+    count, current, partial = repeat_emit_params(state, expr, pos)
+    if not count and partial is not None:
+        return partial_end(partial)
+    return current
+
+
+def emit_optional(state, expr, pos):
+    end = attempt(state, expr, pos, emit_params, expr.params)
+    if end == MISS:
+        return pos
+    return end
+
+
+def emit_choice(state, expr, pos):
+    dispatch = expr.dispatch
+    if dispatch is None:
+        dispatch = analysis.choice_dispatch(expr)
+
+    candidates = dispatch.candidates(state.data[pos])
+    longest_partial = None
+    cut = state.cut
+    choice = state.choice
+    last = len(expr.params) - 1
+
+    for i, (_, value) in enumerate(expr.params):
+        if i not in candidates:
+            continue
+
+        state.cut = False
+        if choice is None and i < last:
+            state.choice = pos
+        end = attempt(state, value, pos, emit_item, value)
+        committed = state.cut
+        state.cut = cut
+        state.choice = choice
+
+        if end >= 0:
+            return end
+        elif end != MISS:
+            end = partial_end(end)
+            if longest_partial is None or end > longest_partial:
+                longest_partial = end
+
+        if committed:
+            break
+
+    if longest_partial is not None:
+        return partial_end(longest_partial)
+    return MISS
+
+
+def terminal(recognizer):
+    def emit(state, item, pos):
+        end = recognizer(state, item, pos)
+        if end >= 0:
+            state.handler.terminal(item, pos, end)
+        return end
+
+    return emit
+
+
+# The optimizer replaces rules that are only literals with the literals
+# themselves, so the rule is reported around them.
+def literal(recognizer):
+    def emit(state, item, pos):
+        rule = item.rule
+        handler = state.handler
+        if rule is not None:
+            handler.enter(rule, pos)
+
+        end = recognizer(state, item, pos)
+        if end >= 0:
+            handler.terminal(item, pos, end)
+            if rule is not None:
+                handler.exit(rule, pos, end)
+
+        return end
+
+    return emit
+
+
+EMITTERS = {
+    grammar.And: parser.recognize_and,
+    grammar.AnyChar: terminal(parser.recognize_any_char),
+    grammar.CharRange: terminal(parser.recognize_char_range),
+    grammar.CharSet: terminal(parser.recognize_char_set),
+    grammar.Choice: emit_choice,
+    grammar.Cut: parser.recognize_cut,
+    grammar.Expr: emit_expr,
+    grammar.LiteralChoice: literal(parser.recognize_literal_choice),
+    grammar.LiteralSequence: literal(parser.recognize_literal_sequence),
+    grammar.Not: parser.recognize_not,
+    grammar.NotCharSet: terminal(parser.recognize_not_char_set),
+    grammar.OneOrMore: emit_one_or_more,
+    grammar.Optional: emit_optional,
+    grammar.Regex: terminal(parser.recognize_regex),
+    grammar.Rule: emit_rule,
+    str: terminal(parser.recognize_str),
+    grammar.UnicodeCategory: terminal(parser.recognize_unicode_category),
+    grammar.ZeroOrMore: emit_zero_or_more,
+}
+
+
+def emit_item(state, item, pos):
+    if pos >= state.length:
+        state.hit_end = True
+        return MISS
+
+    return EMITTERS[type(item)](state, item, pos)
+
+
+# Parses the input with the rule named by symbol, reporting to handler as it
+# goes. Returns the end offset of the match. Events were already reported by
+# the time the input turns out not to match, so errors are raised after
+# them, like they are for a SAX parser. They're the same errors as
+# actions.parse raises, with a Miss or Partial node for the rule that has no
+# value.
+def parse(rules, symbol, buffer, handler):
+    rule = parser.find_rule(rules, symbol)
+    state = EventState(buffer.source, handler)
+    start = buffer.index
+
+    end = emit_item(state, rule, start)
+    if end == MISS:
+        parser.raise_parse_error(
+            parser.Miss(rule, None, state.source, start, start))
+    elif end < state.length:
+        parser.raise_parse_error(parser.Partial(
+            rule, None, state.source, start, reached(end, start)))
+
+    return end
@@ -0,0 +1,190 @@
+import tracemalloc
+import unittest
+
+import events
+import grammar
+import optimizer
+import parser
+import reader
+from grammar import Choice, Expr, OneOrMore, Ref
+
+
+def get_rules():
+    rules = {
+        'Lines': OneOrMore(line=Ref('Line')),
+        'Line': Expr(sum=Ref('Sum'), end='\n'),
+        'Sum': Expr(
+            left=Ref('Value'),
+            suffix=grammar.ZeroOrMore(
+                operator=Choice('+', '-'),
+                right=Ref('Sum'))),
+        'Value': Choice(
+            digits=OneOrMore(Ref('Number')),
+            sub_expr=Expr(
+                left_paren='(',
+                inner_sum=Ref('Sum'),
+                right_paren=')')),
+        'Number': Choice('0', '1', '2', '3', '4', '5', '6', '7', '8', '9'),
+    }
+    return list(grammar.resolve_refs(rules))
+
+
+def parse_events(rules, symbol, text, committed=False):
+    handler = events.EventList()
+    if committed:
+        events.parse(
+            rules, symbol, reader.get_string_reader(text),
+            events.Committed(handler))
+    else:
+        events.parse(rules, symbol, reader.get_string_reader(text), handler)
+    return handler.events
+
+
+def tree_spans(node):
+    rule_spans = []
+    terminal_spans = []
+    stack = [node]
+
+    while stack:
+        node = stack.pop()
+        if isinstance(node, parser.ParseNode):
+            if isinstance(node.source, grammar.Rule):
+                rule_spans.append(
+                    (node.source.symbol, node.start, node.end))
+            stack.append(node.value)
+        elif isinstance(node, reader.Value):
+            terminal_spans.append((node.start, node.end))
+        elif node is not None:
+            stack.extend(value for _, value in node)
+
+    return sorted(rule_spans), sorted(terminal_spans)
+
+
+def event_spans(found):
+    rule_spans = sorted(
+        (event.item.symbol, event.start, event.end)
+        for event in found if event.kind == 'exit')
+    terminal_spans = sorted(
+        (event.start, event.end)
+        for event in found if event.kind == 'terminal')
+    return rule_spans, terminal_spans
+
+
+class CountingHandler(events.Handler):
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.exits = 0
+
+    def exit(self, rule, start, end):
+        if rule.symbol == self.symbol:
+            self.exits += 1
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_same_as_parse_tree(self):
+        rules = get_rules()
+        text = '12+(3-4)\n(5)\n'
+        node = parser.parse(rules, reader.get_string_reader(text))
+        self.assertIsInstance(node, parser.Match)
+
+        found = parse_events(rules, 'Lines', text, committed=True)
+        self.assertEqual(tree_spans(node), event_spans(found))
+        kinds = {event.kind for event in found}
+        self.assertEqual({'enter', 'exit', 'terminal'}, kinds)
+
+    def test_backtracking(self):
+        rules = list(grammar.resolve_refs({
+            'Value': Choice(
+                first=Expr(Ref('Int'), Ref('Int'), Ref('Int'), 'x'),
+                second=Expr(Ref('Int'), Ref('Int'), 'y')),
+            'Int': Choice('0', '1', '2', '3', '4', '5', '6', '7', '8', '9'),
+        }))
+
+        found = parse_events(rules, 'Value', '12y')
+        [discarded] = [
+            event for event in found
+            if event.kind == 'discard' and type(event.item) is Expr]
+        self.assertEqual((0, 2), (discarded.start, discarded.end))
+        int_exits = [
+            (event.start, event.end) for event in found
+            if event.kind == 'exit' and event.item.symbol == 'Int']
+        self.assertEqual([(0, 1), (1, 2), (0, 1), (1, 2)], int_exits)
+
+        committed = parse_events(rules, 'Value', '12y', committed=True)
+        self.assertEqual(
+            [('Int', 0, 1), ('Int', 1, 2), ('Value', 0, 3)],
+            [(event.item.symbol, event.start, event.end)
+             for event in committed if event.kind == 'exit'])
+        self.assertEqual(
+            [(0, 1), (1, 2), (2, 3)],
+            [(event.start, event.end)
+             for event in committed if event.kind == 'terminal'])
+
+    def test_nesting(self):
+        handler = events.EventList()
+        buffer = reader.get_string_reader('1+(2-3)\n(4\n')
+        with self.assertRaises(parser.IncompleteParseError):
+            events.parse(get_rules(), 'Lines', buffer, handler)
+
+        found = handler.events
+        self.assertIn('discard', {event.kind for event in found})
+        pending = []
+        for event in found:
+            if event.kind == 'begin':
+                pending.append(event)
+            elif event.kind in ('commit', 'discard'):
+                begin = pending.pop()
+                self.assertIs(begin.item, event.item)
+                self.assertEqual(begin.start, event.start)
+        self.assertEqual([], pending)
+
+    def test_optimized(self):
+        rules = get_rules()
+        optimized, _ = optimizer.optimize(get_rules())
+        text = '12+(3-4)\n'
+        expected = parse_events(rules, 'Lines', text, committed=True)
+        found = parse_events(optimized, 'Lines', text, committed=True)
+        self.assertEqual(event_spans(expected)[0], event_spans(found)[0])
+
+    def test_nothing_matches(self):
+        with self.assertRaises(parser.NothingMatchesError) as context:
+            parse_events(get_rules(), 'Lines', 'x\n')
+        self.assertEqual(0, context.exception.value.start)
+        self.assertEqual('Lines', context.exception.node.source.symbol)
+
+    def test_incomplete(self):
+        with self.assertRaises(parser.IncompleteParseError) as context:
+            parse_events(get_rules(), 'Lines', '1+2\n1+\n')
+        # The last line is a Partial, which OneOrMore keeps.
+        self.assertEqual(6, context.exception.node.end)
+        self.assertEqual('1+2\n1+', context.exception.value.text)
+
+    def test_unknown_rule(self):
+        with self.assertRaises(KeyError):
+            parse_events(get_rules(), 'Missing', '1\n')
+
+    def test_memory_doesnt_grow_with_input(self):
+        rules = get_rules()
+
+        def peak(text):
+            handler = CountingHandler('Line')
+            buffer = reader.get_string_reader(text)
+            tracemalloc.start()
+            try:
+                events.parse(rules, 'Lines', buffer, handler)
+                _, found = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            return found, handler.exits
+
+        line = '12+(3-4)-5\n'
+        peak(line)
+        small, small_exits = peak(line * 10)
+        large, large_exits = peak(line * 1000)
+        self.assertEqual(100 * small_exits, large_exits)
+        self.assertLess(large, 2 * small)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,49 +1,44 @@
+import actions
 import grammar
 from grammar import Ref, Expr, Choice, ZeroOrMore, OneOrMore, Optional, And, Not
+import reader
 
 
 
-MY_GRAMMAR = {
-    'Sum': Expr(
-        left=Ref('Product'),
-        suffix=ZeroOrMore(
-            operator=Choice('+', '-'),
-            right=Ref('Product'))),
-
-    'Product': Expr(
-        left=Ref('Power'),
-        suffix=ZeroOrMore(
-            operator=Choice('*', '/'),
-            right=Ref('Power'))),
-
-    'Power': Expr(
-        base=Ref('Value'),
-        suffix=Optional(
-            operator='^',
-            exponent=Ref('Power'))),
-
-    'Value': Choice(
-        digits=OneOrMore(Ref('Number')),
-        sub_expr=Expr(
-            left_paren='(',
-            inner_sum=Ref('Sum'),
-            right_paren=')')),
-
-    'Number': Choice('0', '1', '2', '3', '4', '5', '6', '7', '8', '9'),
-}
-
+def get_grammar():
+    return {
+        'Sum': Expr(
+            left=Ref('Product'),
+            suffix=ZeroOrMore(
+                operator=Choice('+', '-'),
+                right=Ref('Product'))),
 
-MY_RULES = grammar.resolve_refs(MY_GRAMMAR)
+        'Product': Expr(
+            left=Ref('Power'),
+            suffix=ZeroOrMore(
+                operator=Choice('*', '/'),
+                right=Ref('Power'))),
 
+        'Power': Expr(
+            base=Ref('Value'),
+            suffix=Optional(
+                operator='^',
+                exponent=Ref('Power'))),
 
-import reader
+        'Value': Choice(
+            digits=OneOrMore(Ref('Number')),
+            sub_expr=Expr(
+                left_paren='(',
+                inner_sum=Ref('Sum'),
+                right_paren=')')),
 
-buffer = reader.get_string_reader('(1+2)^3')
+        'Number': Choice('0', '1', '2', '3', '4', '5', '6', '7', '8', '9'),
+    }
 
 
-import parser
+MY_GRAMMAR = get_grammar()
 
-root = parser.parse(MY_RULES, buffer)
+MY_RULES = grammar.resolve_refs(MY_GRAMMAR)
 
 
 def handle_sum(context, value):
@@ -105,13 +100,80 @@ INTEPRET_HANDLERS = {
 }
 
 
-import interpreter
+# Actions compute the same results in one pass during the parse, without
+# building a parse tree or syntax tree first.
+def reduce_operators(value):
+    accumulator = value.left
+
+    for suffix in value.suffix or []:
+        operator = suffix.operator[0].text
+        right = suffix.right
+
+        if operator == '+':
+            accumulator += right
+        elif operator == '-':
+            accumulator -= right
+        elif operator == '*':
+            accumulator *= right
+        elif operator == '/':
+            accumulator /= right
+        else:
+            assert False, 'Bad operator'
+
+    return accumulator
+
+
+def reduce_power(value):
+    if not value.suffix:
+        return value.base
+
+    return value.base ** value.suffix.exponent
+
+
+def reduce_value(value):
+    if value.sub_expr:
+        return value.sub_expr.inner_sum
+
+    result = 0
+    for digit in value.digits:
+        result = result * 10 + digit[0]
+
+    return result
+
+
+def reduce_number(value):
+    return int(value[0].text)
+
+
+ACTIONS = {
+    'Line': lambda value: value.sum,
+    'Sum': reduce_operators,
+    'Product': reduce_operators,
+    'Power': reduce_power,
+    'Value': reduce_value,
+    'Number': reduce_number,
+}
+
+
+# The Line rule ends the input with a newline so the optional suffixes at the
+# end of a Sum have something to miss on.
+def get_action_rules():
+    action_grammar = get_grammar()
+    action_grammar['Line'] = Expr(sum=Ref('Sum'), newline='\n')
+    return list(grammar.resolve_refs(action_grammar, actions=ACTIONS))
+
+
+ACTION_RULES = [rule for rule in get_action_rules() if rule.symbol == 'Line']
+
+
+def evaluate(text):
+    buffer = reader.get_string_reader(text + '\n')
+    return actions.parse(ACTION_RULES, buffer)
 
-# XXX: Need to test exponents and optional, it's not working
 
-context = interpreter.Context(INTEPRET_HANDLERS)
-result = context.interpret(root)
-print(result)
+def main():
+    print(evaluate('(1+2)^3'))
 
 
-# interpreter.repl(MY_RULES, context)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+import analysis
+import grammar
+import parameters
+import parser
+import reader
+from parser import Match, Miss, Partial
+
+
+# A parse mode for inputs that are expected to be valid. Visitors return a
+# Match node, a Partial node without a value, or None for a Miss. Instead of
+# keeping Partial subtrees around for error reporting the state only
+# remembers the furthest position where an item failed and which items were
+# expected there. When the parse does fail, the regular parser can be run
+# again to get the detailed result.
+#
+# Whether an item matched, partially matched or missed, and where it ended,
+# follows the same rules as parser.recognize, so the same inputs are
+# accepted. The Match tree has the same nodes as parser.parse would build
+# for what matched, but Partials are left out: Choice alternatives that were
+# abandoned as a Partial are None, like actions.parse leaves them, and a
+# repeat's trailing Partial iteration isn't in its Params, though the repeat
+# still ends where that iteration did.
+
+
+class Failure:
+    __slots__ = ('input_source', 'index', 'expected')
+
+    def __init__(self, input_source, index, expected):
+        self.input_source = input_source
+        self.index = index
+        self.expected = expected
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}('
+            f'index={self.index!r}, expected={self.expected!r})')
+
+    @property
+    def remaining(self):
+        return reader.Reader(self.input_source, self.index)
+
+
+class FastState(parser.ParseState):
+    def __init__(self, source, memo=None):
+        super().__init__(source, memo=memo)
+        self.furthest = -1
+        self.expected = []
+
+    def fail(self, item, pos):
+        if pos > self.furthest:
+            self.furthest = pos
+            self.expected.clear()
+            self.expected.append(item)
+        elif pos == self.furthest:
+            self.expected.append(item)
+
+
+def descend_rule(state, rule, pos):
+    memo = state.memo
+    if memo is not None:
+        found = memo.get(rule, pos)
+        if found is not None:
+            if type(found) is Miss:
+                return None
+            return found
+
+    cut = state.cut
+    outer_choice = state.outer_choice
+    state.cut = False
+    state.outer_choice = state.choice
+    node = descend(state, rule.expr, pos)
+    state.cut = cut
+    state.outer_choice = outer_choice
+
+    if node is None:
+        result = None
+    elif type(node) is Match:
+        result = Match(rule, node, state.source, pos, node.end)
+    else:
+        result = Partial(rule, None, state.source, pos, node.end)
+
+    if memo is not None:
+        if result is None:
+            memo.put(rule, pos, Miss(rule, None, state.source, pos, pos))
+        else:
+            memo.put(rule, pos, result)
+
+    return result
+
+
+def match_params(state, source, params, pos):
+    found = parameters.Params()
+    current = pos
+
+    for i, (key, value) in enumerate(params):
+        node = descend(state, value, current)
+        if node is None:
+            if i:
+                return Partial(source, None, state.source, pos, current)
+            return None
+        elif type(node) is Partial:
+            return Partial(source, None, state.source, pos, node.end)
+        found.assign(key, node)
+        current = node.end
+
+    return Match(source, found, state.source, pos, current)
+
+
+def descend_expr(state, expr, pos):
+    return match_params(state, expr, expr.params, pos)
+
+
+# Returns the iterations that matched, where the last of them ended, and a
+# trailing Partial iteration or None.
+def repeat_match_params(state, expr, pos):
+    [(_, sub_expr)] = expr.params
+    params = sub_expr.params
+    found = parameters.Params()
+    current = pos
+    i = 0
+
+    while current < state.length:
+        node = match_params(state, sub_expr, params, current)
+        if node is None:
+            return found, current, None
+        elif type(node) is Partial:
+            return found, current, node
+        found.assign(i, node)
+        if node.end == current:
+            return found, current, None
+        current = node.end
+        i += 1
+
+    state.hit_end = True
+    return found, current, None
+
+
+# Like parser.recognize_one_or_more, a trailing Partial iteration after
+# others matched still ends the Match.
+def descend_one_or_more(state, expr, pos):
+    found, current, partial = repeat_match_params(state, expr, pos)
+    if found:
+        if partial is not None:
+            current = partial.end
+        return Match(expr, found, state.source, pos, current)
+    elif partial is not None:
+        return Partial(expr, None, state.source, pos, partial.end)
+    return None
+
+
+def descend_zero_or_more(state, expr, pos):
+    found, current, partial = repeat_match_params(state, expr, pos)
+    if not found and partial is not None:
+        return Partial(expr, None, state.source, pos, partial.end)
+    return Match(expr, found, state.source, pos, current)
+
+
+def descend_optional(state, expr, pos):
+    node = match_params(state, expr, expr.params, pos)
+    if node is None:
+        return Match(expr, None, state.source, pos, pos)
+    elif type(node) is Partial:
+        return Partial(expr, None, state.source, pos, node.end)
+    return Match(expr, node, state.source, pos, node.end)
+
+
+def descend_and(state, expr, pos):
+    end = parser.recognize_params(state, expr.params, pos)
+    if end >= 0:
+        return Match(expr, None, state.source, pos, pos)
+    elif end == parser.MISS:
+        return None
+    return Partial(expr, None, state.source, pos, pos)
+
+
+def descend_not(state, expr, pos):
+    if parser.recognize_params(state, expr.params, pos) >= 0:
+        return None
+    return Match(expr, None, state.source, pos, pos)
+
+
+def descend_choice(state, expr, pos):
+    dispatch = expr.dispatch
+    if dispatch is None:
+        dispatch = analysis.choice_dispatch(expr)
+
+    candidates = dispatch.candidates(state.data[pos])
+    pairs = expr.params
+    cut = state.cut
+    choice = state.choice
+    last = len(pairs) - 1
+    longest_partial = None
+
+    for i, (_, value) in enumerate(pairs):
+        if i not in candidates:
+            continue
+
+        state.cut = False
+        if choice is None and i < last:
+            state.choice = pos
+        node = descend(state, value, pos)
+        committed = state.cut
+        state.cut = cut
+        state.choice = choice
+
+        if type(node) is Match:
+            # Only the successful Choice pays for filling in the
+            # alternatives, and the ones that weren't taken are all None.
+            found = parameters.Params()
+            for j, (key, _) in enumerate(pairs):
+                found.assign(key, node if j == i else None)
+
+            return Match(expr, found, state.source, pos, node.end)
+
+        if node is not None:
+            if longest_partial is None or node.end > longest_partial:
+                longest_partial = node.end
+        if committed:
+            break
+    else:
+        # Alternatives ruled out by dispatch never reach a terminal, so the
+        # Choice stands in for them.
+        state.fail(expr, pos)
+
+    if longest_partial is not None:
+        return Partial(expr, None, state.source, pos, longest_partial)
+    return None
+
+
+def descend_str(state, expr, pos):
+    if state.data.startswith(expr, pos):
+        end = pos + len(expr)
+        value = reader.Value(state.source, pos, end)
+        return Match(expr, value, state.source, pos, end)
+
+    # Only called for its hit_end bookkeeping.
+    parser.recognize_str(state, expr, pos)
+    state.fail(expr, pos)
+    return None
+
+
+# Other terminals share the recognizer, and only allocate a node when they
+# match.
+def descend_terminal(state, item, pos):
+    end = parser.RECOGNIZERS[type(item)](state, item, pos)
+    if end < 0:
+        state.fail(item, pos)
+        return None
+
+    value = reader.Value(state.source, pos, end)
+    return Match(item, value, state.source, pos, end)
+
+
+VISITORS = {
+    grammar.And: descend_and,
+    grammar.AnyChar: descend_terminal,
+    grammar.CharRange: descend_terminal,
+    grammar.CharSet: descend_terminal,
+    grammar.Choice: descend_choice,
+    grammar.Cut: parser.descend_cut,
+    grammar.Expr: descend_expr,
+    grammar.LiteralChoice: descend_terminal,
+    grammar.LiteralSequence: descend_terminal,
+    grammar.Not: descend_not,
+    grammar.NotCharSet: descend_terminal,
+    grammar.OneOrMore: descend_one_or_more,
+    grammar.Optional: descend_optional,
+    grammar.Regex: descend_terminal,
+    grammar.Rule: descend_rule,
+    str: descend_str,
+    grammar.UnicodeCategory: descend_terminal,
+    grammar.ZeroOrMore: descend_zero_or_more,
+}
+
+
+def descend(state, item, pos):
+    if pos >= state.length:
+        state.hit_end = True
+        state.fail(item, pos)
+        return None
+
+    return VISITORS[type(item)](state, item, pos)
+
+
+# Returns the Match when one of the rules matches all of the input. Otherwise
+# by default the regular parser runs again and its result is returned, so
+# callers get the same Partial or Miss node for error reporting that
+# parser.parse would give them. With detailed=False a Failure describing the
+# furthest position reached is returned instead.
+def parse(rules, buffer, *, memo=None, detailed=True):
+    if memo is not None:
+        memo.clear()
+
+    state = FastState(buffer.source, memo=memo)
+
+    for rule in rules:
+        node = descend(state, rule, buffer.index)
+        if type(node) is Match and node.end >= state.length:
+            return node
+
+    if detailed:
+        return parser.parse(rules, buffer, memo=memo)
+
+    return Failure(
+        state.source, max(state.furthest, buffer.index),
+        frozenset(state.expected))
@@ -0,0 +1,141 @@
+import unittest
+
+import coalesce
+import fastfail
+import grammar
+import optimizer_test
+import packrat
+import parser
+import parser_test
+import reader
+from grammar import Choice, Expr, OneOrMore, Optional, Ref, ZeroOrMore
+
+
+class FastFailTest(unittest.TestCase):
+
+    def assertSameMatch(self, rules, text, **kwargs):
+        expected = parser.parse(rules, reader.get_string_reader(text))
+        found = fastfail.parse(
+            rules, reader.get_string_reader(text), **kwargs)
+        self.assertIsInstance(expected, parser.Match)
+        self.assertIsInstance(found, parser.Match)
+        self.assertIs(expected.source, found.source)
+        self.assertEqual(
+            parser_test.flatten(expected), parser_test.flatten(found))
+
+    def test_matches(self):
+        self.assertSameMatch(parser_test.get_rules(), '((3-4)+5)')
+        self.assertSameMatch(
+            parser_test.get_char_class_rules(), 'héllo=42#note\n')
+        self.assertSameMatch(parser_test.get_regex_rules(), '12 + 3.5-4')
+
+    def test_memo(self):
+        memo = packrat.Unbounded()
+        self.assertSameMatch(
+            parser_test.get_rules(), '((3-4)+5)', memo=memo)
+        self.assertGreater(len(memo), 0)
+
+    def test_detailed_failure(self):
+        rules = parser_test.get_rules()
+        for text in ['(1+2)-', '1+nope', '+1+2']:
+            with self.subTest(text=text):
+                expected = parser.parse(rules, reader.get_string_reader(text))
+                found = fastfail.parse(rules, reader.get_string_reader(text))
+                self.assertIs(type(expected), type(found))
+                self.assertEqual(
+                    parser_test.flatten(expected),
+                    parser_test.flatten(found))
+                self.assertEqual(expected.end, found.end)
+
+    def test_failure(self):
+        rules = parser_test.get_char_class_rules()
+        found = fastfail.parse(
+            rules, reader.get_string_reader('ab=x'), detailed=False)
+        self.assertIsInstance(found, fastfail.Failure)
+        self.assertEqual(3, found.index)
+        self.assertEqual(3, found.remaining.index)
+        self.assertEqual(
+            ['CharRange'], [type(e).__name__ for e in found.expected])
+
+    def test_cut(self):
+        rules = parser_test.get_cut_rules()
+        self.assertSameMatch(rules, 'let x;f;')
+
+        found = fastfail.parse(
+            rules, reader.get_string_reader('let;'), detailed=False)
+        self.assertEqual(3, found.index)
+        self.assertIn(' ', found.expected)
+
+    def test_failure_at_choice(self):
+        rules = parser_test.get_rules()
+        found = fastfail.parse(
+            rules, reader.get_string_reader('1+2)'), detailed=False)
+        self.assertEqual(3, found.index)
+        self.assertEqual(
+            {('+', '-'), tuple('0123456789')},
+            {tuple(v for _, v in e.params) for e in found.expected})
+
+    def test_partial_alternative(self):
+        for item in [Optional('b', 'c'), ZeroOrMore('b', 'c')]:
+            with self.subTest(item=item):
+                rules = list(grammar.resolve_refs({
+                    'S': Expr(Choice(item, 'b'), 'a'),
+                }))
+                self.assertIsInstance(
+                    parser.parse(rules, reader.get_string_reader('ba')),
+                    parser.Match)
+                found = fastfail.parse(
+                    rules, reader.get_string_reader('ba'), detailed=False)
+                self.assertIsInstance(found, parser.Match)
+                self.assertEqual(2, found.end)
+
+    def test_partial_iteration(self):
+        rules = list(grammar.resolve_refs({
+            'S': Expr(OneOrMore('a', 'b'), 'a'),
+        }))
+        found = fastfail.parse(
+            rules, reader.get_string_reader('aba'), detailed=False)
+        self.assertIsInstance(found, fastfail.Failure)
+        self.assertIsNone(parser.recognize(rules, 'aba'))
+
+        found = fastfail.parse(rules, reader.get_string_reader('aba'))
+        self.assertIsInstance(found, parser.Partial)
+
+    def test_item_after_partial_iteration(self):
+        for item in [OneOrMore('a', 'b'), ZeroOrMore('a', 'b')]:
+            rules = list(grammar.resolve_refs({
+                'S': Expr(Ref('Pairs'), Optional('!')),
+                'Pairs': item,
+            }))
+            rules = [parser.find_rule(rules, 'S')]
+            for text in ['aba!', 'aba', 'ab!', 'a!', '!']:
+                for memo in [None, packrat.Unbounded()]:
+                    with self.subTest(item=item, text=text, memo=memo):
+                        found = fastfail.parse(
+                            rules, reader.get_string_reader(text),
+                            memo=memo, detailed=False)
+                        end = parser.recognize(rules, text)
+                        if end == len(text):
+                            self.assertIsInstance(found, parser.Match)
+                            self.assertEqual(end, found.end)
+                        else:
+                            self.assertIsInstance(found, fastfail.Failure)
+
+    def test_abandoned_partial_dropped(self):
+        rules = list(grammar.resolve_refs({
+            'S': Expr(v=Choice(Expr('a', 'b', 'c'), Expr('a', 'b')), x='x'),
+        }))
+        expected = parser.parse(rules, reader.get_string_reader('abx'))
+        found = fastfail.parse(rules, reader.get_string_reader('abx'))
+        self.assertIsInstance(found, parser.Match)
+
+        # The parser keeps the first alternative's Partial node.
+        self.assertEqual(
+            [0, 1], [key for key, _ in coalesce.coalesce(expected).v])
+        self.assertEqual(
+            ('S', [('v', [(1, [(0, 'a'), (1, 'b')])]), ('x', 'x')]),
+            optimizer_test.to_data(coalesce.coalesce(found)))
+
+
+if __name__ == '__main__':
+    unittest.main()
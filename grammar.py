@@ -1,3 +1,5 @@
+import re
+
 import parameters
 
 
@@ -27,7 +29,10 @@ class Expr:
 
 
 class Choice(Expr):
-    pass
+    # Filled in by analysis.choice_dispatch and analysis.choice_prefixes on
+    # first use
+    dispatch = None
+    prefixes = None
 
 
 class RepeatedExpr(Expr):
@@ -55,10 +60,118 @@ class Not(Expr):
     pass
 
 
+# Commits to the alternative of the innermost Choice in the same rule: once a
+# Cut matches, a failure later in that alternative doesn't go on to try the
+# remaining ones. It matches without consuming input.
+class Cut:
+    def __repr__(self):
+        return f'{self.__class__.__name__}()'
+
+
+class Terminal:
+    def __repr__(self):
+        return f'{self.__class__.__name__}()'
+
+
+class CharClass(Terminal):
+    pass
+
+
+class CharRange(CharClass):
+    def __init__(self, low, high):
+        assert len(low) == 1 and len(high) == 1
+        assert low <= high
+        self.low = low
+        self.high = high
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.low!r}, {self.high!r})'
+
+
+class CharSet(CharClass):
+    def __init__(self, chars):
+        self.chars = frozenset(chars)
+
+    def __repr__(self):
+        chars = ''.join(sorted(self.chars))
+        return f'{self.__class__.__name__}({chars!r})'
+
+
+class NotCharSet(CharSet):
+    pass
+
+
+class AnyChar(CharClass):
+    pass
+
+
+class UnicodeCategory(CharClass):
+    def __init__(self, *categories):
+        assert categories
+        self.categories = categories
+        # Filled in lazily as characters are seen
+        self.table = {}
+
+    def __repr__(self):
+        categories = ', '.join(repr(c) for c in self.categories)
+        return f'{self.__class__.__name__}({categories})'
+
+
+# Matches a whole lexeme with one call into the re module. When streaming,
+# a match that reaches the end of the buffer waits for more input, but a miss
+# is taken as final, so patterns shouldn't fail only for lack of input.
+class Regex(Terminal):
+    def __init__(self, pattern, flags=0):
+        self.pattern = re.compile(pattern, flags)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.pattern.pattern!r})'
+
+
+# The optimizer module builds these from Choices and Exprs made only of
+# literals. Each literal keeps the path of keys to where it was in the
+# original grammar, so the coalesce module can rebuild the syntax tree the
+# original would have produced. When rule is set, the item stands in for a
+# reference to that rule.
+class LiteralChoice(Terminal):
+    def __init__(self, literals, rule=None):
+        # Pairs of literal and path, in the order they're tried
+        self.literals = literals
+        self.rule = rule
+        self.paths = {}
+        self.table = {}
+
+        for literal, path in literals:
+            assert literal
+            self.paths.setdefault(literal, path)
+            self.table.setdefault(literal[0], []).append(literal)
+
+    def __repr__(self):
+        literals = ', '.join(repr(literal) for literal, _ in self.literals)
+        return f'{self.__class__.__name__}({literals})'
+
+
+class LiteralSequence(Terminal):
+    def __init__(self, parts, rule=None, spliced=False):
+        # Pairs of path and literal, in order
+        self.parts = parts
+        self.rule = rule
+        # When spliced, the parts belong to the enclosing Expr's params.
+        self.spliced = spliced
+        self.text = ''.join(literal for _, literal in parts)
+        assert self.text
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.text!r})'
+
+
+# The action is a function that actions.parse calls with the rule's
+# reduced value as soon as the rule matches.
 class Rule:
-    def __init__(self, symbol, expr):
+    def __init__(self, symbol, expr, action=None):
         self.symbol = symbol
         self.expr = expr
+        self.action = action
 
     def __repr__(self):
         return (
@@ -79,7 +192,7 @@ def deref_single(rules, value):
     if isinstance(value, Ref):
         return get_rule(rules, value.symbol)
 
-    if isinstance(value, str):
+    if isinstance(value, (str, Terminal, Cut)):
         return value
 
     assert isinstance(value, Expr)
@@ -95,7 +208,8 @@ def deref_single(rules, value):
     return value
 
 
-def resolve_refs(grammar):
+# Actions map symbols to the action for their rule.
+def resolve_refs(grammar, actions=None):
     rules = {}
 
     for symbol, value in grammar.items():
@@ -105,4 +219,8 @@ def resolve_refs(grammar):
         rule = get_rule(rules, symbol)
         rule.expr = dereferenced
 
+    if actions is not None:
+        for symbol, action in actions.items():
+            rules[symbol].action = action
+
     return rules.values()
@@ -16,8 +16,10 @@ class InterpretError(Error):
 
 
 class Context:
-    def __init__(self, handlers):
+    def __init__(self, handlers, tracer=None):
         self.handlers = handlers
+        self.tracer = tracer
+        self.depth = 0
 
     def interpret(self, value):
         return interpret(self.handlers, self, value)
@@ -27,10 +29,21 @@ def interpret(handlers, context, value):
     value_type = value.source.symbol
     to_handle = value
 
-    print(f'Interpreting: {value_type=} {to_handle=}')
-
     handler = handlers[value_type]
-    return handler(context, to_handle)
+
+    tracer = context.tracer
+    if tracer is None:
+        return handler(context, to_handle)
+
+    depth = context.depth
+    tracer.enter('interpret', to_handle, None, depth)
+    context.depth = depth + 1
+    try:
+        result = handler(context, to_handle)
+    finally:
+        context.depth = depth
+    tracer.exit('interpret', to_handle, result, depth)
+    return result
     # try:
 
     # except InterpretError:
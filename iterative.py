@@ -0,0 +1,294 @@
+import analysis
+import grammar
+import parameters
+import parser
+from parser import Match, Partial, Miss
+
+
+# Same grammar semantics as the parser module, but composite visitors are
+# generators. Instead of calling descend, they yield (item, pos) to ask for a
+# child node, or another generator to run as a helper, and the driver loop
+# sends the result back in. Pending work lives on a list rather than the
+# Python call stack, so nesting depth is bounded by memory alone.
+
+
+def descend_rule(state, rule, pos):
+    memo = state.memo
+    if memo is not None:
+        found = memo.get(rule, pos)
+        if found is not None:
+            return found
+
+    cut = state.cut
+    outer_choice = state.outer_choice
+    state.cut = False
+    state.outer_choice = state.choice
+    node = yield rule.expr, pos
+    state.cut = cut
+    state.outer_choice = outer_choice
+
+    node_type = type(node)
+    if node_type is Match:
+        result = Match(rule, node, state.source, pos, node.end)
+    elif node_type is Partial:
+        result = Partial(rule, node, state.source, pos, node.end)
+    else:
+        result = Miss(rule, None, state.source, pos, pos)
+
+    if memo is not None:
+        memo.put(rule, pos, result)
+
+    return result
+
+
+def match_params(state, source, params, pos, shared=()):
+    found = parameters.Params()
+    current = pos
+
+    remaining = enumerate(params)
+    if shared:
+        for node, (_, (key, _)) in zip(shared, remaining):
+            found.assign(key, node)
+            current = node.end
+
+    for i, (key, value) in remaining:
+        node = yield value, current
+        node_type = type(node)
+        if node_type is Match:
+            found.assign(key, node)
+            current = node.end
+        elif node_type is Partial:
+            found.assign(key, node)
+            return Partial(source, found, state.source, pos, node.end)
+        else:
+            found.assign(key, None)
+            if i:
+                return Partial(source, found, state.source, pos, current)
+            return Miss(source, None, state.source, pos, current)
+
+    return Match(source, found, state.source, pos, current)
+
+
+# A plain sequence needs no wrapping node, so the helper runs directly in
+# place of a visitor generator of its own.
+def descend_expr(state, expr, pos):
+    return match_params(state, expr, expr.params, pos)
+
+
+def repeat_match_params(state, sub_expr, pos):
+    current = pos
+    result = []
+
+    while current < state.length:
+        node = yield match_params(state, sub_expr, sub_expr.params, current)
+        node_type = type(node)
+        if node_type is Match:
+            result.append(node)
+            if node.end == current:
+                break
+            current = node.end
+        elif node_type is Partial:
+            result.append(node)
+            break
+        else:
+            break
+    else:
+        state.hit_end = True
+
+    return result
+
+
+def get_repeated_expr(expr):
+    pairs = list(expr.params)
+    assert len(pairs) == 1
+    index, sub_expr = pairs[0]
+    assert index == 0
+    return sub_expr
+
+
+def descend_one_or_more(state, expr, pos):
+    sub_expr = get_repeated_expr(expr)
+    result = yield repeat_match_params(state, sub_expr, pos)
+    if not result:
+        return Miss(expr, None, state.source, pos, pos)
+
+    found = parameters.Params()
+    for i, node in enumerate(result):
+        found.assign(i, node)
+
+    last = result[-1]
+    if len(result) > 1 or type(last) is Match:
+        return Match(expr, found, state.source, pos, last.end)
+    return Partial(expr, found, state.source, pos, last.end)
+
+
+def descend_zero_or_more(state, expr, pos):
+    sub_expr = get_repeated_expr(expr)
+    result = yield repeat_match_params(state, sub_expr, pos)
+    found = parameters.Params()
+    current = pos
+
+    for i, node in enumerate(result):
+        if type(node) is Match:
+            found.assign(i, node)
+            current = node.end
+        elif i == 0:
+            found.assign(i, node)
+            return Partial(expr, found, state.source, pos, node.end)
+
+    return Match(expr, found, state.source, pos, current)
+
+
+def descend_optional(state, expr, pos):
+    node = yield match_params(state, expr, expr.params, pos)
+    node_type = type(node)
+    if node_type is Match:
+        return Match(expr, node, state.source, pos, node.end)
+    elif node_type is Partial:
+        return Partial(expr, node, state.source, pos, node.end)
+    else:
+        return Match(expr, None, state.source, pos, pos)
+
+
+# Predicates drop their subtree like the recursive engine's do, but still run
+# it on the explicit stack so lookahead doesn't bring back recursion.
+def descend_and(state, expr, pos):
+    node = yield match_params(state, expr, expr.params, pos)
+    node_type = type(node)
+    if node_type is Match:
+        return Match(expr, None, state.source, pos, pos)
+    elif node_type is Partial:
+        return Partial(expr, None, state.source, pos, pos)
+    else:
+        return Miss(expr, None, state.source, pos, pos)
+
+
+def descend_not(state, expr, pos):
+    node = yield match_params(state, expr, expr.params, pos)
+    if type(node) is Match:
+        return Miss(expr, None, state.source, pos, pos)
+    else:
+        return Match(expr, None, state.source, pos, pos)
+
+
+def descend_choice(state, expr, pos):
+    candidates = analysis.choice_dispatch(expr).candidates(state.data[pos])
+    prefixes = analysis.choice_prefixes(expr)
+
+    found = parameters.Params()
+    match_node = None
+    partial_nodes = []
+    committed = False
+    cut = state.cut
+    choice = state.choice
+    last = len(expr.params) - 1
+    tried = {}
+
+    for i, (key, value) in enumerate(expr.params):
+        if match_node is None and not committed and i in candidates:
+            state.cut = False
+            if choice is None and i < last:
+                state.choice = pos
+            prefix = tried and prefixes.shared[i]
+            if prefix and prefix[0] in tried:
+                source_index, length = prefix
+                shared = parser.shared_nodes(tried[source_index], length)
+                node = yield match_params(
+                    state, value, value.params, pos, shared)
+            else:
+                node = yield value, pos
+            committed = state.cut
+            state.choice = choice
+            node_type = type(node)
+            if node_type is Match:
+                found.assign(key, node)
+                match_node = node
+                continue
+            elif node_type is Partial:
+                found.assign(key, node)
+                partial_nodes.append(node)
+                if i in prefixes.sources:
+                    tried[i] = node
+                continue
+
+        found.assign(key, None)
+
+    state.cut = cut
+
+    if match_node is not None:
+        return Match(expr, found, state.source, pos, match_node.end)
+    elif partial_nodes:
+        longest_partial = parser.longest_reader(partial_nodes)
+        return Partial(expr, found, state.source, pos, longest_partial.end)
+    else:
+        return Miss(expr, None, state.source, pos, pos)
+
+
+# Generator visitors for composite items. Terminals never descend, so they
+# reuse the plain visitors from the parser module.
+VISITORS = {
+    grammar.And: descend_and,
+    grammar.Choice: descend_choice,
+    grammar.Expr: descend_expr,
+    grammar.Not: descend_not,
+    grammar.OneOrMore: descend_one_or_more,
+    grammar.Optional: descend_optional,
+    grammar.Rule: descend_rule,
+    grammar.ZeroOrMore: descend_zero_or_more,
+}
+
+
+def run(state, item, pos):
+    visitors = VISITORS
+    terminals = parser.VISITORS
+    stack = []
+    result = None
+    request = (item, pos)
+
+    while True:
+        if type(request) is tuple:
+            item, pos = request
+            if pos >= state.length:
+                state.hit_end = True
+                result = Miss(item, None, state.source, pos, pos)
+            else:
+                kind = type(item)
+                visitor = visitors.get(kind)
+                if visitor is None:
+                    result = terminals[kind](state, item, pos)
+                else:
+                    stack.append(visitor(state, item, pos))
+                    result = None
+        else:
+            stack.append(request)
+            result = None
+
+        while True:
+            if not stack:
+                return result
+
+            try:
+                request = stack[-1].send(result)
+                break
+            except StopIteration as e:
+                stack.pop()
+                result = e.value
+
+
+# Drop-in replacement for parser.parse for grammars too deeply nested for the
+# recursive engine. It doesn't support tracing.
+def parse(rules, buffer, *, memo=None):
+    if memo is not None:
+        memo.clear()
+
+    state = parser.ParseState(buffer.source, memo=memo)
+    partials = []
+
+    for rule in rules:
+        node = run(state, rule, buffer.index)
+        if type(node) is Match and node.end >= state.length:
+            return node
+        else:
+            partials.append(node)
+
+    return parser.longest_reader(partials)
@@ -0,0 +1,84 @@
+import unittest
+
+import iterative
+import packrat
+import parser
+import parser_test
+import reader
+
+
+class IterativeParseTest(unittest.TestCase):
+
+    def assertSameParse(self, rules, text, **kwargs):
+        expected = parser.parse(rules, reader.get_string_reader(text))
+        found = iterative.parse(
+            rules, reader.get_string_reader(text), **kwargs)
+        self.assertIs(type(expected), type(found))
+        self.assertIs(expected.source, found.source)
+        self.assertEqual(
+            parser_test.flatten(expected), parser_test.flatten(found))
+        self.assertEqual(expected.remaining.index, found.remaining.index)
+
+    def test_matches_recursive(self):
+        rules = parser_test.get_rules()
+        for text in ['1', '12', '(1+2)', '(1+2)-', '1+nope', '+1+2',
+                     '((3-4)+5)', '1+2)']:
+            with self.subTest(text=text):
+                self.assertSameParse(rules, text)
+
+    def test_partial_choices(self):
+        rules = parser_test.get_partial_choice_rules()
+        for text in ['12z', '123x', '12y', 'q']:
+            with self.subTest(text=text):
+                self.assertSameParse(rules, text)
+
+    def test_empty_match_in_repetition(self):
+        rules = parser_test.get_nullable_repeat_rules()
+        for text in ['  w w.', '.', 'w x']:
+            with self.subTest(text=text):
+                self.assertSameParse(rules, text)
+
+    def test_char_classes(self):
+        rules = parser_test.get_char_class_rules()
+        for text in ['héllo=42#note\n', 'ab=x', '1=2', 'x:7\n']:
+            with self.subTest(text=text):
+                self.assertSameParse(rules, text)
+
+    def test_regex(self):
+        rules = parser_test.get_regex_rules()
+        for text in ['12 + 3.5-4', '12+x', 'x']:
+            with self.subTest(text=text):
+                self.assertSameParse(rules, text)
+
+    def test_cut(self):
+        rules = parser_test.get_cut_rules()
+        for text in ['let x;f;', 'let;', 'let x;let', 'f;let ;']:
+            with self.subTest(text=text):
+                self.assertSameParse(rules, text)
+
+    def test_memo(self):
+        memo = packrat.Unbounded()
+        self.assertSameParse(
+            parser_test.get_rules(), '(1+2)-(3+4)', memo=memo)
+        self.assertGreater(memo.hits, 0)
+
+    def test_deep_nesting(self):
+        depth = 5000
+        text = '(' * depth + '1' + ')' * depth
+        rules = parser_test.get_rules()
+
+        with self.assertRaises(RecursionError):
+            parser.parse(rules, reader.get_string_reader(text))
+
+        found = iterative.parse(rules, reader.get_string_reader(text))
+        self.assertIsInstance(found, parser.Match)
+        self.assertEqual(len(text), found.end)
+
+        self.assertEqual('Value', found.source.symbol)
+        for _ in range(depth):
+            found = found.sub_expr.inner_sum.left
+        self.assertEqual('1', found.text)
+
+
+if __name__ == '__main__':
+    unittest.main()
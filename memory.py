@@ -0,0 +1,240 @@
+import gc
+import json
+import sys
+import tracemalloc
+
+import coalesce
+import grammar
+import interpreter
+import parameters
+import parser
+import reader
+
+
+# Accounts for the memory used by each phase of turning input into a result:
+# parser.parse, coalesce.coalesce and interpreter.Context.interpret.
+#
+#     phases = memory.measure(rules, buffer, handlers)
+#     print(memory.table(phases))
+#
+# Each phase runs once with tracemalloc on, which makes it several times
+# slower, so this is for investigating inputs that use too much memory, not
+# for production traffic. For each phase it records:
+#
+# - peak_memory: the highest traced allocation in bytes while the phase ran,
+#   including garbage like the nodes thrown away by backtracking.
+# - retained_memory: bytes still allocated once the phase returned and
+#   garbage was collected, which is what the next phase starts with.
+# - live: how many more instances of each node kind were alive after the
+#   phase than before it, counted from the garbage collector's objects.
+# - kinds: instances and bytes of each node kind reachable from the phase's
+#   output. Handler results aren't walked, so interpret has none.
+# - rules: instances and bytes reachable from the phase's output, grouped by
+#   the innermost rule they're inside of. Nodes the memo shares between
+#   several places in the tree are only counted at the first one.
+#
+# Bytes come from sys.getsizeof, including the lists and dicts inside Params.
+# They don't include the input text, grammar objects or handler results.
+
+KINDS = {
+    'Match': parser.Match,
+    'Partial': parser.Partial,
+    'Miss': parser.Miss,
+    'Params': parameters.Params,
+    'Value': reader.Value,
+    'Reader': reader.Reader,
+    'SyntaxNode': coalesce.SyntaxNode,
+    'list': list,
+}
+
+KIND_NAMES = {kind: name for name, kind in KINDS.items()}
+
+# Rows for objects that aren't inside any rule, like the top of a tree built
+# from a bare expression.
+NO_RULE = ''
+
+
+class Usage:
+    __slots__ = ('count', 'bytes')
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+
+    def add(self, size):
+        self.count += 1
+        self.bytes += size
+
+    def as_dict(self):
+        return {'count': self.count, 'bytes': self.bytes}
+
+
+class Phase:
+    __slots__ = (
+        'name', 'peak_memory', 'retained_memory', 'live', 'kinds', 'rules')
+
+    def __init__(self, name):
+        self.name = name
+        self.peak_memory = 0
+        self.retained_memory = 0
+        self.live = {}
+        self.kinds = {}
+        self.rules = {}
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'peak_memory': self.peak_memory,
+            'retained_memory': self.retained_memory,
+            'live': dict(self.live),
+            'kinds': {
+                name: usage.as_dict() for name, usage in self.kinds.items()},
+            'rules': {
+                name: usage.as_dict() for name, usage in self.rules.items()},
+        }
+
+
+def size_of(item):
+    size = sys.getsizeof(item)
+    if type(item) is parameters.Params:
+        size += (
+            sys.getsizeof(item._keys) + sys.getsizeof(item._values) +
+            sys.getsizeof(item._names))
+    return size
+
+
+def get_usage(usages, name):
+    try:
+        return usages[name]
+    except KeyError:
+        usage = Usage()
+        usages[name] = usage
+        return usage
+
+
+# Walks everything reachable from root through node values, Params and
+# lists, without recursing so deep trees can't overflow the stack.
+def census(root, phase):
+    seen = set()
+    stack = [(root, NO_RULE)]
+
+    while stack:
+        item, rule = stack.pop()
+        kind = KIND_NAMES.get(type(item))
+        if kind is None or id(item) in seen:
+            continue
+        seen.add(id(item))
+
+        if isinstance(item, parser.ParseNode):
+            if isinstance(item.source, grammar.Rule):
+                rule = item.source.symbol
+            stack.append((item.value, rule))
+        elif type(item) is coalesce.SyntaxNode:
+            rule = item.source.symbol
+            stack.append((item.value, rule))
+        elif type(item) is parameters.Params:
+            stack.extend((value, rule) for value in item._values)
+        elif type(item) is list:
+            stack.extend((value, rule) for value in item)
+
+        size = size_of(item)
+        get_usage(phase.kinds, kind).add(size)
+        get_usage(phase.rules, rule).add(size)
+
+
+def count_live():
+    counts = dict.fromkeys(KINDS, 0)
+    for item in gc.get_objects():
+        kind = KIND_NAMES.get(type(item))
+        if kind is not None:
+            counts[kind] += 1
+    return counts
+
+
+def measure_phase(name, func, *args, walk=True):
+    phase = Phase(name)
+    # Garbage left by earlier work would otherwise be freed in the middle of
+    # the phase and throw off its live counts.
+    gc.collect()
+    before = count_live()
+
+    # Leave tracing on for a caller that was already tracing. Its peak is
+    # reset so the phase's peak isn't one the caller reached earlier.
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        output = func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    phase.peak_memory = peak - start
+    phase.retained_memory = current - start
+
+    after = count_live()
+    phase.live = {kind: after[kind] - before[kind] for kind in KINDS}
+
+    if walk:
+        census(output, phase)
+    return output, phase
+
+
+# Returns a list of Phases. The interpret phase is skipped without handlers,
+# and later phases are skipped when the parse doesn't match.
+def measure(rules, buffer, handlers=None, **kwargs):
+    node, phase = measure_phase(
+        'parse', lambda: parser.parse(rules, buffer, **kwargs))
+    phases = [phase]
+    if not isinstance(node, parser.Match):
+        return phases
+
+    syntax, phase = measure_phase('coalesce', coalesce.coalesce, node)
+    phases.append(phase)
+    if handlers is None:
+        return phases
+
+    context = interpreter.Context(handlers)
+    _, phase = measure_phase(
+        'interpret', context.interpret, syntax, walk=False)
+    phases.append(phase)
+    return phases
+
+
+def table(phases, limit=None):
+    lines = [
+        f'{"phase":<10} {"peak KiB":>10} {"retained KiB":>12} '
+        + ' '.join(f'{name:>10}' for name in KINDS)]
+    for phase in phases:
+        lines.append(
+            f'{phase.name:<10} {phase.peak_memory / 1024:>10.1f} '
+            f'{phase.retained_memory / 1024:>12.1f} '
+            + ' '.join(f'{phase.live[name]:>10}' for name in KINDS))
+
+    for phase in phases:
+        if not phase.rules:
+            continue
+
+        rows = sorted(
+            phase.rules.items(), key=lambda row: (-row[1].bytes, row[0]))
+        if limit is not None:
+            rows = rows[:limit]
+
+        lines.append('')
+        lines.append(
+            f'{phase.name + " rule":<40} {"objects":>10} {"KiB":>10}')
+        for name, usage in rows:
+            lines.append(
+                f'{name or "-":<40} {usage.count:>10} '
+                f'{usage.bytes / 1024:>10.1f}')
+
+    return '\n'.join(lines)
+
+
+def to_json(phases, **kwargs):
+    return json.dumps([phase.as_dict() for phase in phases], **kwargs)
@@ -0,0 +1,123 @@
+import json
+import tracemalloc
+import unittest
+
+import coalesce
+import memory
+import parser
+import parser_test
+import reader
+
+
+def measure(text, handlers=None):
+    return memory.measure(
+        parser_test.get_rules(), reader.get_string_reader(text), handlers)
+
+
+def count_symbols(context, value):
+    count = 1
+    for _, child in value.value:
+        if isinstance(child, coalesce.SyntaxNode):
+            count += context.interpret(child)
+    return count
+
+
+HANDLERS = {
+    'Sum': count_symbols,
+    'Value': count_symbols,
+    'Number': count_symbols,
+}
+
+
+class MeasureTest(unittest.TestCase):
+
+    def test_phases(self):
+        phases = measure('(1+2)+3)', HANDLERS)
+        self.assertEqual(
+            ['parse', 'coalesce', 'interpret'],
+            [phase.name for phase in phases])
+
+        for phase in phases:
+            self.assertGreater(phase.peak_memory, 0)
+            self.assertGreaterEqual(phase.peak_memory, phase.retained_memory)
+
+        parse, syntax, interpret = phases
+        self.assertIn('Match', parse.kinds)
+        self.assertIn('Value', parse.kinds)
+        self.assertNotIn('SyntaxNode', parse.kinds)
+        self.assertIn('SyntaxNode', syntax.kinds)
+        self.assertNotIn('Match', syntax.kinds)
+        self.assertEqual({}, interpret.kinds)
+        self.assertEqual({}, interpret.rules)
+
+    def test_no_match(self):
+        phases = measure('1+(2)', HANDLERS)
+        self.assertEqual(['parse'], [phase.name for phase in phases])
+        self.assertGreater(phases[0].kinds['Partial'].count, 0)
+
+    def test_already_tracing(self):
+        tracemalloc.start()
+        try:
+            parse, _ = measure('(1+2)+3)')
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+        self.assertGreater(parse.peak_memory, 0)
+        self.assertGreaterEqual(parse.peak_memory, parse.retained_memory)
+
+    def test_live_counts(self):
+        parse, syntax = measure('(1+2)+3)')
+        for name in ('Match', 'Partial', 'Params', 'Value'):
+            found = parse.kinds.get(name)
+            expected = found.count if found else 0
+            self.assertEqual(expected, parse.live[name], name)
+
+        self.assertEqual(
+            syntax.kinds['SyntaxNode'].count, syntax.live['SyntaxNode'])
+        # Coalescing reuses the parse tree's Values.
+        self.assertEqual(0, syntax.live['Value'])
+
+    def test_rules(self):
+        parse, syntax = measure('(1+2)+3)')
+        self.assertEqual({'Sum', 'Value', 'Number'}, set(parse.rules))
+        self.assertEqual({'Sum', 'Value', 'Number'}, set(syntax.rules))
+
+        for phase in (parse, syntax):
+            self.assertEqual(
+                sum(usage.count for usage in phase.kinds.values()),
+                sum(usage.count for usage in phase.rules.values()))
+            self.assertEqual(
+                sum(usage.bytes for usage in phase.kinds.values()),
+                sum(usage.bytes for usage in phase.rules.values()))
+
+        # Each of the three digits is a SyntaxNode, its Params and a Value.
+        self.assertEqual(9, syntax.rules['Number'].count)
+
+    def test_shared_nodes_counted_once(self):
+        node = parser.parse(
+            parser_test.get_rules(), reader.get_string_reader('(1+2)+3)'))
+        once = memory.Phase('once')
+        memory.census(node, once)
+        twice = memory.Phase('twice')
+        memory.census([node, node], twice)
+        self.assertEqual(
+            once.kinds['Match'].count, twice.kinds['Match'].count)
+        self.assertEqual(1, twice.kinds['list'].count)
+
+    def test_report(self):
+        phases = measure('(1+2)+3)', HANDLERS)
+        data = json.loads(memory.to_json(phases))
+        self.assertEqual(
+            ['parse', 'coalesce', 'interpret'],
+            [phase['name'] for phase in data])
+        self.assertEqual(
+            set(memory.KINDS), set(data[0]['live']))
+
+        text = memory.table(phases, limit=1)
+        self.assertIn('parse rule', text)
+        self.assertIn('coalesce rule', text)
+        self.assertNotIn('interpret rule', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
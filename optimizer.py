@@ -0,0 +1,236 @@
+import collections
+
+import grammar
+import parameters
+
+
+# Rewrites resolved rules so they parse with fewer visitor calls and nodes.
+# The parse trees change, but every rewrite keeps enough of the original
+# layout for coalesce.coalesce to produce the same syntax tree:
+#
+# - Choices made only of literals become a LiteralChoice looked up by their
+#   first character, including literal Choices nested inside them.
+# - Exprs made only of literals become a LiteralSequence matched with one
+#   comparison, including literal Exprs nested inside them.
+# - Runs of two or more literals inside other Exprs become a spliced
+#   LiteralSequence.
+# - Choices nested directly in a Choice are merged into it, with the path of
+#   keys to each alternative used as its key.
+# - Rules whose whole body is literal are inlined where they're referenced.
+#
+# Like resolve_refs, the rules are updated in place.
+
+Change = collections.namedtuple('Change', ['kind', 'symbol', 'item'])
+
+
+def as_path(key):
+    if type(key) is tuple:
+        return key
+    return (key,)
+
+
+def is_literal(item):
+    return type(item) is str and bool(item)
+
+
+def is_literal_sequence(item):
+    return (
+        type(item) is grammar.LiteralSequence and
+        item.rule is None and
+        not item.spliced)
+
+
+def sequence_parts(key, item):
+    if is_literal(item):
+        return [((key,), item)]
+
+    return [((key,) + path, literal) for path, literal in item.parts]
+
+
+def contains_cut(item):
+    if type(item) is grammar.Cut:
+        return True
+
+    if isinstance(item, grammar.Expr):
+        return any(contains_cut(value) for _, value in item.params)
+
+    return False
+
+
+class Optimizer:
+    def __init__(self):
+        self.changes = []
+        self.done = {}
+        self.symbol = None
+
+    def record(self, kind, item):
+        self.changes.append(Change(kind, self.symbol, item))
+
+    def optimize_rule(self, rule):
+        self.symbol = rule.symbol
+        rule.expr = self.optimize_item(rule.expr)
+
+    def optimize_item(self, item):
+        if not isinstance(item, grammar.Expr):
+            return item
+
+        try:
+            return self.done[item]
+        except KeyError:
+            pass
+
+        kind = type(item)
+        if kind is grammar.Choice:
+            result = self.optimize_choice(item)
+        elif kind is grammar.Expr:
+            result = self.optimize_expr(item)
+        elif isinstance(item, grammar.RepeatedExpr):
+            # The repeated Expr is matched by its params directly, so only
+            # its children can be rewritten.
+            for _, sub_expr in item.params:
+                sub_expr.params = self.optimize_params(sub_expr.params)
+            result = item
+        else:
+            item.params = self.optimize_params(item.params)
+            result = item
+
+        self.done[item] = result
+        return result
+
+    def optimize_params(self, params):
+        optimized = parameters.Params()
+        for key, value in params:
+            optimized.assign(key, self.optimize_item(value))
+
+        return self.splice_literals(optimized)
+
+    def splice_literals(self, params):
+        result = parameters.Params()
+        run = []
+
+        def flush():
+            if len(run) >= 2:
+                parts = []
+                for key, value in run:
+                    parts.extend(sequence_parts(key, value))
+                spliced = grammar.LiteralSequence(parts, spliced=True)
+                self.record('splice-literals', spliced)
+                result.assign(run[0][0], spliced)
+            else:
+                for key, value in run:
+                    result.assign(key, value)
+            run.clear()
+
+        for key, value in params:
+            if is_literal(value) or is_literal_sequence(value):
+                run.append((key, value))
+            else:
+                flush()
+                result.assign(key, value)
+
+        flush()
+        return result
+
+    def optimize_expr(self, expr):
+        optimized = parameters.Params()
+        for key, value in expr.params:
+            optimized.assign(key, self.optimize_item(value))
+
+        if all(is_literal(v) or is_literal_sequence(v) for _, v in optimized):
+            parts = []
+            for key, value in optimized:
+                parts.extend(sequence_parts(key, value))
+            sequence = grammar.LiteralSequence(parts)
+            self.record('literal-sequence', sequence)
+            return sequence
+
+        expr.params = self.splice_literals(optimized)
+        return expr
+
+    def optimize_choice(self, choice):
+        flattened = parameters.Params()
+        merged = False
+
+        for key, value in choice.params:
+            value = self.optimize_item(value)
+            if type(value) is grammar.Choice and not contains_cut(value):
+                merged = True
+                for other_key, other_value in value.params:
+                    flattened.assign(
+                        as_path(key) + as_path(other_key), other_value)
+            elif merged and type(key) is int:
+                # Positions after a merged Choice would no longer increase,
+                # so they become paths too.
+                flattened.assign((key,), value)
+            else:
+                flattened.assign(key, value)
+
+        literals = []
+        for key, value in flattened:
+            if is_literal(value):
+                literals.append((value, as_path(key)))
+            elif type(value) is grammar.LiteralChoice and value.rule is None:
+                for literal, path in value.literals:
+                    literals.append((literal, as_path(key) + path))
+            else:
+                break
+        else:
+            literal_choice = grammar.LiteralChoice(literals)
+            self.record('literal-choice', literal_choice)
+            return literal_choice
+
+        if merged:
+            self.record('flatten-choice', choice)
+
+        choice.params = flattened
+        choice.dispatch = None
+        choice.prefixes = None
+        return choice
+
+    def inline_rules(self, rules):
+        replacements = {}
+        for rule in rules:
+            body = rule.expr
+            if is_literal(body):
+                replacement = grammar.LiteralSequence([((), body)], rule=rule)
+            elif is_literal_sequence(body):
+                replacement = grammar.LiteralSequence(body.parts, rule=rule)
+            elif type(body) is grammar.LiteralChoice and body.rule is None:
+                replacement = grammar.LiteralChoice(body.literals, rule=rule)
+            else:
+                continue
+
+            replacements[rule] = replacement
+            self.symbol = rule.symbol
+            self.record('inline-rule', replacement)
+
+        if not replacements:
+            return
+
+        seen = set()
+        for rule in rules:
+            self.replace_refs(rule.expr, replacements, seen)
+
+    def replace_refs(self, item, replacements, seen):
+        if not isinstance(item, grammar.Expr) or item in seen:
+            return
+        seen.add(item)
+
+        params = parameters.Params()
+        for key, value in item.params:
+            params.assign(key, replacements.get(value, value))
+            self.replace_refs(value, replacements, seen)
+
+        item.params = params
+
+
+# Returns the rules and a list of Change tuples describing each rewrite.
+def optimize(rules):
+    rules = list(rules)
+    optimizer = Optimizer()
+
+    for rule in rules:
+        optimizer.optimize_rule(rule)
+
+    optimizer.inline_rules(rules)
+    return rules, optimizer.changes
@@ -0,0 +1,167 @@
+import unittest
+
+import coalesce
+import compiler
+import grammar
+from grammar import Ref, Expr, Choice, ZeroOrMore, OneOrMore, Optional
+from grammar import CharRange
+import iterative
+import optimizer
+import parameters
+import parser
+import parser_test
+import reader
+
+
+def get_rules():
+    rules = {
+        'Value': Choice(
+            keyword=Choice(
+                true=Expr('t', 'r', 'u', 'e'),
+                false='false',
+                null=Choice('null', 'nil')),
+            array=Expr(
+                '[',
+                Optional(Ref('Value'), ZeroOrMore(',', ' ', Ref('Value'))),
+                ']'),
+            call=Expr(Ref('Name'), '(', ')'),
+            number=OneOrMore(Ref('Digit')),
+            operator=Choice(Choice('+', '-'), Choice('*', Expr('/', '/')))),
+
+        'Name': OneOrMore(CharRange('a', 'z')),
+
+        'Digit': Choice('0', '1', '2', '3', '4', '5', '6', '7', '8', '9'),
+
+        'Comma': ',',
+
+        'Pair': Expr(Ref('Name'), Ref('Comma'), Ref('Name')),
+    }
+    resolved = grammar.resolve_refs(rules)
+    return resolved
+
+
+def to_data(node):
+    if isinstance(node, coalesce.SyntaxNode):
+        return (node.source.symbol, to_data(node.value))
+
+    if isinstance(node, parameters.Params):
+        return [(k, to_data(v)) for k, v in node]
+
+    if isinstance(node, list):
+        return [to_data(v) for v in node]
+
+    if isinstance(node, reader.Value):
+        return node.text
+
+    return node
+
+
+class OptimizerTest(unittest.TestCase):
+
+    def assertSameSyntax(self, get_rules, texts):
+        rules = get_rules()
+        optimized, _ = optimizer.optimize(get_rules())
+
+        for text in texts:
+            with self.subTest(text=text):
+                expected = parser.parse(rules, reader.get_string_reader(text))
+                found = parser.parse(
+                    optimized, reader.get_string_reader(text))
+                self.assertIs(type(expected), type(found))
+                self.assertEqual(expected.end, found.end)
+                self.assertEqual(
+                    to_data(coalesce.coalesce(expected)),
+                    to_data(coalesce.coalesce(found)))
+
+    def test_changes(self):
+        _, changes = optimizer.optimize(get_rules())
+        self.assertEqual(
+            [('literal-sequence', 'Value'),
+             ('literal-choice', 'Value'),
+             ('splice-literals', 'Value'),
+             ('splice-literals', 'Value'),
+             ('literal-choice', 'Value'),
+             ('literal-sequence', 'Value'),
+             ('flatten-choice', 'Value'),
+             ('flatten-choice', 'Value'),
+             ('literal-choice', 'Digit'),
+             ('inline-rule', 'Digit'),
+             ('inline-rule', 'Comma')],
+            [(c.kind, c.symbol) for c in changes])
+
+    def test_same_syntax(self):
+        self.assertSameSyntax(get_rules, [
+            'true', 'false', 'nil', '[1, 2, [true]]', 'f()', '+', '//',
+            '/x', '[1,2]', 'tru', 'a,b', '[', 'f(', '[nil, f(), 12]'])
+
+    def test_same_syntax_existing_grammars(self):
+        self.assertSameSyntax(parser_test.get_rules, [
+            '1', '12', '(1+2)', '(1+2)-', '1+nope', '((3-4)+5)', '1+2)'])
+        self.assertSameSyntax(
+            parser_test.get_partial_choice_rules,
+            ['12z', '123x', '12y', 'q'])
+        self.assertSameSyntax(
+            parser_test.get_cut_rules, ['let x;f;', 'let;', 'f;let ;'])
+
+    def test_nested_choice_then_position(self):
+        def get_rules():
+            return grammar.resolve_refs({
+                'S': Choice(Choice('a', Ref('T')), 'b'),
+                'T': OneOrMore('x'),
+            })
+
+        optimized, changes = optimizer.optimize(get_rules())
+        self.assertIn('flatten-choice', {change.kind for change in changes})
+        self.assertSameSyntax(get_rules, ['a', 'b', 'xx', 'c'])
+
+    def test_empty_nested_choice(self):
+        def get_rules():
+            return grammar.resolve_refs({
+                'S': Expr(Choice('a', Choice('b', ZeroOrMore('x'))), 'y'),
+            })
+
+        self.assertSameSyntax(get_rules, ['y', 'xy', 'by', 'ay'])
+
+    def test_syntax_repr(self):
+        optimized, _ = optimizer.optimize(get_rules())
+        found = parser.parse(optimized, reader.get_string_reader('12'))
+        self.assertIn("SyntaxNode('Digit'", repr(coalesce.coalesce(found)))
+
+    def test_inlined_rule(self):
+        optimized, _ = optimizer.optimize(get_rules())
+        found = parser.parse(optimized, reader.get_string_reader('12'))
+        self.assertEqual('Value', found.source.symbol)
+
+        digits = found.value.value.number.value
+        self.assertIsInstance(digits[0][0].source, grammar.LiteralChoice)
+
+        syntax = coalesce.coalesce(found)
+        self.assertEqual(
+            ('Value',
+             [('number',
+               [[(0, ('Digit', [(1, '1')]))],
+                [(0, ('Digit', [(2, '2')]))]])]),
+            to_data(syntax))
+
+    def test_other_engines(self):
+        optimized, _ = optimizer.optimize(get_rules())
+        compiled = compiler.compile(optimized)
+
+        for text in ['[nil, f(), 12]', '/x', '[1,2]', 'f(']:
+            with self.subTest(text=text):
+                expected = parser.parse(
+                    optimized, reader.get_string_reader(text))
+                for found in [
+                        compiled.parse(reader.get_string_reader(text)),
+                        iterative.parse(
+                            optimized, reader.get_string_reader(text))]:
+                    self.assertIs(type(expected), type(found))
+                    self.assertEqual(expected.end, found.end)
+
+                self.assertEqual(
+                    parser.recognize(get_rules(), text),
+                    parser.recognize(optimized, text))
+
+
+if __name__ == '__main__':
+    unittest.main()
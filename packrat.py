@@ -0,0 +1,144 @@
+import collections
+import sys
+
+
+# Rough cost of one table slot on top of the key and node objects.
+SLOT_BYTES = 100
+
+
+# Entries are grouped by position so everything before a position can be
+# dropped at once, which is what happens when the parser passes a Cut.
+class Unbounded:
+    def __init__(self):
+        self.positions = {}
+        self.floor = 0
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.positions.clear()
+        self.floor = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, rule, index):
+        entries = self.positions.get(index)
+        if entries is not None:
+            node = entries.get(rule)
+            if node is not None:
+                self.hits += 1
+                return node
+
+        self.misses += 1
+        return None
+
+    def put(self, rule, index, node):
+        if index < self.floor:
+            return
+
+        try:
+            entries = self.positions[index]
+        except KeyError:
+            entries = {}
+            self.positions[index] = entries
+
+        entries[rule] = node
+
+    def cut(self, index):
+        self.evict(index)
+
+    def evict(self, floor):
+        if floor <= self.floor:
+            return
+
+        positions = self.positions
+        if len(positions) < floor - self.floor:
+            for index in [i for i in positions if i < floor]:
+                del positions[index]
+        else:
+            for index in range(self.floor, floor):
+                positions.pop(index, None)
+
+        self.floor = floor
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.positions.values())
+
+
+class Window(Unbounded):
+    def __init__(self, size):
+        assert size >= 0
+        super().__init__()
+        self.size = size
+        self.furthest = 0
+
+    def clear(self):
+        super().clear()
+        self.furthest = 0
+
+    def put(self, rule, index, node):
+        super().put(rule, index, node)
+
+        end = node.end
+        if end > self.furthest:
+            self.furthest = end
+            self.evict(end - self.size)
+
+
+class Lru:
+    def __init__(self, max_bytes):
+        assert max_bytes >= 0
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.used_bytes = 0
+        self.floor = 0
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.used_bytes = 0
+        self.floor = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, rule, index):
+        key = (rule, index)
+        found = self.entries.get(key)
+        if found is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return found[0]
+
+    def put(self, rule, index, node):
+        if index < self.floor:
+            return
+
+        key = (rule, index)
+        cost = sys.getsizeof(key) + sys.getsizeof(node) + SLOT_BYTES
+
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.used_bytes -= previous[1]
+
+        self.entries[key] = (node, cost)
+        self.used_bytes += cost
+
+        while self.used_bytes > self.max_bytes and self.entries:
+            _, (_, evicted_cost) = self.entries.popitem(last=False)
+            self.used_bytes -= evicted_cost
+
+    def cut(self, index):
+        if index <= self.floor:
+            return
+
+        self.floor = index
+        for key in [key for key in self.entries if key[1] < index]:
+            _, cost = self.entries.pop(key)
+            self.used_bytes -= cost
+
+    def __len__(self):
+        return len(self.entries)
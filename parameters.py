@@ -23,9 +23,17 @@ def repr_params(params):
     return ', '.join(pieces)
 
 
+# Values are stored in assignment order so positional lookups index straight
+# into a list; names map to their position in a side table. Integer keys must
+# increase but can skip, as they do when coalescing drops empty children.
 class Params:
+    __slots__ = ('_keys', '_values', '_names', '_last_index')
+
     def __init__(self):
-        self.mappings = {}
+        self._keys = []
+        self._values = []
+        self._names = {}
+        self._last_index = -1
 
     @classmethod
     def from_list(cls, *items):
@@ -41,28 +49,60 @@ class Params:
             params.assign(key, value)
         return params
 
+    # Takes keys and values that were already checked, like the ones from
+    # another Params.
+    @classmethod
+    def from_keys(cls, keys, values):
+        params = cls()
+        params._keys = keys
+        params._values = values
+        params._names = {
+            key: i for i, key in enumerate(keys) if not isinstance(key, int)}
+        params._last_index = max(
+            (key for key in keys if isinstance(key, int)), default=-1)
+        return params
+
+    @property
+    def mappings(self):
+        return dict(zip(self._keys, self._values))
+
     def __iter__(self):
-        for key, value in self.mappings.items():
-            yield key, value
+        return zip(self._keys, self._values)
+
+    def __len__(self):
+        return len(self._values)
 
     def __bool__(self):
-        return bool(self.mappings)
+        return bool(self._values)
 
     def assign(self, key, value):
-        assert key not in self.mappings
-        self.mappings[key] = value
+        keys = self._keys
+        if isinstance(key, int):
+            assert key >= len(keys) and key > self._last_index
+            self._last_index = key
+        else:
+            assert key not in self._names
+            self._names[key] = len(keys)
+
+        keys.append(key)
+        self._values.append(value)
+
+    def last(self):
+        return self._keys[-1], self._values[-1]
 
     def __repr__(self):
         repr_string = repr_params(self)
         return f'{self.__class__.__name__}({repr_string})'
 
-    def __getitem__(self, index):
-        assert isinstance(index, int)
-        for i, (_, value) in enumerate(self):
-            if i == index:
-                return value
-
-        raise IndexError(index)
+    def __getitem__(self, index_or_slice):
+        return self._values[index_or_slice]
 
     def __getattr__(self, key):
-        return self.mappings.get(key)
+        # Keeps copy and pickle from recursing before the slots are set.
+        if key.startswith('__'):
+            raise AttributeError(key)
+
+        index = self._names.get(key)
+        if index is None:
+            return None
+        return self._values[index]
@@ -0,0 +1,73 @@
+import pickle
+import unittest
+
+import parameters
+
+
+class ParamsTest(unittest.TestCase):
+
+    def test_positional(self):
+        params = parameters.Params.from_list('a', 'b', 'c')
+        self.assertEqual(3, len(params))
+        self.assertEqual('a', params[0])
+        self.assertEqual('c', params[-1])
+        self.assertEqual(['b', 'c'], params[1:])
+        self.assertEqual([(0, 'a'), (1, 'b'), (2, 'c')], list(params))
+
+        with self.assertRaises(IndexError):
+            params[3]
+
+    def test_named(self):
+        params = parameters.Params.from_dict(first='a', second=None)
+        self.assertEqual('a', params.first)
+        self.assertIsNone(params.second)
+        self.assertIsNone(params.missing)
+        self.assertEqual('a', params[0])
+        self.assertEqual({'first': 'a', 'second': None}, params.mappings)
+
+    def test_empty(self):
+        params = parameters.Params()
+        self.assertFalse(params)
+        self.assertEqual([], list(params))
+
+    def test_duplicate_name(self):
+        params = parameters.Params.from_dict(first='a')
+        with self.assertRaises(AssertionError):
+            params.assign('first', 'b')
+
+    def test_sparse_index(self):
+        params = parameters.Params()
+        params.assign(0, 'a')
+        params.assign(2, 'b')
+        self.assertEqual('b', params[1])
+        self.assertEqual((2, 'b'), params.last())
+
+        with self.assertRaises(AssertionError):
+            params.assign(1, 'c')
+
+    def test_index_must_increase(self):
+        params = parameters.Params()
+        params.assign(0, 'a')
+        params.assign(5, 'b')
+        with self.assertRaises(AssertionError):
+            params.assign(5, 'c')
+        params.assign('name', 'c')
+        with self.assertRaises(AssertionError):
+            params.assign(3, 'd')
+        self.assertEqual({0: 'a', 5: 'b', 'name': 'c'}, params.mappings)
+
+        loaded = parameters.Params.from_keys(
+            [key for key, _ in params], [value for _, value in params])
+        with self.assertRaises(AssertionError):
+            loaded.assign(4, 'e')
+        loaded.assign(6, 'e')
+
+    def test_pickle(self):
+        params = parameters.Params.from_dict(first='a', second='b')
+        loaded = pickle.loads(pickle.dumps(params))
+        self.assertEqual(list(params), list(loaded))
+        self.assertEqual('b', loaded.second)
+
+
+if __name__ == '__main__':
+    unittest.main()
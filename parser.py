@@ -1,17 +1,37 @@
-import functools
+import unicodedata
 
+import analysis
 import grammar
 import parameters
 import reader
 
 
+class Error(Exception):
+    def __init__(self, node, value):
+        super().__init__(node, value)
+        self.node = node
+        self.value = value
+
+
+class NothingMatchesError(Error):
+    pass
+
+
+class IncompleteParseError(Error):
+    pass
+
+
 class ParseNode:
-    def __init__(self, source, value, remaining):
+    __slots__ = ('source', 'value', 'input_source', 'start', 'end')
+
+    def __init__(self, source, value, input_source, start, end):
         assert source is not None
-        assert remaining is not None
+        assert input_source is not None
         self.source = source
         self.value = value
-        self.remaining = remaining
+        self.input_source = input_source
+        self.start = start
+        self.end = end
 
     def __repr__(self):
         name = f'{self.source.__class__.__name__}('
@@ -23,13 +43,16 @@ class ParseNode:
             f'value={self.value!r}, '
             f'remaining={self.remaining!r})')
 
+    @property
+    def remaining(self):
+        return reader.Reader(self.input_source, self.end)
+
     def reader_value(self):
-        values = _get_reader_values(self)
-        return reader.combine_spans(values)
+        return reader.Value(self.input_source, self.start, self.end)
 
     @property
     def text(self):
-        return self.reader_value().text
+        return self.input_source.data[self.start:self.end]
 
     # def __bool__(self):
     #     if self.value is None:
@@ -41,18 +64,12 @@ class ParseNode:
     #         return len(self.value.mappings) > 0
 
     def __getitem__(self, index_or_slice):
-        result = []
-
-        for i, (key, other_value) in enumerate(self.value):
-            assert isinstance(key, int)
-            assert i == key
-            result.append(other_value)
-
-        return result[index_or_slice]
+        return self.value[index_or_slice]
 
     def __getattr__(self, key):
-        if key == 'symbol':
-            raise AttributeError
+        # Keeps copy and pickle from recursing before the slots are set.
+        if key == 'symbol' or key.startswith('__'):
+            raise AttributeError(key)
 
         if isinstance(self.value, parameters.Params):
             if isinstance(key, str):
@@ -68,88 +85,101 @@ class ParseNode:
 
 
 class Match(ParseNode):
-    pass
+    __slots__ = ()
 
 
 class Partial(ParseNode):
-    pass
+    __slots__ = ()
 
 
 class Miss(ParseNode):
-    pass
-
-
-def _get_reader_values(node):
-    if node is None:
-        return []
-
-    if isinstance(node.value, reader.Value):
-        return [node.value]
-
-    if isinstance(node.value, ParseNode):
-        return _get_reader_values(node.value)
-
-    if isinstance(node.value, parameters.Params):
-        result = []
-        for _, other_value in node.value:
-            result.extend(_get_reader_values(other_value))
-        return result
-
-    assert False, 'Not reachable'
+    __slots__ = ()
 
 
-# TODO: Make this a better helper class behind a flag
-DEPTH = 0
+class ParseState:
+    def __init__(self, source, memo=None, tracer=None):
+        self.source = source
+        self.data = source.data
+        self.length = len(source.data)
+        self.memo = memo
+        self.tracer = tracer
+        self.depth = 0
+        # Set when matching looked at the end of the data, meaning more input
+        # could change the result.
+        self.hit_end = False
+        # Set when a Cut matches in the current alternative.
+        self.cut = False
+        # Where the outermost Choice that can still try another alternative
+        # started, or None. outer_choice is the same for the rules enclosing
+        # the current one, whose choices a Cut doesn't commit.
+        self.choice = None
+        self.outer_choice = None
+        if tracer is None:
+            self.visitors = VISITORS
+        else:
+            self.visitors = traced_visitors(tracer)
 
 
-def trace(func):
-    @functools.wraps(func)
-    def wrapped(*args):
-        global DEPTH
-        prefix = DEPTH * '    '
-        args_repr = ', '.join(repr(a) for a in args)
-        print(f'{prefix} Running: {func.__name__}({args_repr})')
-        DEPTH += 1
-        result = func(*args)
-        DEPTH -= 1
-        print(f'{prefix} Result: {result!r}')
-        return result
-    return wrapped
+def descend_rule(state, rule, pos):
+    memo = state.memo
+    if memo is not None:
+        found = memo.get(rule, pos)
+        if found is not None:
+            return found
 
+    # A Cut only commits choices within its own rule.
+    cut = state.cut
+    outer_choice = state.outer_choice
+    state.cut = False
+    state.outer_choice = state.choice
+    node = descend(state, rule.expr, pos)
+    state.cut = cut
+    state.outer_choice = outer_choice
 
-@trace
-def descend_rule(rule, buffer):
-    node = descend(rule.expr, buffer)
     if isinstance(node, Match):
-        return Match(rule, node, node.remaining)
+        result = Match(rule, node, state.source, pos, node.end)
     elif isinstance(node, Partial):
-        return Partial(rule, node, node.remaining)
+        result = Partial(rule, node, state.source, pos, node.end)
     else:
-        return Miss(rule, None, buffer)
+        result = Miss(rule, None, state.source, pos, pos)
 
+    if memo is not None:
+        memo.put(rule, pos, result)
 
-@trace
-def match_params(source, params, buffer):
+    return result
+
+
+# Nodes in shared were already matched for the leading params, by another
+# Choice alternative that starts with the same items, so they're reused.
+def match_params(state, source, params, pos, shared=()):
     found = parameters.Params()
-    current = buffer
+    current = pos
 
     consider_keys = 0
     match_keys = 0
     partial_keys = 0
     miss_keys = 0
 
-    for key, value in params:
+    pairs = iter(params)
+    if shared:
+        for node, (key, _) in zip(shared, pairs):
+            consider_keys += 1
+            match_keys += 1
+            found.assign(key, node)
+            current = node.end
+
+    for key, value in pairs:
         consider_keys += 1
 
-        node = descend(value, current)
+        node = descend(state, value, current)
         if isinstance(node, Match):
             match_keys += 1
             found.assign(key, node)
-            current = node.remaining
+            current = node.end
         elif isinstance(node, Partial):
             partial_keys += 1
             found.assign(key, node)
-            current = node.remaining
+            current = node.end
             break
         else:
             miss_keys += 1
@@ -157,49 +187,52 @@ def match_params(source, params, buffer):
             break
 
     if match_keys == consider_keys:
-        return Match(source, found, current)
+        return Match(source, found, state.source, pos, current)
     elif partial_keys or match_keys:
-        return Partial(source, found, current)
+        return Partial(source, found, state.source, pos, current)
     elif miss_keys:
-        return Miss(source, None, current)
+        return Miss(source, None, state.source, pos, current)
     else:
         assert False, 'Not reachable'
 
 
-@trace
-def descend_expr(expr, buffer):
-    return match_params(expr, expr.params, buffer)
+def descend_expr(state, expr, pos):
+    return match_params(state, expr, expr.params, pos)
 
 
-@trace
-def repeat_match_params(source, params, buffer):
-    current = buffer
+def repeat_match_params(state, source, params, pos):
+    current = pos
     result = []
 
-    while current:
-        node = match_params(source, params, current)
+    while current < state.length:
+        node = match_params(state, source, params, current)
 
         if isinstance(node, Match):
             result.append(node)
-            current = node.remaining
+            # An iteration that matched nothing, like a Regex that accepts
+            # the empty string, would match again forever.
+            if node.end == current:
+                break
+            current = node.end
         elif isinstance(node, Partial):
             result.append(node)
             break
         else:
             break
+    else:
+        state.hit_end = True
 
     return result
 
 
-@trace
-def descend_one_or_more(expr, buffer):
+def descend_one_or_more(state, expr, pos):
     pairs = list(expr.params)
     assert len(pairs) == 1
     index, sub_expr = pairs[0]
     assert index == 0
 
     found = parameters.Params()
-    result = repeat_match_params(sub_expr, sub_expr.params, buffer)
+    result = repeat_match_params(state, sub_expr, sub_expr.params, pos)
 
     match_count = 0
     partial_count = 0
@@ -209,78 +242,76 @@ def descend_one_or_more(expr, buffer):
         if isinstance(node, Match):
             found.assign(i, node)
             match_count += 1
-            current = node.remaining
+            current = node.end
         elif isinstance(node, Partial):
             found.assign(i, node)
             partial_count += 1
-            current = node.remaining
+            current = node.end
             break
         else:
             assert False, 'Should not happen'
 
     if match_count >= 1:
-        return Match(expr, found, current)
+        return Match(expr, found, state.source, pos, current)
     elif partial_count >= 1:
-        return Partial(expr, found, current)
+        return Partial(expr, found, state.source, pos, current)
     else:
-        return Miss(expr, None, buffer)
+        return Miss(expr, None, state.source, pos, pos)
 
 
-@trace
-def descend_zero_or_more(expr, buffer):
+def descend_zero_or_more(state, expr, pos):
     pairs = list(expr.params)
     assert len(pairs) == 1
     index, sub_expr = pairs[0]
     assert index == 0
 
     found = parameters.Params()
-    result = repeat_match_params(sub_expr, sub_expr.params, buffer)
-    current = buffer
+    result = repeat_match_params(state, sub_expr, sub_expr.params, pos)
+    current = pos
 
     for i, node in enumerate(result):
         if isinstance(node, Match):
             found.assign(i, node)
-            current = node.remaining
+            current = node.end
         elif isinstance(node, Partial):
             if i == 0:
                 found.assign(i, node)
-                return Partial(expr, found, node.remaining)
+                return Partial(expr, found, state.source, pos, node.end)
             break
         else:
             break
 
-    return Match(expr, found, current)
+    return Match(expr, found, state.source, pos, current)
 
 
-@trace
-def descend_optional(expr, buffer):
-    node = match_params(expr, expr.params, buffer)
+def descend_optional(state, expr, pos):
+    node = match_params(state, expr, expr.params, pos)
     if isinstance(node, Match):
-        return Match(expr, node, node.remaining)
+        return Match(expr, node, state.source, pos, node.end)
     elif isinstance(node, Partial):
-        return Partial(expr, node, node.remaining)
+        return Partial(expr, node, state.source, pos, node.end)
     else:
-        return Match(expr, None, buffer)
+        return Match(expr, None, state.source, pos, pos)
 
 
-@trace
-def descend_and(expr, buffer):
-    node = match_params(expr, expr.params, buffer)
-    if isinstance(node, Match):
-        return Match(expr, node, buffer)
-    elif isinstance(node, Partial):
-        return Partial(expr, node, buffer)
+# Predicates only need to know whether their expression matches, so they run
+# the recognizer and don't keep a subtree.
+def descend_and(state, expr, pos):
+    end = recognize_params(state, expr.params, pos)
+    if end >= 0:
+        return Match(expr, None, state.source, pos, pos)
+    elif end == MISS:
+        return Miss(expr, None, state.source, pos, pos)
     else:
-        return Miss(expr, node, buffer)
+        return Partial(expr, None, state.source, pos, pos)
 
 
-@trace
-def descend_not(expr, buffer):
-    node = match_params(expr, expr.params, buffer)
-    if isinstance(node, Match):
-        return Miss(expr, node, buffer)
+def descend_not(state, expr, pos):
+    end = recognize_params(state, expr.params, pos)
+    if end >= 0:
+        return Miss(expr, None, state.source, pos, pos)
     else:
-        return Match(expr, node, buffer)
+        return Match(expr, None, state.source, pos, pos)
 
 
 def longest_reader(nodes):
@@ -289,22 +320,60 @@ def longest_reader(nodes):
     longest_node = None
 
     for node in nodes:
-        if node.remaining.index > longest_index:
-            longest_index = node.remaining.index
+        if node.end > longest_index:
+            longest_index = node.end
             longest_node = node
 
     return longest_node
 
 
-@trace
-def descend_choice(expr, buffer):
+# The leading Match children of an earlier alternative's node, up to the
+# length of the prefix it shares with a later one.
+def shared_nodes(node, length):
+    result = []
+    for _, child in node.value:
+        if len(result) == length or type(child) is not Match:
+            break
+        result.append(child)
+
+    return result
+
+
+def descend_choice(state, expr, pos):
+    dispatch = expr.dispatch
+    if dispatch is None:
+        dispatch = analysis.choice_dispatch(expr)
+
+    prefixes = expr.prefixes
+    if prefixes is None:
+        prefixes = analysis.choice_prefixes(expr)
+
+    # Alternatives that can't start with the next character would Miss.
+    candidates = dispatch.candidates(state.data[pos])
+
     found = parameters.Params()
     match_node = None
     partial_nodes = []
-
-    for key, value in expr.params:
-        if match_node is None:
-            node = descend(value, buffer)
+    committed = False
+    cut = state.cut
+    choice = state.choice
+    last = len(expr.params) - 1
+    tried = {}
+
+    for i, (key, value) in enumerate(expr.params):
+        if match_node is None and not committed and i in candidates:
+            state.cut = False
+            if choice is None and i < last:
+                state.choice = pos
+            prefix = tried and prefixes.shared[i]
+            if prefix and prefix[0] in tried:
+                source_index, length = prefix
+                shared = shared_nodes(tried[source_index], length)
+                node = match_params(state, value, value.params, pos, shared)
+            else:
+                node = descend(state, value, pos)
+            committed = state.cut
+            state.choice = choice
             if isinstance(node, Match):
                 found.assign(key, node)
                 match_node = node
@@ -312,61 +381,536 @@ def descend_choice(expr, buffer):
             elif isinstance(node, Partial):
                 found.assign(key, node)
                 partial_nodes.append(node)
+                if i in prefixes.sources:
+                    tried[i] = node
                 continue
 
         found.assign(key, None)
 
+    state.cut = cut
+
     if match_node is not None:
-        return Match(expr, found, match_node.remaining)
+        return Match(expr, found, state.source, pos, match_node.end)
     elif partial_nodes:
         longest_partial = longest_reader(partial_nodes)
-        return Partial(expr, found, longest_partial.remaining)
+        return Partial(expr, found, state.source, pos, longest_partial.end)
     else:
-        return Miss(expr, None, buffer)
+        return Miss(expr, None, state.source, pos, pos)
+
+
+def descend_str(state, expr, pos):
+    if state.data.startswith(expr, pos):
+        end = pos + len(expr)
+        value = reader.Value(state.source, pos, end)
+        return Match(expr, value, state.source, pos, end)
+
+    if (pos + len(expr) > state.length and
+            expr.startswith(state.data[pos:state.length])):
+        state.hit_end = True
+
+    return Miss(expr, None, state.source, pos, pos)
+
+
+def descend_cut(state, expr, pos):
+    cut_at(state, pos)
+    return Match(expr, None, state.source, pos, pos)
+
+
+# Nothing before a Cut will be tried again by the choice it commits, so the
+# memo can let go of those positions. Choices in enclosing rules aren't
+# committed, so it keeps the positions they can still backtrack to.
+def cut_at(state, pos):
+    state.cut = True
+    memo = state.memo
+    if memo is not None:
+        outer_choice = state.outer_choice
+        if outer_choice is None or outer_choice > pos:
+            memo.cut(pos)
+        else:
+            memo.cut(outer_choice)
+
+
+def match_char(state, expr, pos):
+    end = pos + 1
+    value = reader.Value(state.source, pos, end)
+    return Match(expr, value, state.source, pos, end)
+
+
+def descend_char_range(state, expr, pos):
+    char = state.data[pos]
+    if expr.low <= char <= expr.high:
+        return match_char(state, expr, pos)
+    return Miss(expr, None, state.source, pos, pos)
+
 
+def descend_char_set(state, expr, pos):
+    char = state.data[pos]
+    if char in expr.chars:
+        return match_char(state, expr, pos)
+    return Miss(expr, None, state.source, pos, pos)
 
-@trace
-def descend_str(expr, buffer):
-    value, remaining = buffer.read(len(expr))
-    if expr == value.text:
-        return Match(expr, value, remaining)
+
+def descend_not_char_set(state, expr, pos):
+    char = state.data[pos]
+    if char not in expr.chars:
+        return match_char(state, expr, pos)
+    return Miss(expr, None, state.source, pos, pos)
+
+
+def descend_any_char(state, expr, pos):
+    return match_char(state, expr, pos)
+
+
+def in_unicode_category(expr, char):
+    try:
+        return expr.table[char]
+    except KeyError:
+        pass
+
+    category = unicodedata.category(char)
+    found = any(category.startswith(c) for c in expr.categories)
+    expr.table[char] = found
+    return found
+
+
+def descend_unicode_category(state, expr, pos):
+    char = state.data[pos]
+    if in_unicode_category(expr, char):
+        return match_char(state, expr, pos)
+    return Miss(expr, None, state.source, pos, pos)
+
+
+def descend_regex(state, expr, pos):
+    data = state.data
+    if isinstance(data, str):
+        match = expr.pattern.match(data, pos)
     else:
-        return Miss(expr, None, buffer)
+        match = data.regex_match(expr.pattern, pos)
+
+    if match is None:
+        return Miss(expr, None, state.source, pos, pos)
+
+    end = match.end()
+    if end >= state.length:
+        state.hit_end = True
+
+    value = reader.Value(state.source, pos, end)
+    return Match(expr, value, state.source, pos, end)
+
+
+def descend_literal_choice(state, expr, pos):
+    end = recognize_literal_choice(state, expr, pos)
+    if end == MISS:
+        return Miss(expr, None, state.source, pos, pos)
+
+    value = reader.Value(state.source, pos, end)
+    return Match(expr, value, state.source, pos, end)
+
+
+def descend_literal_sequence(state, expr, pos):
+    end = recognize_literal_sequence(state, expr, pos)
+    if end == MISS:
+        return Miss(expr, None, state.source, pos, pos)
+
+    if end >= 0:
+        value = reader.Value(state.source, pos, end)
+        return Match(expr, value, state.source, pos, end)
+
+    end = partial_end(end)
+    value = reader.Value(state.source, pos, end)
+    return Partial(expr, value, state.source, pos, end)
 
 
 VISITORS = {
     grammar.And: descend_and,
+    grammar.AnyChar: descend_any_char,
+    grammar.CharRange: descend_char_range,
+    grammar.CharSet: descend_char_set,
     grammar.Choice: descend_choice,
+    grammar.Cut: descend_cut,
     grammar.Expr: descend_expr,
+    grammar.LiteralChoice: descend_literal_choice,
+    grammar.LiteralSequence: descend_literal_sequence,
     grammar.Not: descend_not,
+    grammar.NotCharSet: descend_not_char_set,
     grammar.OneOrMore: descend_one_or_more,
     grammar.Optional: descend_optional,
+    grammar.Regex: descend_regex,
     grammar.Rule: descend_rule,
     str: descend_str,
+    grammar.UnicodeCategory: descend_unicode_category,
     grammar.ZeroOrMore: descend_zero_or_more,
 }
 
 
-@trace
-def descend(item, buffer):
-    if not buffer:
-        return Miss(item, None, buffer)
+def trace_visitor(tracer, visitor):
+    name = visitor.__name__
 
-    print(f'Descending: {item=}, {type(item)=} with {buffer=}')
-    visitor = VISITORS[type(item)]
-    return visitor(item, buffer)
+    def traced(state, item, pos):
+        depth = state.depth
+        tracer.enter(name, item, pos, depth)
+        state.depth = depth + 1
+        result = visitor(state, item, pos)
+        state.depth = depth
+        tracer.exit(name, item, result, depth)
+        return result
+
+    return traced
+
+
+def traced_visitors(tracer):
+    return {
+        kind: trace_visitor(tracer, visitor)
+        for kind, visitor in VISITORS.items()}
+
+
+def descend(state, item, pos):
+    if pos >= state.length:
+        state.hit_end = True
+        return Miss(item, None, state.source, pos, pos)
+
+    visitor = state.visitors[type(item)]
+    return visitor(state, item, pos)
+
+
+# The recognizer follows the same rules as the visitors above but only
+# reports how far an item matched, without building nodes or values. A result
+# of zero or more is the end of a Match, MISS is a Miss, and anything lower
+# encodes the end of a Partial as MISS - 1 - end.
+MISS = -1
+
+
+# The Partial encoding is its own inverse, so this both encodes and decodes.
+def partial_end(end):
+    return MISS - 1 - end
+
+
+def node_end(node):
+    if isinstance(node, Match):
+        return node.end
+    elif isinstance(node, Partial):
+        return partial_end(node.end)
+    else:
+        return MISS
+
+
+def recognize_rule(state, rule, pos):
+    memo = state.memo
+    if memo is not None:
+        found = memo.get(rule, pos)
+        if found is not None:
+            return node_end(found)
+
+    cut = state.cut
+    outer_choice = state.outer_choice
+    state.cut = False
+    state.outer_choice = state.choice
+    end = recognize_item(state, rule.expr, pos)
+    state.cut = cut
+    state.outer_choice = outer_choice
+    return end
+
+
+def recognize_params(state, params, pos):
+    current = pos
+
+    for i, (_, value) in enumerate(params):
+        end = recognize_item(state, value, current)
+        if end >= 0:
+            current = end
+        elif end == MISS:
+            if i:
+                return partial_end(current)
+            return MISS
+        else:
+            return end
+
+    return current
+
+
+def recognize_expr(state, expr, pos):
+    return recognize_params(state, expr.params, pos)
+
+
+# Returns how many iterations matched, where the last of them ended, and the
+# end of a trailing Partial iteration or None.
+def repeat_recognize_params(state, expr, pos):
+    [(_, sub_expr)] = expr.params
+    params = sub_expr.params
+    current = pos
+    count = 0
+
+    while current < state.length:
+        end = recognize_params(state, params, current)
+        if end >= 0:
+            count += 1
+            if end == current:
+                return count, current, None
+            current = end
+        elif end == MISS:
+            return count, current, None
+        else:
+            return count, current, partial_end(end)
+
+    state.hit_end = True
+    return count, current, None
+
+
+def recognize_one_or_more(state, expr, pos):
+    count, current, partial = repeat_recognize_params(state, expr, pos)
+    if count:
+        return current if partial is None else partial
+    elif partial is not None:
+        return partial_end(partial)
+    else:
+        return MISS
+
+
+def recognize_zero_or_more(state, expr, pos):
+    count, current, partial = repeat_recognize_params(state, expr, pos)
+    if not count and partial is not None:
+        return partial_end(partial)
+    return current
+
+
+def recognize_optional(state, expr, pos):
+    end = recognize_params(state, expr.params, pos)
+    if end == MISS:
+        return pos
+    return end
+
+
+def recognize_and(state, expr, pos):
+    end = recognize_params(state, expr.params, pos)
+    if end >= 0:
+        return pos
+    elif end == MISS:
+        return MISS
+    else:
+        return partial_end(pos)
+
+
+def recognize_not(state, expr, pos):
+    end = recognize_params(state, expr.params, pos)
+    if end >= 0:
+        return MISS
+    return pos
+
+
+def recognize_choice(state, expr, pos):
+    dispatch = expr.dispatch
+    if dispatch is None:
+        dispatch = analysis.choice_dispatch(expr)
+
+    candidates = dispatch.candidates(state.data[pos])
+    longest_partial = None
+    cut = state.cut
+    choice = state.choice
+    last = len(expr.params) - 1
+
+    for i, (_, value) in enumerate(expr.params):
+        if i not in candidates:
+            continue
+
+        state.cut = False
+        if choice is None and i < last:
+            state.choice = pos
+        end = recognize_item(state, value, pos)
+        committed = state.cut
+        state.cut = cut
+        state.choice = choice
+
+        if end >= 0:
+            return end
+        elif end != MISS:
+            end = partial_end(end)
+            if longest_partial is None or end > longest_partial:
+                longest_partial = end
+
+        if committed:
+            break
+
+    if longest_partial is not None:
+        return partial_end(longest_partial)
+    return MISS
+
+
+def recognize_str(state, expr, pos):
+    if state.data.startswith(expr, pos):
+        return pos + len(expr)
+
+    if (pos + len(expr) > state.length and
+            expr.startswith(state.data[pos:state.length])):
+        state.hit_end = True
+
+    return MISS
+
+
+def recognize_cut(state, expr, pos):
+    cut_at(state, pos)
+    return pos
+
+
+def recognize_char_range(state, expr, pos):
+    if expr.low <= state.data[pos] <= expr.high:
+        return pos + 1
+    return MISS
+
+
+def recognize_char_set(state, expr, pos):
+    if state.data[pos] in expr.chars:
+        return pos + 1
+    return MISS
+
+
+def recognize_not_char_set(state, expr, pos):
+    if state.data[pos] not in expr.chars:
+        return pos + 1
+    return MISS
+
+
+def recognize_any_char(state, expr, pos):
+    return pos + 1
+
+
+def recognize_unicode_category(state, expr, pos):
+    if in_unicode_category(expr, state.data[pos]):
+        return pos + 1
+    return MISS
+
+
+def recognize_regex(state, expr, pos):
+    data = state.data
+    if isinstance(data, str):
+        match = expr.pattern.match(data, pos)
+    else:
+        match = data.regex_match(expr.pattern, pos)
+
+    if match is None:
+        return MISS
+
+    end = match.end()
+    if end >= state.length:
+        state.hit_end = True
+
+    return end
+
+
+def recognize_literal_choice(state, expr, pos):
+    for literal in expr.table.get(state.data[pos], ()):
+        end = recognize_str(state, literal, pos)
+        if end >= 0:
+            return end
+
+    return MISS
+
+
+# Matching the joined text is enough when it's there. Otherwise the literals
+# are tried one at a time to find where the original sequence would have
+# stopped, so the Partial and hit_end results are the same.
+def recognize_literal_sequence(state, expr, pos):
+    text = expr.text
+    if state.data.startswith(text, pos):
+        return pos + len(text)
+
+    current = pos
+    for _, literal in expr.parts:
+        end = recognize_item(state, literal, current)
+        if end == MISS:
+            break
+        current = end
+
+    if current == pos:
+        return MISS
+    return partial_end(current)
+
+
+RECOGNIZERS = {
+    grammar.And: recognize_and,
+    grammar.AnyChar: recognize_any_char,
+    grammar.CharRange: recognize_char_range,
+    grammar.CharSet: recognize_char_set,
+    grammar.Choice: recognize_choice,
+    grammar.Cut: recognize_cut,
+    grammar.Expr: recognize_expr,
+    grammar.LiteralChoice: recognize_literal_choice,
+    grammar.LiteralSequence: recognize_literal_sequence,
+    grammar.Not: recognize_not,
+    grammar.NotCharSet: recognize_not_char_set,
+    grammar.OneOrMore: recognize_one_or_more,
+    grammar.Optional: recognize_optional,
+    grammar.Regex: recognize_regex,
+    grammar.Rule: recognize_rule,
+    str: recognize_str,
+    grammar.UnicodeCategory: recognize_unicode_category,
+    grammar.ZeroOrMore: recognize_zero_or_more,
+}
+
+
+def recognize_item(state, item, pos):
+    if pos >= state.length:
+        state.hit_end = True
+        return MISS
+
+    return RECOGNIZERS[type(item)](state, item, pos)
 
 
 # TODO: This should let you pick the root rule to consider for parsing.
 
-def parse(rules, buffer):
+# The memo is a packrat table policy from the packrat module. It is cleared
+# at the start of every parse, so one policy object can be reused. The tracer
+# is any object with the enter/exit methods of tracing.Tracer; without one
+# the visitors run unwrapped.
+def parse(rules, buffer, *, memo=None, tracer=None):
+    if memo is not None:
+        memo.clear()
+
+    state = ParseState(buffer.source, memo=memo, tracer=tracer)
     partials = []
 
     for rule in rules:
-        node = descend(rule, buffer)
-        if isinstance(node, Match) and not node.remaining:
+        node = descend(state, rule, buffer.index)
+        if isinstance(node, Match) and node.end >= state.length:
             return node
         else:
             partials.append(node)
 
     return longest_reader(partials)
+
+
+def find_rule(rules, symbol):
+    for rule in rules:
+        if rule.symbol == symbol:
+            return rule
+
+    raise KeyError(symbol)
+
+
+# Raises the error for a node that didn't match all of the input: a
+# NothingMatchesError when it didn't get past where it started, otherwise an
+# IncompleteParseError. The error's value is the text the node covered.
+def raise_parse_error(node):
+    value = reader.Value(node.input_source, node.start, node.end)
+
+    if isinstance(node, Miss) or node.end == node.start:
+        raise NothingMatchesError(node, value)
+
+    raise IncompleteParseError(node, value)
+
+
+# Checks text against the rules without building a parse tree. Returns the
+# end offset of the longest Match, or None when no rule matches. When a rule
+# matches all of the text the others aren't tried, just like parse.
+def recognize(rules, text):
+    buffer = reader.get_string_reader(text)
+    state = ParseState(buffer.source)
+    longest = None
+
+    for rule in rules:
+        end = recognize_item(state, rule, buffer.index)
+        if end >= state.length:
+            return end
+        elif end >= 0 and (longest is None or end > longest):
+            longest = end
+
+    return longest
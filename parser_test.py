@@ -1,10 +1,16 @@
+import os
+import tempfile
 import unittest
 
 import grammar
 from grammar import Ref, Expr, Choice, ZeroOrMore, OneOrMore, Optional, And
+from grammar import CharRange, CharSet, NotCharSet, AnyChar, UnicodeCategory
+from grammar import Regex, Cut
+import packrat
 import parameters
 import parser
 import reader
+import tracing
 
 
 
@@ -165,6 +171,17 @@ class ParseSuccessTest(TestBase):
     def test_optional_miss(self):
         self.fail()
 
+    def test_spans(self):
+        found = self.run_test('(1+2)')
+        self.assertEqual((0, 5), (found.start, found.end))
+
+        inner_sum = found.value.value.sub_expr.inner_sum
+        self.assertEqual((1, 4), (inner_sum.start, inner_sum.end))
+        self.assertEqual('1+2', inner_sum.text)
+
+        reader_value = inner_sum.reader_value()
+        self.assertEqual((1, 4), (reader_value.start, reader_value.end))
+
 
 class ParseFailureTest(TestBase):
 
@@ -310,5 +327,397 @@ class ParseFailureTest(TestBase):
         self.assertRemaining(found, 'z')
 
 
+def get_char_class_rules():
+    rules = {
+        'Assign': Expr(
+            name=OneOrMore(UnicodeCategory('L')),
+            equals=CharSet(':='),
+            number=OneOrMore(CharRange('0', '9')),
+            comment=Optional(
+                start='#', text=ZeroOrMore(NotCharSet('\n'))),
+            end=AnyChar()),
+    }
+    resolved = grammar.resolve_refs(rules)
+    return resolved
+
+
+def count_nodes(node):
+    if isinstance(node, parser.ParseNode):
+        return 1 + count_nodes(node.value)
+
+    if isinstance(node, parameters.Params):
+        return sum(1 + count_nodes(v) for _, v in node)
+
+    return 0
+
+
+class CharClassTest(TestBase):
+
+    def test_match(self):
+        found = self.run_test(
+            'héllo=42#note\n', rules=get_char_class_rules())
+        self.assertEqual(
+            [('name',
+              [(0, [(0, 'h')]),
+               (1, [(0, 'é')]),
+               (2, [(0, 'l')]),
+               (3, [(0, 'l')]),
+               (4, [(0, 'o')])]),
+             ('equals', '='),
+             ('number', [(0, [(0, '4')]), (1, [(0, '2')])]),
+             ('comment',
+              [('start', '#'),
+               ('text',
+                [(0, [(0, 'n')]),
+                 (1, [(0, 'o')]),
+                 (2, [(0, 't')]),
+                 (3, [(0, 'e')])])]),
+             ('end', '\n')],
+            flatten(found))
+
+    def test_miss(self):
+        found = self.run_test(
+            'ab=x', rules=get_char_class_rules(), result_type=parser.Partial)
+        self.assertRemaining(found, 'x')
+
+    def test_category_miss(self):
+        found = self.run_test(
+            '1=2', rules=get_char_class_rules(), result_type=parser.Miss)
+        self.assertRemaining(found, '1=2')
+
+    def test_indexing(self):
+        rules = grammar.resolve_refs(
+            {'Digits': OneOrMore(CharRange('0', '9'))})
+        found = self.run_test('0123456789' * 1000, rules=rules)
+
+        repeated = found.value
+        self.assertEqual(10000, len(repeated.value))
+        self.assertEqual('7', repeated[9997][0].text)
+        self.assertEqual('9', repeated[-1][0].text)
+        self.assertEqual(['0', '1'], [n[0].text for n in repeated[:2]])
+
+    def test_fewer_nodes(self):
+        digit_choice = Choice(*'0123456789')
+        choice_rules = grammar.resolve_refs(
+            {'Digits': OneOrMore(digit_choice)})
+        range_rules = grammar.resolve_refs(
+            {'Digits': OneOrMore(CharRange('0', '9'))})
+
+        text = '0123456789' * 3
+        choice_found = self.run_test(text, rules=choice_rules)
+        range_found = self.run_test(text, rules=range_rules)
+        self.assertEqual(choice_found.text, range_found.text)
+        self.assertLess(count_nodes(range_found), count_nodes(choice_found))
+
+
+def get_regex_rules():
+    rules = {
+        'Sum': Expr(
+            left=Ref('Number'),
+            suffix=ZeroOrMore(
+                operator=Regex(r'\s*[+-]\s*'),
+                right=Ref('Number'))),
+
+        'Number': Regex(r'\d+(\.\d+)?'),
+    }
+    resolved = grammar.resolve_refs(rules)
+    return resolved
+
+
+def get_nullable_repeat_rules():
+    rules = {
+        'Words': Expr(
+            words=ZeroOrMore(space=Regex(r'\s*'), word=Optional('w')),
+            end='.'),
+    }
+    resolved = grammar.resolve_refs(rules)
+    return resolved
+
+
+class RegexTest(TestBase):
+
+    def test_match(self):
+        found = self.run_test('12 + 3.5-4', rules=get_regex_rules())
+        self.assertEqual(
+            [('left', '12'),
+             ('suffix',
+              [(0, [('operator', ' + '), ('right', '3.5')]),
+               (1, [('operator', '-'), ('right', '4')])])],
+            flatten(found))
+
+    def test_one_value_per_lexeme(self):
+        found = self.run_test('12345', rules=get_regex_rules())
+        value = found.value.value
+        self.assertIsInstance(value, reader.Value)
+        self.assertEqual((0, 5), (value.start, value.end))
+
+    def test_miss(self):
+        found = self.run_test(
+            '12+x', rules=get_regex_rules(), result_type=parser.Partial)
+        self.assertRemaining(found, 'x')
+
+    def test_empty_match_in_repetition(self):
+        rules = get_nullable_repeat_rules()
+        found = self.run_test('  w w.', rules=rules)
+        self.assertEqual(
+            ['  w', ' w', ''],
+            [node.text for _, node in found.value.words.value])
+        self.assertEqual(1, parser.recognize(rules, '.'))
+        self.run_test('w x', rules=rules, result_type=parser.Partial)
+
+
+class PackratTest(TestBase):
+
+    def assertSameParse(self, text, memo, *, rules=None):
+        if rules is None:
+            rules = get_rules()
+        expected = parser.parse(rules, reader.get_string_reader(text))
+        found = parser.parse(rules, reader.get_string_reader(text), memo=memo)
+        self.assertIs(type(expected), type(found))
+        self.assertEqual(flatten(expected), flatten(found))
+        self.assertEqual(expected.remaining.index, found.remaining.index)
+
+    def test_unbounded(self):
+        memo = packrat.Unbounded()
+        self.assertSameParse('(1+2)-(3+4)', memo)
+        self.assertGreater(memo.hits, 0)
+
+    def test_unbounded_partial(self):
+        self.assertSameParse(
+            '12z', packrat.Unbounded(), rules=get_partial_choice_rules())
+
+    def test_window(self):
+        memo = packrat.Window(2)
+        self.assertSameParse('(1+2)-(3+4)', memo)
+        self.assertTrue(all(
+            index >= memo.furthest - 2 for index in memo.positions))
+
+    def test_lru(self):
+        memo = packrat.Lru(1000)
+        self.assertSameParse('(1+2)-(3+4)', memo)
+        self.assertLessEqual(memo.used_bytes, 1000)
+
+    def test_reuse_clears(self):
+        memo = packrat.Unbounded()
+        self.assertSameParse('(1+2)', memo)
+        self.assertSameParse('3', memo)
+        self.assertEqual(0, memo.hits)
+
+
+def get_cut_rules(cut=True):
+    commit = [Cut()] if cut else []
+    rules = {
+        'Records': OneOrMore(Ref('Record')),
+
+        'Record': Choice(
+            let=Expr('let', *commit, ' ', Ref('Name'), ';'),
+            call=Expr(Ref('Name'), ';')),
+
+        'Name': OneOrMore(CharRange('a', 'z')),
+    }
+    resolved = grammar.resolve_refs(rules)
+    return resolved
+
+
+class CutTest(TestBase):
+
+    def test_match(self):
+        found = self.run_test('let x;f;', rules=get_cut_rules())
+        self.assertEqual('Records', found.source.symbol)
+        self.assertEqual(
+            [True, False], [r[0].let is not None for r in found.value])
+
+    def test_no_backtrack_after_cut(self):
+        found = self.run_test('let;', rules=get_cut_rules(cut=False))
+        self.assertIsNotNone(found.value.call)
+
+        found = self.run_test(
+            'let;', rules=get_cut_rules(), result_type=parser.Partial)
+        self.assertIsNone(found.value.call)
+        self.assertRemaining(found, ';')
+
+    def test_cut_is_scoped_to_rule(self):
+        rules = grammar.resolve_refs({
+            'Value': Choice(Expr(Ref('Inner'), 'y'), 'ab'),
+            'Inner': Expr('a', Cut(), 'b'),
+        })
+        value_rule = [r for r in rules if r.symbol == 'Value']
+        found = self.run_test('ab', rules=value_rule)
+        self.assertEqual('ab', found.value.value[1].text)
+
+    def test_recognize(self):
+        self.assertEqual(8, parser.recognize(get_cut_rules(), 'let x;f;'))
+        self.assertEqual(4, parser.recognize(get_cut_rules(cut=False), 'let;'))
+        # Only the Name rule matches, up to the semicolon.
+        self.assertEqual(3, parser.recognize(get_cut_rules(), 'let;'))
+
+    def test_memo_released(self):
+        text = 'let x;' * 200
+        kept = []
+        for memo in [packrat.Unbounded(), packrat.Lru(100000)]:
+            with self.subTest(memo=type(memo).__name__):
+                parser.parse(get_cut_rules(), reader.get_string_reader(text),
+                             memo=memo)
+                self.assertEqual(len(text) - 3, memo.floor)
+                kept.append(len(memo))
+
+        memo = packrat.Unbounded()
+        parser.parse(get_cut_rules(cut=False), reader.get_string_reader(text),
+                     memo=memo)
+        self.assertGreater(len(memo), 10 * max(kept))
+
+    def test_memo_kept_for_enclosing_choice(self):
+        def get_rules(cut):
+            commit = [Cut()] if cut else []
+            rules = grammar.resolve_refs({
+                'Value': Choice(
+                    Expr(Ref('Keyword'), 'x'), Expr(Ref('Wrapped'), 'y')),
+                'Wrapped': Expr(Ref('Keyword')),
+                'Keyword': Expr('k', *commit, Ref('Name')),
+                'Name': 'b',
+            })
+            return [r for r in rules if r.symbol == 'Value']
+
+        found = []
+        for cut in [False, True]:
+            memo = packrat.Unbounded()
+            node = parser.parse(
+                get_rules(cut), reader.get_string_reader('kby'), memo=memo)
+            self.assertIsInstance(node, parser.Match)
+            found.append((memo.hits, memo.misses, memo.floor))
+
+        # The Cut only commits Keyword, and Value backtracks before it.
+        self.assertEqual(found[0], found[1])
+        self.assertEqual(0, found[1][2])
+
+
+class MappedSourceTest(TestBase):
+
+    def test_same_as_string(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        with open(path, 'wb') as f:
+            f.write(b'(1+2)-')
+
+        rules = get_rules()
+        expected = parser.parse(rules, reader.get_string_reader('(1+2)-'))
+        buffer = reader.get_path_reader(path, mapped=True)
+        self.addCleanup(buffer.source.close)
+        found = parser.parse(rules, buffer)
+
+        self.assertIsInstance(found, parser.Partial)
+        self.assertEqual(flatten(expected), flatten(found))
+        self.assertReaderValue(found, text='(1+2)-', lines='(1+2)-')
+
+    def test_regex(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        with open(path, 'wb') as f:
+            f.write(b'12 + 3.5-4')
+
+        buffer = reader.get_path_reader(path, mapped=True)
+        self.addCleanup(buffer.source.close)
+        found = parser.parse(get_regex_rules(), buffer)
+
+        self.assertIsInstance(found, parser.Match)
+        self.assertEqual('12 + 3.5-4', found.text)
+        self.assertEqual(
+            flatten(self.run_test('12 + 3.5-4', rules=get_regex_rules())),
+            flatten(found))
+
+
+class TracingTest(TestBase):
+
+    def test_events_do_not_change_result(self):
+        rules = get_rules()
+        expected = parser.parse(rules, reader.get_string_reader('(1+2)-'))
+
+        tracer = tracing.EventTracer()
+        found = parser.parse(
+            rules, reader.get_string_reader('(1+2)-'), tracer=tracer)
+
+        self.assertIs(type(expected), type(found))
+        self.assertEqual(flatten(expected), flatten(found))
+
+        enters = [e for e in tracer.events if e.phase == 'enter']
+        exits = [e for e in tracer.events if e.phase == 'exit']
+        self.assertEqual(len(enters), len(exits))
+        self.assertEqual(0, tracer.events[0].depth)
+        self.assertEqual('descend_rule', tracer.events[0].kind)
+        self.assertGreater(max(e.depth for e in tracer.events), 3)
+
+    def test_callback(self):
+        seen = []
+        tracer = tracing.EventTracer(callback=seen.append)
+        parser.parse(get_rules(), reader.get_string_reader('1'), tracer=tracer)
+        self.assertEqual([], tracer.events)
+        self.assertEqual('exit', seen[-1].phase)
+        self.assertIsInstance(seen[-1].detail, parser.Match)
+
+
+class RecognizeTest(TestBase):
+
+    def assertSameEnds(self, rules, texts):
+        for text in texts:
+            for rule in rules:
+                with self.subTest(text=text, rule=rule.symbol):
+                    source = reader.Source('<test>', text)
+                    node = parser.descend(parser.ParseState(source), rule, 0)
+                    end = parser.recognize_item(
+                        parser.ParseState(source), rule, 0)
+                    self.assertEqual(parser.node_end(node), end)
+
+    def test_same_ends(self):
+        self.assertSameEnds(get_rules(), [
+            '1', '12', '(1+2)', '(1+2)-', '1+nope', '+1+2', '((3-4)+5)',
+            '1+2)'])
+        self.assertSameEnds(
+            get_partial_choice_rules(), ['12z', '123x', '12y', 'q'])
+        self.assertSameEnds(
+            get_char_class_rules(), ['héllo=42#note\n', 'ab=x', '1=2'])
+        self.assertSameEnds(get_regex_rules(), ['12 + 3.5-4', '12+x', 'x'])
+
+    def test_recognize(self):
+        rules = get_rules()
+        self.assertEqual(5, parser.recognize(rules, '(1+2)'))
+        self.assertEqual(2, parser.recognize(rules, '12)'))
+        self.assertIsNone(parser.recognize(rules, '+1'))
+        self.assertIsNone(parser.recognize(rules, ''))
+
+    def test_partial_encoding(self):
+        self.assertEqual(-2, parser.partial_end(0))
+        self.assertEqual(7, parser.partial_end(parser.partial_end(7)))
+        self.assertLess(parser.partial_end(0), parser.MISS)
+
+    def test_predicates_keep_no_subtree(self):
+        found = self.run_test('12y', rules=get_partial_choice_rules())
+        predicate = found.value.value.second[2]
+        self.assertIsInstance(predicate.source, grammar.And)
+        self.assertIsNone(predicate.value)
+        self.assertEqual((2, 2), (predicate.start, predicate.end))
+
+
+class SharedPrefixTest(TestBase):
+
+    def test_reuses_nodes(self):
+        tracer = tracing.EventTracer()
+        found = parser.parse(
+            get_partial_choice_rules(), reader.get_string_reader('12y'),
+            tracer=tracer)
+
+        self.assertIsInstance(found, parser.Match)
+        choice = found.value.value
+        self.assertIs(choice.first[0], choice.second[0])
+        self.assertIs(choice.first[1], choice.second[1])
+
+        int_enters = [
+            e.detail for e in tracer.events
+            if e.phase == 'enter' and e.kind == 'descend_rule' and
+            e.item.symbol == 'Int' and e.depth]
+        self.assertEqual([0, 1, 2], int_enters)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,264 @@
+import json
+import time
+
+import grammar
+import parser
+import tracing
+
+
+# Collects per-rule and per-Choice-alternative statistics from the visitor
+# events of parser.parse. It's a tracer, so profiling is opted into per call:
+#
+#     profiler = profiling.Profiler()
+#     parser.parse(rules, buffer, tracer=profiler)
+#     print(profiler.table())
+#
+# Statistics accumulate across every parse the profiler is passed to, so a
+# service can profile a sample of its traffic by passing the same profiler
+# to a fraction of its calls and nothing to the rest.
+#
+# For each rule and alternative it records:
+#
+# - calls: how many times it was descended into.
+# - total_time: seconds spent inside it, including the rules it called.
+# - self_time: total_time minus the time spent in rules and alternatives
+#   nested inside it.
+# - matches, partials, misses: how the calls turned out.
+# - consumed: characters covered by its Matches.
+# - rescanned: characters covered by its Partials, which backtracking throws
+#   away and some other item has to scan again.
+# - memo_hits: calls answered from the packrat memo (rules only).
+#
+# Alternatives are named by the path of keys from their rule to the Choice,
+# then the alternative's key, as in 'Sum.suffix.0.operator/1'. When an
+# alternative reuses nodes from an earlier one that shares its leading
+# items, the parser doesn't descend into it. Its outcome is still counted,
+# but its time goes to the self_time of the rule around the Choice.
+
+
+class Stats:
+    __slots__ = (
+        'name', 'kind', 'calls', 'total_time', 'self_time', 'matches',
+        'partials', 'misses', 'consumed', 'rescanned', 'memo_hits')
+
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+        self.calls = 0
+        self.total_time = 0.0
+        self.self_time = 0.0
+        self.matches = 0
+        self.partials = 0
+        self.misses = 0
+        self.consumed = 0
+        self.rescanned = 0
+        self.memo_hits = 0
+
+    def record(self, result, pos):
+        self.calls += 1
+        result_type = type(result)
+        if result_type is parser.Match:
+            self.matches += 1
+            self.consumed += result.end - pos
+        elif result_type is parser.Partial:
+            self.partials += 1
+            self.rescanned += result.end - pos
+        else:
+            self.misses += 1
+
+    @property
+    def memo_hit_rate(self):
+        if not self.calls:
+            return 0.0
+        return self.memo_hits / self.calls
+
+    def as_dict(self):
+        result = {name: getattr(self, name) for name in self.__slots__}
+        result['memo_hit_rate'] = self.memo_hit_rate
+        return result
+
+
+class Frame:
+    __slots__ = (
+        'item', 'pos', 'start', 'nested_time', 'children', 'rule_stats',
+        'alternative_stats', 'alternatives', 'observed')
+
+    def __init__(self, item, pos, rule_stats, alternative_stats):
+        self.item = item
+        self.pos = pos
+        self.rule_stats = rule_stats
+        self.alternative_stats = alternative_stats
+        self.start = 0.0
+        self.nested_time = 0.0
+        self.children = 0
+        # Set for Choices, mapping id of each alternative to its key
+        self.alternatives = None
+        self.observed = None
+
+
+def key_text(key):
+    if type(key) is tuple:
+        return '.'.join(str(part) for part in key)
+    return str(key)
+
+
+# Finds the keys leading from item to target without following references
+# into other rules.
+def find_path(item, target):
+    if item is target:
+        return []
+
+    if not isinstance(item, grammar.Expr):
+        return None
+
+    for key, value in item.params:
+        path = find_path(value, target)
+        if path is not None:
+            return [key_text(key)] + path
+
+    return None
+
+
+class Profiler(tracing.Tracer):
+    def __init__(self):
+        self.stats = {}
+        self.choices = {}
+        self.stack = []
+        # Frames of the rules and alternatives being timed, innermost last
+        self.entries = []
+
+    def get_stats(self, name, kind):
+        try:
+            return self.stats[name]
+        except KeyError:
+            stats = Stats(name, kind)
+            self.stats[name] = stats
+            return stats
+
+    def choice_alternatives(self, choice):
+        try:
+            return self.choices[id(choice)]
+        except KeyError:
+            pass
+
+        prefix = '?'
+        for frame in reversed(self.entries):
+            if type(frame.item) is grammar.Rule:
+                rule = frame.item
+                path = find_path(rule.expr, choice) or []
+                prefix = '.'.join([rule.symbol] + path)
+                break
+
+        alternatives = {}
+        for key, value in choice.params:
+            name = f'{prefix}/{key_text(key)}'
+            alternatives.setdefault(
+                id(value), (key, self.get_stats(name, 'alternative')))
+
+        # The Choice is kept so its id isn't reused while it's cached.
+        self.choices[id(choice)] = choice, alternatives
+        return choice, alternatives
+
+    def enter(self, kind, item, index, depth):
+        stack = self.stack
+        rule_stats = None
+        alternative_stats = None
+
+        # A parse that raised, like a RecursionError, never exited its
+        # frames. They're dropped when the next parse starts so its time
+        # isn't attributed to them.
+        if not depth and stack:
+            stack.clear()
+            self.entries.clear()
+
+        if stack:
+            parent = stack[-1]
+            parent.children += 1
+            if parent.alternatives is not None:
+                found = parent.alternatives.get(id(item))
+                if found is not None:
+                    key, alternative_stats = found
+                    parent.observed.add(key)
+
+        if type(item) is grammar.Rule:
+            rule_stats = self.get_stats(item.symbol, 'rule')
+
+        frame = Frame(item, index, rule_stats, alternative_stats)
+        if type(item) is grammar.Choice:
+            _, frame.alternatives = self.choice_alternatives(item)
+            frame.observed = set()
+
+        stack.append(frame)
+        if rule_stats is not None or alternative_stats is not None:
+            self.entries.append(frame)
+        frame.start = time.perf_counter()
+
+    def exit(self, kind, item, result, depth):
+        end = time.perf_counter()
+        frame = self.stack.pop()
+
+        if frame.alternatives is not None:
+            self.record_reused(frame, result)
+
+        if frame.rule_stats is None and frame.alternative_stats is None:
+            return
+
+        elapsed = end - frame.start
+        self.entries.pop()
+        if self.entries:
+            self.entries[-1].nested_time += elapsed
+
+        # A memo hit returns without descending into anything.
+        memo_hit = type(item) is grammar.Rule and not frame.children
+
+        for stats in (frame.rule_stats, frame.alternative_stats):
+            if stats is None:
+                continue
+            stats.record(result, frame.pos)
+            stats.total_time += elapsed
+            stats.self_time += elapsed - frame.nested_time
+            if memo_hit:
+                stats.memo_hits += 1
+
+    # Alternatives that reused another one's leading nodes weren't entered,
+    # but their nodes are in the Choice's result.
+    def record_reused(self, frame, result):
+        if not isinstance(result, parser.ParseNode) or result.value is None:
+            return
+
+        stats_by_key = dict(frame.alternatives.values())
+        for key, node in result.value:
+            if node is None or key in frame.observed:
+                continue
+            stats = stats_by_key.get(key)
+            if stats is not None:
+                stats.record(node, frame.pos)
+
+    def report(self, sort='self_time'):
+        rows = [
+            stats.as_dict() for stats in self.stats.values() if stats.calls]
+        rows.sort(key=lambda row: (-row[sort], row['name']))
+        return rows
+
+    def table(self, sort='self_time', limit=None):
+        rows = self.report(sort)
+        if limit is not None:
+            rows = rows[:limit]
+
+        lines = [
+            f'{"name":<40} {"kind":<11} {"calls":>8} {"total s":>9} '
+            f'{"self s":>9} {"match":>7} {"partial":>7} {"miss":>7} '
+            f'{"consumed":>9} {"rescanned":>9} {"memo %":>6}']
+        for row in rows:
+            lines.append(
+                f'{row["name"]:<40} {row["kind"]:<11} {row["calls"]:>8} '
+                f'{row["total_time"]:>9.4f} {row["self_time"]:>9.4f} '
+                f'{row["matches"]:>7} {row["partials"]:>7} '
+                f'{row["misses"]:>7} {row["consumed"]:>9} '
+                f'{row["rescanned"]:>9} '
+                f'{100 * row["memo_hit_rate"]:>6.1f}')
+
+        return '\n'.join(lines)
+
+    def to_json(self, sort='self_time', **kwargs):
+        return json.dumps(self.report(sort), **kwargs)
@@ -0,0 +1,137 @@
+import json
+import unittest
+
+import grammar
+from grammar import Expr, Ref
+import packrat
+import parser
+import parser_test
+import profiling
+import reader
+
+
+def profile(rules, text, profiler=None, **kwargs):
+    if profiler is None:
+        profiler = profiling.Profiler()
+    node = parser.parse(
+        rules, reader.get_string_reader(text), tracer=profiler, **kwargs)
+    return node, profiler
+
+
+def get_rows(profiler):
+    return {row['name']: row for row in profiler.report()}
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def test_same_result(self):
+        rules = parser_test.get_rules()
+        expected = parser.parse(rules, reader.get_string_reader('(1+2)-'))
+        found, _ = profile(rules, '(1+2)-')
+        self.assertIs(type(expected), type(found))
+        self.assertEqual(
+            parser_test.flatten(expected), parser_test.flatten(found))
+
+    def test_rules_and_alternatives(self):
+        _, profiler = profile(
+            parser_test.get_partial_choice_rules(), '12y')
+        rows = get_rows(profiler)
+
+        value = rows['Value']
+        self.assertEqual('rule', value['kind'])
+        self.assertEqual((1, 1, 0, 0), (
+            value['calls'], value['matches'], value['partials'],
+            value['misses']))
+        self.assertEqual(2, value['consumed'])
+
+        first = rows['Value/first']
+        self.assertEqual('alternative', first['kind'])
+        self.assertEqual((1, 0, 1, 0), (
+            first['calls'], first['matches'], first['partials'],
+            first['misses']))
+        self.assertEqual(2, first['rescanned'])
+
+        # Reuses the nodes matched by the first alternative.
+        second = rows['Value/second']
+        self.assertEqual((1, 1, 2), (
+            second['calls'], second['matches'], second['consumed']))
+
+        # Once on its own at the start, then three times inside Value.
+        integer = rows['Int']
+        self.assertEqual((4, 3, 1), (
+            integer['calls'], integer['matches'], integer['misses']))
+        self.assertEqual(2, rows['Int/1']['calls'])
+        self.assertNotIn('Int/0', rows)
+
+    def test_nested_choice_names(self):
+        _, profiler = profile(parser_test.get_rules(), '1+2-3')
+        rows = get_rows(profiler)
+        self.assertEqual(1, rows['Sum.suffix.0.operator/0']['matches'])
+        self.assertEqual(1, rows['Sum.suffix.0.operator/1']['matches'])
+
+    def test_times(self):
+        _, profiler = profile(parser_test.get_rules(), '(1+2)-(3+4)')
+        rows = profiler.report()
+        self.assertEqual(
+            sorted((row['self_time'] for row in rows), reverse=True),
+            [row['self_time'] for row in rows])
+        for row in rows:
+            self.assertGreaterEqual(row['total_time'], row['self_time'])
+            self.assertGreaterEqual(row['self_time'], 0)
+
+    def test_memo_hits(self):
+        rules = parser_test.get_rules()
+        _, profiler = profile(rules, '(1+2)-(3+4)')
+        self.assertEqual(0, get_rows(profiler)['Value']['memo_hits'])
+
+        _, profiler = profile(
+            rules, '(1+2)-(3+4)', memo=packrat.Unbounded())
+        value = get_rows(profiler)['Value']
+        self.assertEqual(1, value['memo_hits'])
+        self.assertAlmostEqual(1 / value['calls'], value['memo_hit_rate'])
+
+    def test_accumulates(self):
+        rules = parser_test.get_rules()
+        _, profiler = profile(rules, '1+2')
+        calls = get_rows(profiler)['Value']['calls']
+        profile(rules, '1+2', profiler)
+        self.assertEqual(2 * calls, get_rows(profiler)['Value']['calls'])
+
+    def test_exports(self):
+        _, profiler = profile(parser_test.get_rules(), '(1+2)-(3+4)')
+
+        exported = json.loads(profiler.to_json(sort='calls'))
+        self.assertEqual(profiler.report(sort='calls'), exported)
+        self.assertEqual('Number', exported[0]['name'])
+
+        lines = profiler.table(sort='calls', limit=3).splitlines()
+        self.assertEqual(4, len(lines))
+        self.assertTrue(lines[0].startswith('name'))
+        self.assertTrue(lines[1].startswith('Number'))
+
+
+    def test_frames_dropped_after_error(self):
+        profiler = profiling.Profiler()
+        looping = list(grammar.resolve_refs({
+            'Loop': Expr(Ref('Loop'), 'x'),
+        }))
+        with self.assertRaises(RecursionError):
+            profile(looping, 'xx', profiler)
+        self.assertTrue(profiler.stack)
+
+        rules = parser_test.get_partial_choice_rules()
+        profile(rules, '12y', profiler)
+        self.assertEqual([], profiler.stack)
+        self.assertEqual([], profiler.entries)
+
+        _, expected = profile(rules, '12y')
+        counts = ('calls', 'matches', 'partials', 'misses', 'consumed')
+        found_rows = get_rows(profiler)
+        for name, row in get_rows(expected).items():
+            self.assertEqual(
+                [row[count] for count in counts],
+                [found_rows[name][count] for count in counts], name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,53 +1,148 @@
+import bisect
+import mmap
+import re
+
 
 class Source:
     def __init__(self, path, data):
         self.path = path
         self.data = data
+        self._line_starts = None
 
+    @property
+    def line_starts(self):
+        if self._line_starts is None:
+            data = self.data
+            starts = [0]
+            i = data.find('\n')
+            while i != -1:
+                starts.append(i + 1)
+                i = data.find('\n', i + 1)
+            self._line_starts = starts
 
-class Value:
-    def __init__(self, source, text, start, end):
-        self.source = source
-        self.text = text
-        self.start = start
-        self.end = end
+        return self._line_starts
 
-    def line_start_index(self):
-        if not self.source.data:
+    def line_index(self, offset):
+        return bisect.bisect_right(self.line_starts, offset) - 1
+
+    def line_start(self, offset):
+        return self.line_starts[self.line_index(offset)]
+
+    def line_end(self, offset):
+        if not self.data:
             return 0
 
-        i = self.start
+        starts = self.line_starts
+        next_line = bisect.bisect_right(starts, offset)
+        if next_line == len(starts):
+            return len(self.data) - 1
 
-        while i > 0:
-            if self.source.data[i] == '\n':
-                i += 1
-                break
-            else:
-                i -= 1
+        return starts[next_line] - 1
 
-        return i
+    def line_column(self, offset):
+        line = self.line_index(offset)
+        return line + 1, offset - self.line_starts[line]
 
-    def line_end_index(self):
-        if not self.source.data:
-            return 0
+    def line_columns(self, offsets):
+        starts = self.line_starts
+        find = bisect.bisect_right
+        result = []
+
+        for offset in offsets:
+            line = find(starts, offset)
+            result.append((line, offset - starts[line - 1]))
+
+        return result
+
+
+# Read-only text view over a memory-mapped file. Offsets are byte offsets,
+# so the encoding must use one byte per character (ascii, latin-1, cp1252).
+# Only the slices that are asked for get decoded.
+class MappedText:
+    def __init__(self, mapping, encoding='latin-1'):
+        self.mapping = mapping
+        self.encoding = encoding
+        self.encoded = {}
+        self.patterns = {}
+
+    def encode(self, text):
+        try:
+            return self.encoded[text]
+        except KeyError:
+            pass
+
+        data = text.encode(self.encoding)
+        assert len(data) == len(text), 'Encoding must be single-byte'
+        self.encoded[text] = data
+        return data
+
+    def __len__(self):
+        return len(self.mapping)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            assert index.step is None
+            return self.mapping[index].decode(self.encoding)
 
-        i = self.end
+        return self.mapping[index:index + 1].decode(self.encoding)
 
-        while i < len(self.source.data):
-            if self.source.data[i] == '\n':
-                break
-            else:
-                i += 1
+    def startswith(self, prefix, start=0):
+        data = self.encode(prefix)
+        end = start + len(data)
+        return self.mapping.find(data, start, end) == start
 
-        # No trailing newline case
-        if self.source.data and i == len(self.source.data):
-            i -= 1
+    def find(self, sub, start=0, end=None):
+        if end is None:
+            end = len(self.mapping)
+        return self.mapping.find(self.encode(sub), start, end)
 
-        return i
+    def regex_match(self, pattern, pos):
+        try:
+            compiled = self.patterns[pattern]
+        except KeyError:
+            compiled = re.compile(
+                self.encode(pattern.pattern), pattern.flags & ~re.UNICODE)
+            self.patterns[pattern] = compiled
+
+        return compiled.match(self.mapping, pos)
+
+
+class MappedSource(Source):
+    def __init__(self, path, encoding='latin-1'):
+        with open(path, 'rb') as f:
+            try:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                mapping = b''
+
+        super().__init__(path, MappedText(mapping, encoding))
+
+    def close(self):
+        if isinstance(self.data.mapping, mmap.mmap):
+            self.data.mapping.close()
+
+
+class Value:
+    __slots__ = ('source', 'start', 'end')
+
+    def __init__(self, source, start, end):
+        self.source = source
+        self.start = start
+        self.end = end
+
+    @property
+    def text(self):
+        return self.source.data[self.start:self.end]
+
+    def line_start_index(self):
+        return self.source.line_start(self.start)
+
+    def line_end_index(self):
+        return self.source.line_end(self.end)
 
     def line_start_number(self):
-        before = self.source.data[:self.start]
-        return before.count('\n') + 1
+        return self.source.line_index(self.start) + 1
 
     def text_lines(self):
         start = self.line_start_index()
@@ -67,6 +162,8 @@ class Value:
 
 
 class Reader:
+    __slots__ = ('source', 'index')
+
     def __init__(self, source, index):
         self.source = source
         self.index = index
@@ -78,13 +175,12 @@ class Reader:
             length = data_length
 
         if self.index >= data_length:
-            value = Value(self.source, '', data_length, data_length)
+            value = Value(self.source, data_length, data_length)
             return value, self
 
         next_index = self.index + length
-        text = self.source.data[self.index:next_index]
-        end_index = self.index + len(text)
-        value = Value(self.source, text, self.index, end_index)
+        end_index = min(next_index, data_length)
+        value = Value(self.source, self.index, end_index)
 
         next_reader = self.__class__(self.source, next_index)
 
@@ -103,7 +199,10 @@ def get_string_reader(data):
     return Reader(source, 0)
 
 
-def get_path_reader(path):
+def get_path_reader(path, *, mapped=False, encoding='latin-1'):
+    if mapped:
+        return Reader(MappedSource(path, encoding), 0)
+
     with open(path) as f:
         data = f.read()
 
@@ -115,5 +214,4 @@ def combine_spans(values):
     source = values[0].source
     min_start = min(v.start for v in values)
     max_end = max(v.end for v in values)
-    text = source.data[min_start:max_end]
-    return Value(source, text, min_start, max_end)
+    return Value(source, min_start, max_end)
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 
 import reader
@@ -10,7 +12,7 @@ class ValueTest(unittest.TestCase):
 
     def test_empty(self):
         source = reader.Source(self.path, '')
-        value = reader.Value(source, '', 0, 0)
+        value = reader.Value(source, 0, 0)
         self.assertEqual(0, value.line_start_index())
         self.assertEqual(0, value.line_end_index())
         self.assertEqual(1, value.line_start_number())
@@ -20,7 +22,7 @@ class ValueTest(unittest.TestCase):
 
     def test_blank_line_start(self):
         source = reader.Source(self.path, '\n\nhello there\nbanana\n')
-        value = reader.Value(source, 'hello', 2, 6)
+        value = reader.Value(source, 2, 6)
         self.assertEqual(2, value.line_start_index())
         self.assertEqual(13, value.line_end_index())
         self.assertEqual(3, value.line_start_number())
@@ -30,7 +32,7 @@ class ValueTest(unittest.TestCase):
 
     def test_blank_line_end(self):
         source = reader.Source(self.path, 'yes hello\n')
-        value = reader.Value(source, 'hello', 4, 8)
+        value = reader.Value(source, 4, 8)
         self.assertEqual(0, value.line_start_index())
         self.assertEqual(9, value.line_end_index())
         self.assertEqual(1, value.line_start_number())
@@ -40,7 +42,7 @@ class ValueTest(unittest.TestCase):
 
     def test_no_blank_line_end(self):
         source = reader.Source(self.path, 'okay\nhello')
-        value = reader.Value(source, 'hello', 5, 9)
+        value = reader.Value(source, 5, 9)
         self.assertEqual(5, value.line_start_index())
         self.assertEqual(9, value.line_end_index())
         self.assertEqual(2, value.line_start_number())
@@ -50,7 +52,7 @@ class ValueTest(unittest.TestCase):
 
     def test_value_multiple_lines(self):
         source = reader.Source(self.path, 'hello\nyes\n')
-        value = reader.Value(source, 'hello\nyes', 0, 9)
+        value = reader.Value(source, 0, 9)
         self.assertEqual(0, value.line_start_index())
         self.assertEqual(9, value.line_end_index())
         self.assertEqual(1, value.line_start_number())
@@ -60,7 +62,7 @@ class ValueTest(unittest.TestCase):
 
     def test_first_column_in_line(self):
         source = reader.Source(self.path, 'hello\n')
-        value = reader.Value(source, 'hello', 0, 4)
+        value = reader.Value(source, 0, 4)
         self.assertEqual(0, value.line_start_index())
         self.assertEqual(5, value.line_end_index())
         self.assertEqual(1, value.line_start_number())
@@ -70,7 +72,7 @@ class ValueTest(unittest.TestCase):
 
     def test_last_column_in_line(self):
         source = reader.Source(self.path, 'yes k\n')
-        value = reader.Value(source, 'k', 4, 5)
+        value = reader.Value(source, 4, 5)
         self.assertEqual(0, value.line_start_index())
         self.assertEqual(5, value.line_end_index())
         self.assertEqual(1, value.line_start_number())
@@ -80,7 +82,7 @@ class ValueTest(unittest.TestCase):
 
     def test_full_column_span(self):
         source = reader.Source(self.path, 'yes no\n')
-        value = reader.Value(source, 'yes no', 0, 6)
+        value = reader.Value(source, 0, 6)
         self.assertEqual(0, value.line_start_index())
         self.assertEqual(6, value.line_end_index())
         self.assertEqual(1, value.line_start_number())
@@ -90,7 +92,7 @@ class ValueTest(unittest.TestCase):
 
     def test_value_covers_all_lines(self):
         source = reader.Source(self.path, 'yes\nno\nmaybe\n')
-        value = reader.Value(source, 'yes\nno\nmaybe', 0, 11)
+        value = reader.Value(source, 0, 11)
         self.assertEqual(0, value.line_start_index())
         self.assertEqual(12, value.line_end_index())
         self.assertEqual(1, value.line_start_number())
@@ -100,7 +102,7 @@ class ValueTest(unittest.TestCase):
 
     def test_no_newlines(self):
         source = reader.Source(self.path, 'banana')
-        value = reader.Value(source, 'banana', 0, 5)
+        value = reader.Value(source, 0, 5)
         self.assertEqual(0, value.line_start_index())
         self.assertEqual(5, value.line_end_index())
         self.assertEqual(1, value.line_start_number())
@@ -108,6 +110,92 @@ class ValueTest(unittest.TestCase):
         self.assertEqual(0, value.column_start_index())
         self.assertEqual(5, value.column_end_index())
 
+    def test_start_after_leading_newline(self):
+        source = reader.Source(self.path, '\nhello')
+        value = reader.Value(source, 2, 6)
+        self.assertEqual(1, value.line_start_index())
+        self.assertEqual(5, value.line_end_index())
+        self.assertEqual(2, value.line_start_number())
+        self.assertEqual('hello', value.text_lines())
+        self.assertEqual(1, value.column_start_index())
+        self.assertEqual(5, value.column_end_index())
+
+    def test_start_on_newline(self):
+        source = reader.Source(self.path, 'ab\ncd')
+        value = reader.Value(source, 2, 3)
+        self.assertEqual(0, value.line_start_index())
+        self.assertEqual(1, value.line_start_number())
+        self.assertEqual(2, value.column_start_index())
+
+
+class SourceTest(unittest.TestCase):
+
+    def test_line_starts(self):
+        source = reader.Source('my/path', 'a\n\nbc\nd')
+        self.assertEqual([0, 2, 3, 6], source.line_starts)
+        self.assertIs(source.line_starts, source.line_starts)
+
+    def test_line_column(self):
+        source = reader.Source('my/path', 'a\n\nbc\nd')
+        self.assertEqual((1, 0), source.line_column(0))
+        self.assertEqual((1, 1), source.line_column(1))
+        self.assertEqual((2, 0), source.line_column(2))
+        self.assertEqual((3, 1), source.line_column(4))
+        self.assertEqual((4, 1), source.line_column(7))
+
+    def test_line_columns(self):
+        source = reader.Source('my/path', 'a\n\nbc\nd')
+        offsets = [7, 0, 4, 2, 3]
+        self.assertEqual(
+            [source.line_column(offset) for offset in offsets],
+            source.line_columns(offsets))
+
+    def test_empty(self):
+        source = reader.Source('my/path', '')
+        self.assertEqual([(1, 0)], source.line_columns([0]))
+        self.assertEqual(0, source.line_end(0))
+
+
+class MappedSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def write(self, data):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+
+    def test_text_view(self):
+        self.write(b'yes\nno\nmaybe\n')
+        buffer = reader.get_path_reader(self.path, mapped=True)
+        self.addCleanup(buffer.source.close)
+        data = buffer.source.data
+
+        self.assertEqual(13, len(data))
+        self.assertEqual('n', data[4])
+        self.assertEqual('no\nmay', data[4:10])
+        self.assertTrue(data.startswith('no', 4))
+        self.assertFalse(data.startswith('no', 5))
+        self.assertEqual(6, data.find('\n', 4))
+        self.assertEqual([0, 4, 7, 13], buffer.source.line_starts)
+
+    def test_value(self):
+        self.write(b'yes\nno\nmaybe\n')
+        source = reader.MappedSource(self.path)
+        self.addCleanup(source.close)
+        value = reader.Value(source, 7, 12)
+        self.assertEqual(3, value.line_start_number())
+        self.assertEqual('maybe\n', value.text_lines())
+        self.assertEqual('maybe', reader.combine_spans([value]).text)
+
+    def test_empty(self):
+        self.write(b'')
+        buffer = reader.get_path_reader(self.path, mapped=True)
+        self.assertEqual(0, len(buffer))
+        value, _ = buffer.read()
+        self.assertEqual('', value.text)
 
 
 if __name__ == '__main__':
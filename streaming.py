@@ -0,0 +1,99 @@
+import parser
+import reader
+
+
+# Parses a stream that is a sequence of top-level records, each matching the
+# rule named by symbol. A record is yielded once its match can't change no
+# matter what input arrives next. Consumed text is dropped from the buffer
+# and every record gets a fresh parse state, so memory is bounded by the
+# largest record plus one chunk.
+#
+# A record that needs more input is parsed again from its start once more
+# arrives. Once the pending text is longer than backoff_size, it's only
+# retried after the pending text has doubled since the last try, or at
+# close, so many small chunks of one long record don't cost quadratic time.
+# Retrying a long record then costs about twice its length in total, but it
+# can be returned a few chunks after the one that completed it.
+BACKOFF_SIZE = 65536
+
+
+class StreamParser:
+    def __init__(self, rules, symbol, *, memo=None, path='<stream>',
+                 backoff_size=BACKOFF_SIZE):
+        self.rule = parser.find_rule(rules, symbol)
+        self.memo = memo
+        self.path = path
+        self.backoff_size = backoff_size
+        self.pending = ''
+        self.consumed = 0
+        # Length of pending text needed before an unfinished record is
+        # parsed again.
+        self.retry_at = 0
+
+    def feed(self, chunk):
+        self.pending += chunk
+        return self.collect(final=False)
+
+    def close(self):
+        return self.collect(final=True)
+
+    # Records before one that doesn't match are returned first by feed. The
+    # bad record stays pending, so the next call raises its error. close has
+    # no next call, so it raises right away, with the records that came
+    # before the bad one in the error's records attribute.
+    def collect(self, final):
+        records = []
+        try:
+            for node in self.drain(final):
+                records.append(node)
+        except parser.Error as e:
+            if final or not records:
+                e.records = records
+                raise
+
+        return records
+
+    def drain(self, final):
+        if not final and len(self.pending) < self.retry_at:
+            return
+
+        while self.pending:
+            source = reader.Source(self.path, self.pending)
+            if self.memo is not None:
+                self.memo.clear()
+            state = parser.ParseState(source, memo=self.memo)
+
+            node = parser.descend(state, self.rule, 0)
+            if state.hit_end and not final:
+                length = len(self.pending)
+                if length > self.backoff_size:
+                    self.retry_at = 2 * length
+                else:
+                    self.retry_at = 0
+                return
+
+            if not isinstance(node, parser.Match) or node.end == 0:
+                parser.raise_parse_error(node)
+
+            # Trim the record's source so its values don't keep the rest of
+            # the buffer alive.
+            source.data = self.pending[:node.end]
+            self.pending = self.pending[node.end:]
+            self.consumed += node.end
+
+            yield node
+
+
+def parse_stream(rules, symbol, chunks, **kwargs):
+    stream = StreamParser(rules, symbol, **kwargs)
+
+    for chunk in chunks:
+        stream.pending += chunk
+        yield from stream.drain(final=False)
+
+    yield from stream.drain(final=True)
+
+
+def parse_file(rules, symbol, f, *, chunk_size=65536, **kwargs):
+    chunks = iter(lambda: f.read(chunk_size), '')
+    return parse_stream(rules, symbol, chunks, **kwargs)
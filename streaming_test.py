@@ -0,0 +1,152 @@
+import io
+import unittest
+
+import grammar
+from grammar import Ref, Expr, Choice, OneOrMore
+import packrat
+import parser
+import parser_test
+import reader
+import streaming
+
+
+def get_rules():
+    rules = {
+        'Record': Expr(
+            key=OneOrMore(Ref('Digit')),
+            equals='=',
+            value=OneOrMore(Ref('Digit')),
+            end=';'),
+
+        'Digit': Choice('0', '1', '2', '3', '4', '5', '6', '7', '8', '9'),
+    }
+    return grammar.resolve_refs(rules)
+
+
+class CountingMemo(packrat.Unbounded):
+    def __init__(self):
+        super().__init__()
+        self.clears = 0
+
+    def clear(self):
+        super().clear()
+        self.clears += 1
+
+
+class StreamParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = streaming.StreamParser(get_rules(), 'Record')
+
+    def test_emits_when_complete(self):
+        self.assertEqual([], self.stream.feed('1'))
+        self.assertEqual([], self.stream.feed('2=3'))
+        found = self.stream.feed(';4')
+        self.assertEqual(1, len(found))
+        self.assertIsInstance(found[0], parser.Match)
+        self.assertEqual('12=3;', found[0].text)
+        self.assertEqual('4', self.stream.pending)
+        self.assertEqual(5, self.stream.consumed)
+
+    def test_several_per_chunk(self):
+        found = self.stream.feed('1=2;3=4;5=')
+        self.assertEqual(['1=2;', '3=4;'], [node.text for node in found])
+        self.assertEqual([], self.stream.feed('6'))
+        found = self.stream.feed(';') + self.stream.close()
+        self.assertEqual(['5=6;'], [node.text for node in found])
+        self.assertEqual('', self.stream.pending)
+
+    def test_record_source_trimmed(self):
+        found = self.stream.feed('1=2;3=4')
+        self.assertEqual('1=2;', found[0].input_source.data)
+
+    def test_same_tree_as_parse(self):
+        found = self.stream.feed('12=34;')
+        expected = parser.parse(
+            get_rules(), reader.get_string_reader('12=34;'))
+        self.assertEqual(
+            parser_test.flatten(expected), parser_test.flatten(found[0]))
+
+    def test_incomplete_at_close(self):
+        self.assertEqual([], self.stream.feed('1=2'))
+        with self.assertRaises(parser.IncompleteParseError) as context:
+            self.stream.close()
+        self.assertEqual('1=2', context.exception.value.text)
+
+    def test_nothing_matches(self):
+        with self.assertRaises(parser.NothingMatchesError):
+            self.stream.feed('x')
+
+    def test_bad_record_after_good_ones(self):
+        found = self.stream.feed('1=2;3=4;x')
+        self.assertEqual(['1=2;', '3=4;'], [node.text for node in found])
+        self.assertEqual('x', self.stream.pending)
+        self.assertEqual(8, self.stream.consumed)
+
+        with self.assertRaises(parser.NothingMatchesError):
+            self.stream.feed('5=6;')
+        with self.assertRaises(parser.NothingMatchesError):
+            self.stream.close()
+
+    def test_bad_record_at_close(self):
+        stream = streaming.StreamParser(
+            get_rules(), 'Record', backoff_size=0)
+        self.assertEqual([], stream.feed('1=2'))
+        # Not retried until the pending text doubles.
+        self.assertEqual([], stream.feed(';x'))
+        with self.assertRaises(parser.NothingMatchesError) as context:
+            stream.close()
+        self.assertEqual(
+            ['1=2;'], [node.text for node in context.exception.records])
+        self.assertEqual('x', stream.pending)
+
+    def test_long_record_backoff(self):
+        memo = CountingMemo()
+        stream = streaming.StreamParser(
+            get_rules(), 'Record', memo=memo, backoff_size=16)
+        text = '1' * 1000 + '=2;'
+        found = []
+        for char in text:
+            found.extend(stream.feed(char))
+        found.extend(stream.close())
+
+        self.assertEqual([text], [node.text for node in found])
+        # Each retry past the backoff size waits for the text to double.
+        self.assertLess(memo.clears, 16 + 10)
+
+    def test_memo(self):
+        memo = packrat.Window(16)
+        stream = streaming.StreamParser(get_rules(), 'Record', memo=memo)
+        found = stream.feed('1=2;3=4;') + stream.close()
+        self.assertEqual(2, len(found))
+
+    def test_regex_at_end_waits(self):
+        rules = grammar.resolve_refs({
+            'Record': Expr(word=grammar.Regex('[a-z]+'), end=';'),
+        })
+        stream = streaming.StreamParser(rules, 'Record')
+        self.assertEqual([], stream.feed('ab'))
+        found = stream.feed('c;')
+        self.assertEqual(['abc;'], [node.text for node in found])
+
+
+class ParseFileTest(unittest.TestCase):
+
+    def test_chunks(self):
+        f = io.StringIO(''.join(f'{i}={i * 7};' for i in range(100)))
+        found = list(streaming.parse_file(
+            get_rules(), 'Record', f, chunk_size=3))
+        self.assertEqual(100, len(found))
+        self.assertEqual('99=693;', found[-1].text)
+
+    def test_records_before_error(self):
+        found = []
+        with self.assertRaises(parser.NothingMatchesError):
+            for node in streaming.parse_stream(
+                    get_rules(), 'Record', ['1=2;3=4;x']):
+                found.append(node.text)
+        self.assertEqual(['1=2;', '3=4;'], found)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import collections
+import logging
+import sys
+
+
+Event = collections.namedtuple(
+    'Event', ['phase', 'kind', 'item', 'detail', 'depth'])
+
+
+class Tracer:
+    def enter(self, kind, item, index, depth):
+        pass
+
+    def exit(self, kind, item, result, depth):
+        pass
+
+
+class PrintTracer(Tracer):
+    def __init__(self, file=None):
+        self.file = file
+
+    def enter(self, kind, item, index, depth):
+        prefix = depth * '    '
+        print(f'{prefix}Running: {kind}({item!r}, {index!r})',
+              file=self.file or sys.stdout)
+
+    def exit(self, kind, item, result, depth):
+        prefix = depth * '    '
+        print(f'{prefix}Result: {result!r}', file=self.file or sys.stdout)
+
+
+class LoggingTracer(Tracer):
+    def __init__(self, logger=None, level=logging.DEBUG):
+        if logger is None:
+            logger = logging.getLogger(__name__)
+        self.logger = logger
+        self.level = level
+
+    def enter(self, kind, item, index, depth):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(
+                self.level, '%sRunning: %s(%r, %r)',
+                depth * '    ', kind, item, index)
+
+    def exit(self, kind, item, result, depth):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(
+                self.level, '%sResult: %r', depth * '    ', result)
+
+
+class EventTracer(Tracer):
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.events = []
+
+    def emit(self, event):
+        if self.callback is None:
+            self.events.append(event)
+        else:
+            self.callback(event)
+
+    def enter(self, kind, item, index, depth):
+        self.emit(Event('enter', kind, item, index, depth))
+
+    def exit(self, kind, item, result, depth):
+        self.emit(Event('exit', kind, item, result, depth))